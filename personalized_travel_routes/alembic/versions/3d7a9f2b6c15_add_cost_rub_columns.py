@@ -0,0 +1,44 @@
+"""add locations.cost_rub and activities.cost_rub
+
+Revision ID: 3d7a9f2b6c15
+Revises: 8c2f4e6d1a93
+Create Date: 2026-10-17 12:41:07.518934
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3d7a9f2b6c15'
+down_revision: Union[str, None] = '8c2f4e6d1a93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Snapshot of app/data/exchange_rates.json (RUB per unit) when this revision was written, so the
+# backfill does not depend on the application code or on the rates file of the deploy.
+RUB_PER_UNIT = {'RUB': 1.0, 'USD': 90.0, 'EUR': 100.0, 'GBP': 115.0}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('locations', sa.Column('cost_rub', sa.Float(), nullable=True))
+    op.add_column('activities', sa.Column('cost_rub', sa.Float(), nullable=True))
+    # Backfilled with the rates snapshot; app.services.currency.start_rates_sync re-syncs on startup if the rates changed since.
+    for table_name in ('locations', 'activities'):
+        table = sa.table(
+            table_name,
+            sa.column('cost', sa.Float()),
+            sa.column('cost_currency', sa.String()),
+            sa.column('cost_rub', sa.Float()),
+        )
+        rub_per_unit = sa.case(RUB_PER_UNIT, value=sa.func.upper(table.c.cost_currency), else_=None)
+        op.execute(table.update().values(cost_rub=table.c.cost * rub_per_unit))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('activities', 'cost_rub')
+    op.drop_column('locations', 'cost_rub')
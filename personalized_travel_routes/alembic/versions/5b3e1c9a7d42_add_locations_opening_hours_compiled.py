@@ -0,0 +1,29 @@
+"""add locations.opening_hours_compiled
+
+Revision ID: 5b3e1c9a7d42
+Revises: 17d09fa55ddf
+Create Date: 2026-10-17 10:12:40.511204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b3e1c9a7d42'
+down_revision: Union[str, None] = '17d09fa55ddf'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing rows stay NULL and are compiled lazily on first use (see app/services/opening_hours.py).
+    op.add_column('locations', sa.Column('opening_hours_compiled', sa.LargeBinary(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('locations', 'opening_hours_compiled')
@@ -0,0 +1,28 @@
+"""add routes.version
+
+Revision ID: 8c2f4e6d1a93
+Revises: 5b3e1c9a7d42
+Create Date: 2026-10-17 11:02:18.204517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c2f4e6d1a93'
+down_revision: Union[str, None] = '5b3e1c9a7d42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('routes', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('routes', 'version')
@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Response, status
+
+from app.nlp.models import readiness
+
+router_health = APIRouter(
+    prefix="/health",
+    tags=["health"],
+)
+
+
+@router_health.get("/ready")
+def get_readiness(response: Response):
+    """503 while NLP models are still loading; NLP-free endpoints are served regardless."""
+    report = readiness()
+    if not report["ready"]:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return report
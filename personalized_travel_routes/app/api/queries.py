@@ -9,8 +9,11 @@ from database.models import Query as DBQuery
 from database.models import Route as DBRoute, RouteLocationMap, Location, Activity
 
 from app import schemas
-from app.nlp.processor import extract_travel_info
+from app.nlp.cache import extraction_cache
+from app.nlp.processor import extract_travel_info, extract_travel_info_batch
 from app.routing.generator import generate_route
+from app.routing.schedule import build_route_schedule
+from app.services.gazetteer import destination_suggestions
 
 print("DEBUG: Loading app/api/queries.py module")
 
@@ -40,6 +43,17 @@ def process_and_save_query(
             missing_fields=["destination"] 
         )
 
+    suggestions_by_destination = destination_suggestions(db, all_destinations)
+    if suggestions_by_destination:
+        print(f"Ambiguous or misspelled destinations {sorted(suggestions_by_destination)}. Returning ClarificationRequired response.")
+        return schemas.ClarificationRequired(
+            message=" ".join(
+                f"Не удалось найти «{destination}». Возможно, вы имели в виду: {', '.join(options)}?"
+                for destination, options in sorted(suggestions_by_destination.items())
+            ),
+            missing_fields=["destination"]
+        )
+
     parameters_to_save_initial = {
          "interests": nlp_results.get("interests", []),
          "travel_style": nlp_results.get("travel_style"),
@@ -61,15 +75,16 @@ def process_and_save_query(
 
     try:
         db.add(db_query_obj)
-        db.commit()
-        db.refresh(db_query_obj)
-        print(f"Initial Query saved with ID: {db_query_obj.id} for user {user_id}")
+        db.flush()
+        print(f"Initial Query inserted with ID: {db_query_obj.id} for user {user_id}")
     except Exception as e:
         db.rollback()
         print(f"Error saving initial query: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to save initial query: {str(e)}")
 
     db_route_generated: Optional[DBRoute] = None 
+    # Route generation runs in a savepoint, so an unexpected error below still keeps the query row.
+    route_savepoint = db.begin_nested()
 
     try:
         status_code_gen, message_gen, route_text_generated, db_route_generated = generate_route(
@@ -82,30 +97,28 @@ def process_and_save_query(
             travel_style=nlp_results.get("travel_style"),
             user_id=user_id,
             query_id=db_query_obj.id,
-            db_session=db
+            db_session=db,
+            commit=False,
         )
         print(f"Route generation result: Status={status_code_gen}, Message='{message_gen}', Route ID={db_route_generated.id if db_route_generated else 'None'} for user {user_id}")
 
         if status_code_gen != 200:
+             # The query is kept even when no route could be built.
+             db.commit()
              raise HTTPException(status_code=status_code_gen, detail=message_gen)
 
         if db_route_generated is None:
              print("Error: generate_route returned status 200 but db_route_generated is None.")
              raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal generation error: Route object is missing.")
 
-        try:           
-             current_parameters = dict(db_query_obj.parameters) 
-             current_parameters['route_id'] = db_route_generated.id
-             
-             db_query_obj.parameters = current_parameters 
-             flag_modified(db_query_obj, "parameters") 
+        current_parameters = dict(db_query_obj.parameters) 
+        current_parameters['route_id'] = db_route_generated.id
+        db_query_obj.parameters = current_parameters 
+        flag_modified(db_query_obj, "parameters") 
 
-             db.commit()
-             db.refresh(db_query_obj) 
-             print(f"Successfully updated parameters for query {db_query_obj.id}. route_id in DB parameters: {db_query_obj.parameters.get('route_id')}.")
-        except Exception as e:
-             db.rollback()
-             print(f"Warning: Failed to update query {db_query_obj.id} parameters with route_id: {e}")
+        # Query, route, its stops and the route_id back-reference go out in one transaction.
+        db.commit()
+        print(f"Saved query {db_query_obj.id} with route {db_route_generated.id} in one transaction.")
 
 
 
@@ -130,8 +143,15 @@ def process_and_save_query(
                     activity_name=activity_obj.name if activity_obj else None,
                     activity_description=activity_obj.description if activity_obj else None,
                     visit_order=rlm_entry.visit_order,
+                    latitude=location_obj.latitude,
+                    longitude=location_obj.longitude,
                 ))
 
+        route_start_date = db_route_generated.start_date.date() if db_route_generated.start_date else None
+        build_route_schedule(
+            locations_on_route_list, route_start_date, db_route_generated.duration_days or 0
+        ).annotate(locations_on_route_list)
+
         full_response_data = {
             "query_id": db_query_obj.id,
             "route_id": db_route_generated.id,
@@ -148,13 +168,28 @@ def process_and_save_query(
     except HTTPException as http_exc:
         raise http_exc
     except Exception as e:
-        db.rollback() 
+        if route_savepoint.is_active:
+            route_savepoint.rollback()
+            db.commit()
+        else:
+            db.rollback()
         print(f"Critical error during route generation or response formation for user {x_user_id}, query {db_query_obj.id}: {e}")
         import traceback
         traceback.print_exc() 
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An unexpected error occurred: {str(e)}")
 
 
+@router.post("/parse/batch", response_model=List[schemas.ExtractedParams])
+def parse_queries_batch(request: schemas.QueryParseBatchRequest):
+    """Extracts travel parameters from many texts at once, in input order; nothing is saved."""
+    return extract_travel_info_batch(request.texts)
+
+
+@router.get("/cache/stats")
+def get_extraction_cache_stats():
+    return extraction_cache.stats()
+
+
 @router.get("/history/{user_id}", response_model=List[schemas.Query])
 def get_user_queries(user_id: int, db: Session = Depends(get_db)):
     user_db_queries = db.query(DBQuery).filter(DBQuery.user_id == user_id).order_by(DBQuery.created_at.desc()).all()
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Header
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Query as FastAPIQuery
 from sqlalchemy.orm import Session, joinedload
 from typing import Optional, List
 from datetime import datetime, date 
 
+import numpy as np
+
 from database.db import get_db
 from database.models import (
     Route as DBRoute, 
@@ -14,8 +16,14 @@ from database.models import (
 )
 from app import schemas
 from app.services.currency import convert_currency
+from app.routing.route_edits import next_visit_order, refresh_route_total_cost, reorder_stops, shift_visit_orders
+from app.routing.reoptimize import DEFAULT_REOPTIMIZE_DEADLINE_MS, MAX_REOPTIMIZE_DEADLINE_MS, reoptimize_stop_order
 from app.routing.generator import format_route_text_with_days_times 
-from sqlalchemy import func as sql_func
+from app.routing.schedule import RouteSchedule, build_route_schedule, default_visit_duration_hours
+from app.routing.insertion import cheapest_insertion_position
+from app.services.spatial_index import get_location_spatial_index
+from app.services.similar_locations import SUGGESTIONS_PER_LOCATION, get_similar_location_index
+from app.services.route_cache import content_fingerprint, rendered_route_cache
 
 
 router_routes = APIRouter(
@@ -23,6 +31,8 @@ router_routes = APIRouter(
     tags=["routes"],
 )
 
+ROUTE_COHERENCE_RADIUS_KM = 30.0
+
 def _get_route_location_details_list(db_session: Session, route_id: int) -> List[schemas.RouteLocationDetail]:
     route_map_entries = db_session.query(RouteLocationMap).options(
         joinedload(RouteLocationMap.location),
@@ -50,11 +60,48 @@ def _get_route_location_details_list(db_session: Session, route_id: int) -> List
             visit_order=rlm.visit_order,
             latitude=loc.latitude,
             longitude=loc.longitude,
-            visit_duration_hours=None 
         ))
     return details_list
 
 
+def _schedule_route_details(details_list: List[schemas.RouteLocationDetail], text_format_params: dict) -> RouteSchedule:
+    """Computes the day split once, fills the per-stop timing fields of details_list and returns it for text rendering."""
+    route_schedule = build_route_schedule(
+        details_list, text_format_params["start_date_obj"], text_format_params["trip_duration_days_total"] or 0
+    )
+    route_schedule.annotate(details_list)
+    return route_schedule
+
+
+def _bump_route_version(route: DBRoute) -> None:
+    """Evaluated in the UPDATE itself, so concurrent edits never end up with the same version."""
+    route.version = DBRoute.version + 1
+
+
+def _check_poi_coherence_with_route(db_session: Session, route_id: int, new_location: DBLocation, allow_distant: bool) -> None:
+    """
+    Rejects a new stop that lies farther than ROUTE_COHERENCE_RADIUS_KM from every stop of the route
+    when the client opts in with allow_distant=false. Distances come from the spatial index's stored coordinates.
+    """
+    if allow_distant or new_location.latitude is None or new_location.longitude is None:
+        return
+    route_location_ids = [row[0] for row in db_session.query(RouteLocationMap.location_id).filter(
+        RouteLocationMap.route_id == route_id
+    ).all()]
+    if not route_location_ids:
+        return
+    distances_km = get_location_spatial_index(db_session).distances_km(
+        new_location.latitude, new_location.longitude, route_location_ids
+    )
+    if np.isnan(distances_km).all() or np.nanmin(distances_km) <= ROUTE_COHERENCE_RADIUS_KM:
+        return
+    print(f"Rejected location {new_location.id}: {np.nanmin(distances_km):.1f} km from the nearest stop of route {route_id}.")
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Место находится дальше {ROUTE_COHERENCE_RADIUS_KM:g} км от всех точек маршрута.",
+    )
+
+
 def _get_params_for_route_text_formatting(db_session: Session, route_obj: DBRoute):
     start_date_val = None
     if route_obj.start_date:
@@ -82,6 +129,17 @@ def _get_params_for_route_text_formatting(db_session: Session, route_obj: DBRout
     }
 
 
+@router_routes.get("/cache/stats")
+def get_rendered_route_cache_stats(
+    db: Session = Depends(get_db),
+    x_user_id: int = Header(..., alias="X-User-ID")
+):
+    user = db.query(DBUser).filter(DBUser.id == x_user_id).first()
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    return rendered_route_cache.stats()
+
+
 @router_routes.get("/{route_id}", response_model=schemas.FullRouteDetailsResponse) 
 def get_route_details(
     route_id: int,
@@ -94,9 +152,7 @@ def get_route_details(
     if x_user_id is None: 
         print("Warning: X-User-ID header is missing for get_route_details!")
 
-    route = db.query(DBRoute).options(
-        joinedload(DBRoute.query) 
-    ).filter(DBRoute.id == route_id).first()
+    route = db.query(DBRoute).filter(DBRoute.id == route_id).first()
 
     if route is None:
         print(f"Route with ID {route_id} NOT FOUND in database.")
@@ -111,17 +167,25 @@ def get_route_details(
     print(f"User {x_user_id} authorized for route {route_id}.")
 
     locations_on_route_list = _get_route_location_details_list(db, route_id)
-    
     text_format_params = _get_params_for_route_text_formatting(db, route)
+    fingerprint = content_fingerprint(locations_on_route_list, text_format_params)
+    cached_response = rendered_route_cache.get(route.id, route.version, fingerprint)
+    if cached_response is not None:
+        return cached_response
+
+    route_schedule = _schedule_route_details(locations_on_route_list, text_format_params)
     generated_route_text = "Описание маршрута не удалось сформировать." 
+    is_cacheable = True
 
     if text_format_params["start_date_obj"] and text_format_params["trip_duration_days_total"] is not None:
         try:
             generated_route_text = format_route_text_with_days_times(
                 pois_on_route=locations_on_route_list,
+                schedule=route_schedule,
                 **text_format_params
             )
         except Exception as e:
+            is_cacheable = False
             print(f"Error formatting route text in get_route_details for route {route.id}: {e}")
             import traceback
             traceback.print_exc()
@@ -140,7 +204,10 @@ def get_route_details(
          "locations_on_route": locations_on_route_list,
     }
     print(f"Returning FullRouteDetailsResponse for route {route_id}")
-    return schemas.FullRouteDetailsResponse(**response_data)
+    response = schemas.FullRouteDetailsResponse(**response_data)
+    if is_cacheable:
+        rendered_route_cache.put(route.id, route.version, fingerprint, response)
+    return response
 
 
 @router_routes.delete("/{route_id}/locations/{map_id}", response_model=schemas.FullRouteDetailsResponse)
@@ -170,46 +237,20 @@ def delete_poi_from_route(
     if not poi_to_delete:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="POI map entry not found in this route")
     
+    deleted_visit_order = poi_to_delete.visit_order
     db.delete(poi_to_delete)
     db.flush() 
     
-    all_remaining_pois_for_route = db.query(RouteLocationMap).filter(
-        RouteLocationMap.route_id == route_id
-    ).order_by(RouteLocationMap.visit_order.asc()).all()
-
-    new_order = 0
-    for poi_map_entry in all_remaining_pois_for_route:
-        poi_map_entry.visit_order = new_order
-        new_order += 1
-    print(f"Re-ordered visit_order for route {route_id}. New count: {len(all_remaining_pois_for_route)}.")
+    shift_visit_orders(db, route_id, deleted_visit_order + 1, -1)
+    print(f"Re-ordered visit_order for route {route_id} after position {deleted_visit_order}.")
     
     route.is_finalized = False
 
-    total_cost_recalculated_rub = 0.0
-    location_ids_in_route = [rlm.location_id for rlm in all_remaining_pois_for_route if rlm.location_id]
-    activity_ids_in_route = [rlm.activity_id for rlm in all_remaining_pois_for_route if rlm.activity_id]
-
-    if location_ids_in_route:
-        locations_with_cost = db.query(DBLocation.cost, DBLocation.cost_currency).filter(DBLocation.id.in_(location_ids_in_route)).all()
-        for cost, currency in locations_with_cost:
-            if cost is not None and currency is not None: 
-                converted_cost = convert_currency(cost, currency, "RUB")
-                if converted_cost is not None:
-                    total_cost_recalculated_rub += converted_cost
-    
-    if activity_ids_in_route:
-        activities_with_cost = db.query(DBActivity.cost, DBActivity.cost_currency).filter(DBActivity.id.in_(activity_ids_in_route)).all()
-        for cost, currency in activities_with_cost:
-            if cost is not None and currency is not None: 
-                converted_cost = convert_currency(cost, currency, "RUB")
-                if converted_cost is not None:
-                    total_cost_recalculated_rub += converted_cost
-    
-    route.total_cost = round(total_cost_recalculated_rub, 2) 
-    route.total_cost_currency = "RUB"
-    print(f"Recalculated total_cost for route {route_id}: {route.total_cost} RUB")
+    refresh_route_total_cost(db, route)
 
     
+    _bump_route_version(route)
+
     try:
         db.commit()
         db.refresh(route) 
@@ -223,6 +264,7 @@ def delete_poi_from_route(
 
     locations_on_route_list = _get_route_location_details_list(db, route.id)
     text_format_params = _get_params_for_route_text_formatting(db, route) 
+    route_schedule = _schedule_route_details(locations_on_route_list, text_format_params)
 
     final_display_cost = text_format_params["total_estimated_cost_user_currency"] 
     final_display_currency = text_format_params["budget_currency_str"]         
@@ -249,7 +291,8 @@ def delete_poi_from_route(
         try:
             updated_route_text = format_route_text_with_days_times(
                 pois_on_route=locations_on_route_list,
-                **text_format_params 
+                schedule=route_schedule,
+                **text_format_params
             )
         except Exception as e:
             print(f"Error formatting route text after delete for route {route.id}: {e}")
@@ -291,7 +334,8 @@ def finalize_route(
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to finalize this route")
 
     route.is_finalized = True 
-    
+    _bump_route_version(route)
+
     try:
         db.commit()
         db.refresh(route) 
@@ -306,7 +350,8 @@ def finalize_route(
     locations_on_route_list = _get_route_location_details_list(db, route.id)
     
     text_format_params = _get_params_for_route_text_formatting(db, route) 
-    
+    route_schedule = _schedule_route_details(locations_on_route_list, text_format_params)
+
     final_display_cost = text_format_params["total_estimated_cost_user_currency"] 
     final_display_currency = text_format_params["budget_currency_str"]         
 
@@ -334,7 +379,8 @@ def finalize_route(
         try:
             finalized_route_text = format_route_text_with_days_times(
                 pois_on_route=locations_on_route_list,
-                **text_format_params 
+                schedule=route_schedule,
+                **text_format_params
             )
         except Exception as e:
             print(f"Error formatting route text after finalize for route {route.id}: {e}")
@@ -393,6 +439,7 @@ def replace_poi_in_route(
         if not new_loc:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"New location with ID {replacement_data.new_item_id} not found.")
         new_location_id_to_set = new_loc.id
+        _check_poi_coherence_with_route(db, route_id, new_loc, replacement_data.allow_distant)
     elif replacement_data.new_item_type == "activity":
         new_act = db.query(DBActivity).options(joinedload(DBActivity.location)).filter(DBActivity.id == replacement_data.new_item_id).first()
         if not new_act:
@@ -401,41 +448,19 @@ def replace_poi_in_route(
              raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Activity {new_act.name} does not have an associated location.")
         new_location_id_to_set = new_act.location_id
         new_activity_id_to_set = new_act.id
+        _check_poi_coherence_with_route(db, route_id, new_act.location, replacement_data.allow_distant)
     else:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid new_item_type.")
 
     rlm_to_replace.location_id = new_location_id_to_set
     rlm_to_replace.activity_id = new_activity_id_to_set
 
-    current_rlm_entries_for_cost = db.query(RouteLocationMap).filter(RouteLocationMap.route_id == route_id).all()
-    
-    total_cost_recalculated_rub = 0.0
-    location_ids_in_route = [rlm.location_id for rlm in current_rlm_entries_for_cost if rlm.location_id]
-    activity_ids_in_route = [rlm.activity_id for rlm in current_rlm_entries_for_cost if rlm.activity_id]
-
-    if location_ids_in_route:
-        locations_with_cost = db.query(DBLocation.cost, DBLocation.cost_currency).filter(DBLocation.id.in_(location_ids_in_route)).all()
-        for cost, currency in locations_with_cost:
-            if cost is not None and currency is not None:
-                converted_cost = convert_currency(cost, currency, "RUB")
-                if converted_cost is not None:
-                    total_cost_recalculated_rub += converted_cost
-    
-    if activity_ids_in_route:
-        
-        activities_with_cost = db.query(DBActivity.cost, DBActivity.cost_currency).filter(DBActivity.id.in_(activity_ids_in_route)).all()
-        for cost, currency in activities_with_cost:
-            if cost is not None and currency is not None:
-                converted_cost = convert_currency(cost, currency, "RUB")
-                if converted_cost is not None:
-                    total_cost_recalculated_rub += converted_cost
-
-    route.total_cost = round(total_cost_recalculated_rub, 2)
-    route.total_cost_currency = "RUB"
-    print(f"Recalculated total_cost after replacement for route {route_id}: {route.total_cost} RUB")
+    refresh_route_total_cost(db, route)
     
     route.is_finalized = False
 
+    _bump_route_version(route)
+
     try:
         db.commit()
         db.refresh(route)
@@ -449,7 +474,8 @@ def replace_poi_in_route(
 
     locations_on_route_list = _get_route_location_details_list(db, route.id)
     text_format_params = _get_params_for_route_text_formatting(db, route)
-    
+    route_schedule = _schedule_route_details(locations_on_route_list, text_format_params)
+
     final_display_cost = text_format_params["total_estimated_cost_user_currency"]
     final_display_currency = text_format_params["budget_currency_str"]
     original_budget_currency = "RUB"
@@ -474,6 +500,7 @@ def replace_poi_in_route(
         try:
             updated_route_text = format_route_text_with_days_times(
                 pois_on_route=locations_on_route_list,
+                schedule=route_schedule,
                 **text_format_params
             )
         except Exception as e:
@@ -493,6 +520,43 @@ def replace_poi_in_route(
     )
 
 
+@router_routes.get("/{route_id}/locations/{map_id}/suggestions", response_model=List[schemas.ReplacementSuggestion])
+def get_replacement_suggestions(
+    route_id: int,
+    map_id: int,
+    limit: int = FastAPIQuery(5, ge=1, le=SUGGESTIONS_PER_LOCATION),
+    db: Session = Depends(get_db),
+    x_user_id: int = Header(..., alias="X-User-ID")
+):
+    route = db.query(DBRoute).filter(DBRoute.id == route_id).first()
+    if not route:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Route not found")
+    if route.user_id != x_user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to modify this route")
+
+    route_location_ids = dict(db.query(RouteLocationMap.id, RouteLocationMap.location_id).filter(
+        RouteLocationMap.route_id == route_id
+    ).all())
+    if map_id not in route_location_ids:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="POI map entry not found in this route")
+
+    suggestions = get_similar_location_index(db).suggestions_for(
+        route_location_ids[map_id], limit=limit, exclude_ids=route_location_ids.values()
+    )
+    if not suggestions:
+        return []
+    locations_by_id = {loc.id: loc for loc in db.query(DBLocation).filter(DBLocation.id.in_([s[0] for s in suggestions])).all()}
+    return [
+        schemas.ReplacementSuggestion(
+            id=loc.id, name=loc.name, item_type="location", description=loc.description,
+            city=loc.city, country=loc.country, location_type=loc.type, rating=loc.rating,
+            cost=loc.cost, cost_currency=loc.cost_currency, distance_km=round(distance_km, 3),
+        )
+        for location_id, distance_km in suggestions
+        if (loc := locations_by_id.get(location_id)) is not None
+    ]
+
+
 @router_routes.post("/{route_id}/locations", response_model=schemas.FullRouteDetailsResponse, status_code=status.HTTP_201_CREATED)
 def add_poi_to_route(
     route_id: int,
@@ -515,17 +579,15 @@ def add_poi_to_route(
 
     new_location_id_to_set = None
     new_activity_id_to_set = None
-    poi_cost = 0.0 
-    poi_cost_currency = "RUB"
+    new_stop_location = None
 
     if addition_data.item_type == "location":
         new_loc = db.query(DBLocation).filter(DBLocation.id == addition_data.item_id).first()
         if not new_loc:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Location to add (ID {addition_data.item_id}) not found.")
         new_location_id_to_set = new_loc.id
-        if new_loc.cost is not None and new_loc.cost_currency is not None:
-            converted = convert_currency(new_loc.cost, new_loc.cost_currency, "RUB")
-            if converted is not None: poi_cost = converted
+        new_stop_location = new_loc
+        _check_poi_coherence_with_route(db, route_id, new_loc, addition_data.allow_distant)
             
     elif addition_data.item_type == "activity":
         new_act = db.query(DBActivity).options(joinedload(DBActivity.location)).filter(DBActivity.id == addition_data.item_id).first()
@@ -535,17 +597,30 @@ def add_poi_to_route(
              raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Activity {new_act.name} does not have an associated location.")
         new_location_id_to_set = new_act.location_id
         new_activity_id_to_set = new_act.id
-        if new_act.cost is not None and new_act.cost_currency is not None:
-            converted = convert_currency(new_act.cost, new_act.cost_currency, "RUB")
-            if converted is not None: poi_cost = converted
+        new_stop_location = new_act.location
+        _check_poi_coherence_with_route(db, route_id, new_act.location, addition_data.allow_distant)
     else:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid item_type for addition.")
 
-    max_visit_order_result = db.query(sql_func.max(RouteLocationMap.visit_order)).filter(RouteLocationMap.route_id == route_id).scalar()
-    new_visit_order = 0
-    if max_visit_order_result is not None:
-        new_visit_order = max_visit_order_result + 1
-    
+    new_visit_order = None
+    if addition_data.placement == "cheapest":
+        current_stops = _get_route_location_details_list(db, route.id)
+        insert_position = cheapest_insertion_position(
+            current_stops,
+            _schedule_route_details(current_stops, _get_params_for_route_text_formatting(db, route)),
+            new_stop_location.latitude,
+            new_stop_location.longitude,
+            default_visit_duration_hours(new_stop_location.type),
+        )
+        if insert_position is None:
+            print(f"No day of route {route_id} has room for the new stop, appending it.")
+        elif insert_position < len(current_stops):
+            new_visit_order = current_stops[insert_position].visit_order
+            shift_visit_orders(db, route_id, new_visit_order, 1)
+            print(f"Inserting new stop of route {route_id} at visit_order {new_visit_order}.")
+    if new_visit_order is None:
+        new_visit_order = next_visit_order(db, route_id)
+
     new_rlm_entry = RouteLocationMap(
         route_id=route.id,
         location_id=new_location_id_to_set,
@@ -554,14 +629,12 @@ def add_poi_to_route(
     )
     db.add(new_rlm_entry)
     
-    if route.total_cost is None: route.total_cost = 0.0 
-    route.total_cost += poi_cost 
-    route.total_cost = round(route.total_cost, 2)
-    route.total_cost_currency = "RUB" 
-    print(f"Updated total_cost after addition for route {route_id}: {route.total_cost} RUB")
+    refresh_route_total_cost(db, route)
     
     route.is_finalized = False
 
+    _bump_route_version(route)
+
     try:
         db.commit()
         db.refresh(route)
@@ -575,7 +648,8 @@ def add_poi_to_route(
 
     locations_on_route_list = _get_route_location_details_list(db, route.id)
     text_format_params = _get_params_for_route_text_formatting(db, route)
-    
+    route_schedule = _schedule_route_details(locations_on_route_list, text_format_params)
+
     final_display_cost = text_format_params["total_estimated_cost_user_currency"]
     final_display_currency = text_format_params["budget_currency_str"]
     original_budget_currency = "RUB"
@@ -600,6 +674,7 @@ def add_poi_to_route(
         try:
             updated_route_text = format_route_text_with_days_times(
                 pois_on_route=locations_on_route_list,
+                schedule=route_schedule,
                 **text_format_params
             )
         except Exception as e:
@@ -618,4 +693,51 @@ def add_poi_to_route(
         duration_days=route.duration_days,
         is_finalized=route.is_finalized,
         locations_on_route=locations_on_route_list
-    )
\ No newline at end of file
+    )
+
+
+@router_routes.post("/{route_id}/reoptimize", response_model=schemas.FullRouteDetailsResponse)
+def reoptimize_route(
+    route_id: int,
+    deadline_ms: float = FastAPIQuery(DEFAULT_REOPTIMIZE_DEADLINE_MS, gt=0, le=MAX_REOPTIMIZE_DEADLINE_MS,
+                                      description="Latency budget of the optimization in milliseconds"),
+    db: Session = Depends(get_db),
+    x_user_id: int = Header(..., alias="X-User-ID")
+):
+    print(f"--- Re-optimizing Route ---")
+    print(f"User ID: {x_user_id}, Route ID: {route_id}, deadline: {deadline_ms} ms")
+
+    route = db.query(DBRoute).filter(DBRoute.id == route_id).first()
+
+    if not route:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Route not found")
+    if route.user_id != x_user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to modify this route")
+
+    locations_on_route_list = _get_route_location_details_list(db, route.id)
+    text_format_params = _get_params_for_route_text_formatting(db, route)
+    new_map_id_order = reoptimize_stop_order(
+        locations_on_route_list,
+        text_format_params["start_date_obj"],
+        text_format_params["trip_duration_days_total"] or 0,
+        deadline_ms=deadline_ms,
+    )
+
+    if new_map_id_order is None:
+        print(f"Route {route_id} is already in its best known order.")
+    else:
+        reorder_stops(db, route_id, new_map_id_order)
+        route.is_finalized = False
+        _bump_route_version(route)
+        try:
+            db.commit()
+            db.refresh(route)
+            print(f"Route {route_id} re-ordered: {new_map_id_order}")
+        except Exception as e:
+            db.rollback()
+            print(f"Error during commit after re-optimizing route {route_id}: {e}")
+            import traceback
+            traceback.print_exc()
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Database error after re-optimizing route: {str(e)}")
+
+    return get_route_details(route_id=route.id, db=db, x_user_id=x_user_id)
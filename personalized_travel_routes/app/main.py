@@ -1,8 +1,10 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 
-from database.db import get_db
+from database.db import SessionLocal, get_db
 
 from app.api import users
 from app.api import queries
@@ -10,8 +12,21 @@ from app.api import routes
 from app.api import reviews
 from app.api import recommendations
 from app.api import search 
+from app.api import health
+from app.nlp.models import start_background_loading
+from app.services.currency import start_rates_sync
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # NLP models load off the request path; /health/ready reports when they are in.
+    start_background_loading()
+    # cost_rub is recomputed here, in its own transaction, never inside a request.
+    start_rates_sync(SessionLocal)
+    yield
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 origins = [ "http://localhost:5173", "http://127.0.0.1:5173" ]
 
@@ -33,3 +48,4 @@ app.include_router(routes.router_routes)
 app.include_router(reviews.router_reviews)
 app.include_router(recommendations.router_recommendations)
 app.include_router(search.router_search)
+app.include_router(health.router_health)
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+EXTRACTION_CACHE_MAX_ENTRIES = 10000
+# Optional sqlite file shared by all workers on a host; unset keeps the cache in-process only.
+EXTRACTION_CACHE_DB = os.getenv("EXTRACTION_CACHE_DB")
+EXTRACTION_CACHE_DB_MAX_ENTRIES = 200000
+# The disk tier is trimmed back to EXTRACTION_CACHE_DB_MAX_ENTRIES once per this many writes.
+EXTRACTION_CACHE_DB_PRUNE_EVERY = 1000
+
+
+def normalize_query_text(text: str) -> str:
+    """
+    NFC form with whitespace runs collapsed and trimmed. Case is kept: NER depends on it.
+    Extraction runs on the normalized text, so texts with the same key get the same result.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def extraction_cache_key(normalized_text: str, version_fingerprint: str) -> str:
+    return hashlib.sha256(f"{version_fingerprint}\0{normalized_text}".encode("utf-8")).hexdigest()
+
+
+def copy_extraction_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    # Callers may mutate the lists they get; the tuples and strings inside are immutable.
+    return {k: list(v) if isinstance(v, list) else v for k, v in result.items()}
+
+
+def _result_from_json(payload: str) -> Dict[str, Any]:
+    result = json.loads(payload)
+    if result.get("raw_entities") is not None:
+        result["raw_entities"] = [tuple(entity) for entity in result["raw_entities"]]
+    return result
+
+
+class ExtractionCache:
+    """
+    Content-addressed cache of extract_travel_info results.
+
+    The key is a hash of the normalized query text and the version of every NLP model, so
+    retraining or upgrading a model never serves old results and nothing is ever invalidated.
+    The in-memory LRU holds up to max_entries results; the optional sqlite tier (WAL mode, so
+    workers can read while another writes) lets one worker reuse another's extractions.
+    """
+
+    def __init__(self, db_path: Optional[str] = EXTRACTION_CACHE_DB, max_entries: int = EXTRACTION_CACHE_MAX_ENTRIES):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._connection_pid: Optional[int] = None
+        self._writes_since_prune = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _db(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so each worker process opens its own.
+        if self._connection is None or self._connection_pid != os.getpid():
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.db_path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS extraction_cache (key TEXT PRIMARY KEY, result TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._connection, self._connection_pid = connection, os.getpid()
+        return self._connection
+
+    def _remember(self, key: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy_extraction_result(result)
+
+        if self.db_path:
+            try:
+                with self._db_lock:
+                    row = self._db().execute("SELECT result FROM extraction_cache WHERE key = ?", (key,)).fetchone()
+                result = _result_from_json(row[0]) if row else None
+            except (sqlite3.Error, OSError, ValueError) as e:
+                print(f"Warning: extraction cache read failed: {e}")
+                result = None
+            if result is not None:
+                self._remember(key, result)
+                with self._lock:
+                    self.disk_hits += 1
+                return copy_extraction_result(result)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        self._remember(key, copy_extraction_result(result))
+        if not self.db_path:
+            return
+        try:
+            payload = json.dumps(result, ensure_ascii=False)
+            with self._db_lock:
+                connection = self._db()
+                connection.execute(
+                    "INSERT OR REPLACE INTO extraction_cache (key, result, created_at) VALUES (?, ?, ?)",
+                    (key, payload, time.time()),
+                )
+                self._writes_since_prune += 1
+                if self._writes_since_prune >= EXTRACTION_CACHE_DB_PRUNE_EVERY:
+                    self._writes_since_prune = 0
+                    connection.execute(
+                        "DELETE FROM extraction_cache WHERE key IN "
+                        "(SELECT key FROM extraction_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                        (EXTRACTION_CACHE_DB_MAX_ENTRIES,),
+                    )
+        except (sqlite3.Error, OSError, TypeError, ValueError) as e:
+            print(f"Warning: could not persist extraction result: {e}")
+
+    def clear(self) -> None:
+        """Empties the in-memory tier and resets the counters; the shared disk tier is left alone."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+extraction_cache = ExtractionCache()
@@ -0,0 +1,149 @@
+import re
+import threading
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# Trie node key under which a node stores the indices of the categories whose phrase ends there
+# (phrase trie) or the keyword words whose stem ends there (stem trie).
+_LEAF = ""
+
+# Without lemmas a token matches a keyword word when it is the word's stem plus one of these
+# case/number endings: "паркам" -> "парк", "музеям" -> "музей", but "барселону" is not "бар".
+INFLECTION_ENDINGS = frozenset({
+    "", "а", "я", "о", "е", "и", "ы", "у", "ю", "ь", "й",
+    "ой", "ей", "ий", "ый", "ая", "яя", "ое", "ее", "ие", "ые", "ую", "юю", "ью",
+    "ом", "ем", "ам", "ям", "ым", "им", "ах", "ях", "ых", "их", "ов", "ев", "ми",
+    "ами", "ями", "ого", "его", "ому", "ему", "ыми", "ими",
+})
+_MAX_INFLECTION_LENGTH = max(len(ending) for ending in INFLECTION_ENDINGS)
+_ADJECTIVE_ENDINGS = ("ий", "ый", "ой", "ая", "яя", "ое", "ее", "ые", "ие")
+_FINAL_INFLECTED_LETTERS = set("аяоеиыуюйь")
+# Shorter stems ("сп" of "спа", "эк" of "эко") would match too much; such words only match as written.
+MIN_STEM_LENGTH = 3
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def word_stem(word: str) -> str:
+    """Drops the dictionary-form ending of a Russian noun or adjective ("музей" -> "музе", "бюджетный" -> "бюджетн")."""
+    for ending in _ADJECTIVE_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            return word[:-len(ending)]
+    if word and word[-1] in _FINAL_INFLECTED_LETTERS and len(word) - 1 >= MIN_STEM_LENGTH:
+        return word[:-1]
+    return word
+
+
+class _KeywordIndex:
+    """Single-word keywords in a dict, phrases in a trie over tokens."""
+
+    def __init__(self, variants: Iterable[Tuple[int, str]]):
+        self.words: Dict[str, Set[int]] = {}
+        self.phrase_trie: Dict[str, dict] = {}
+        self.max_phrase_tokens = 0
+        for category_index, variant in variants:
+            tokens = tokenize(variant)
+            if len(tokens) == 1:
+                self.words.setdefault(tokens[0], set()).add(category_index)
+            elif tokens:
+                node = self.phrase_trie
+                for token in tokens:
+                    node = node.setdefault(token, {})
+                node.setdefault(_LEAF, set()).add(category_index)
+                self.max_phrase_tokens = max(self.max_phrase_tokens, len(tokens))
+
+    def match(self, token_forms: List[Set[str]]) -> Set[int]:
+        """Category indices matched by a text given, per token, the keyword words that token can stand for."""
+        found: Set[int] = set()
+        for forms in token_forms:
+            for form in forms & self.words.keys():
+                found |= self.words[form]
+        if not self.phrase_trie:
+            return found
+        for start in range(len(token_forms)):
+            nodes = [self.phrase_trie]
+            for forms in token_forms[start:start + self.max_phrase_tokens]:
+                nodes = [node[form] for node in nodes for form in forms if form in node]
+                if not nodes:
+                    break
+                for node in nodes:
+                    found.update(node.get(_LEAF, ()))
+        return found
+
+
+class KeywordMatcher:
+    """
+    Finds which categories of a {category: [keyword, ...]} table occur in a text, in one pass.
+
+    Keywords are matched as whole tokens, so "бар" never matches inside "барселона".
+    Single-word keywords are looked up in one dict; phrases go into a trie over tokens.
+
+    Lemmatized text (lemmatized=True) is matched against each keyword as written and in lemma
+    form ("горы" matches "гора"); the lemma forms are compiled on the first such call, when the
+    lemmatizer is known to work. Text that could not be lemmatized is matched through a trie of
+    keyword stems instead: a token stands for a keyword word when it is that word's stem plus an
+    inflection ending ("паркам" -> "парк").
+    """
+
+    def __init__(self, table: Mapping[str, Sequence[str]], lemmatizer: Optional[Callable[[str], str]] = None):
+        self.categories = list(table)
+        self._table = table
+        self._lemmatizer = lemmatizer
+        self._surface_index: Optional[_KeywordIndex] = None
+        self._lemma_index: Optional[_KeywordIndex] = None
+        self._stem_trie: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _keywords(self) -> Iterable[Tuple[int, str]]:
+        for category_index, keywords in enumerate(self._table.values()):
+            for keyword in keywords:
+                yield category_index, keyword
+
+    def _compile_surface(self) -> None:
+        index = _KeywordIndex(self._keywords())
+        stem_trie: Dict[str, dict] = {}
+        keyword_words = set(index.words)
+        for _, keyword in self._keywords():
+            keyword_words.update(tokenize(keyword))
+        for word in keyword_words:
+            node = stem_trie
+            for char in word_stem(word):
+                node = node.setdefault(char, {})
+            node.setdefault(_LEAF, set()).add(word)
+        self._stem_trie = stem_trie
+        self._surface_index = index
+
+    def _compile_lemmas(self) -> None:
+        variants = list(self._keywords())
+        if self._lemmatizer is not None:
+            variants += [(category_index, self._lemmatizer(keyword)) for category_index, keyword in self._keywords()]
+        self._lemma_index = _KeywordIndex(variants)
+
+    def _inflected_keyword_words(self, token: str) -> Set[str]:
+        """The token itself plus every keyword word whose stem, followed by an inflection ending, spells it."""
+        forms = {token}
+        node = self._stem_trie
+        for position, char in enumerate(token):
+            node = node.get(char)
+            if node is None:
+                break
+            if _LEAF in node and len(token) - position - 1 <= _MAX_INFLECTION_LENGTH and token[position + 1:] in INFLECTION_ENDINGS:
+                forms |= node[_LEAF]
+        return forms
+
+    def match(self, text: str, lemmatized: bool = False) -> List[str]:
+        """Categories with at least one keyword in text, in table order."""
+        if self._surface_index is None or (lemmatized and self._lemma_index is None):
+            with self._lock:
+                if self._surface_index is None:
+                    self._compile_surface()
+                if lemmatized and self._lemma_index is None:
+                    self._compile_lemmas()
+        tokens = tokenize(text)
+        if lemmatized:
+            found = self._lemma_index.match([{token} for token in tokens])
+        else:
+            found = self._surface_index.match([self._inflected_keyword_words(token) for token in tokens])
+        return [self.categories[i] for i in sorted(found)]
@@ -0,0 +1,182 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+NLP_DIR = os.path.dirname(__file__)
+SPACY_MODEL_NAME = "ru_core_news_sm"
+STYLE_MODEL_PATH = os.path.join(NLP_DIR, "travel_style_model.pkl")
+INTEREST_MODEL_PATH = os.path.join(NLP_DIR, "interest_classifier_model.pkl")
+INTEREST_BINARIZER_PATH = os.path.join(NLP_DIR, "interest_label_binarizer.pkl")
+# "background": start loading every model on a thread when the app starts (see app.main);
+# "lazy": load each model on its first use only.
+NLP_MODEL_LOADING = os.getenv("NLP_MODEL_LOADING", "background")
+
+STATE_NOT_LOADED = "not_loaded"
+STATE_LOADING = "loading"
+STATE_READY = "ready"
+STATE_UNAVAILABLE = "unavailable"  # files missing: callers fall back to keywords
+STATE_FAILED = "failed"
+
+
+class ModelUnavailable(Exception):
+    pass
+
+
+class LazyModel:
+    """
+    A model loaded at most once, on first get() or by preload(). Concurrent callers block on
+    the same load instead of loading twice; a model that could not be loaded yields None.
+
+    versioner identifies the model from its files alone (raising ModelUnavailable when they are
+    missing), so the version is known before, and without, loading it.
+    """
+
+    def __init__(self, name: str, loader: Callable[[], Any], versioner: Callable[[], str]):
+        self.name = name
+        self._loader = loader
+        self._versioner = versioner
+        self._lock = threading.Lock()
+        self._value: Any = None
+        self.state = STATE_NOT_LOADED
+        self.load_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+        # Identifies what produced this model's predictions (see version_fingerprint).
+        self.version: Optional[str] = None
+        self._expected_version: Optional[str] = None
+
+    def get(self) -> Any:
+        if self.state in (STATE_READY, STATE_UNAVAILABLE, STATE_FAILED):
+            return self._value
+        with self._lock:
+            if self.state == STATE_NOT_LOADED:
+                self._load()
+        return self._value
+
+    def _load(self) -> None:
+        self.state = STATE_LOADING
+        started = time.perf_counter()
+        print(f"Loading NLP model '{self.name}'...")
+        try:
+            self._value = self._loader()
+            self.version = self.expected_version()
+            self.state = STATE_READY
+            print(f"NLP model '{self.name}' loaded in {time.perf_counter() - started:.2f} s.")
+        except ModelUnavailable as e:
+            self.error = str(e)
+            self.state = STATE_UNAVAILABLE
+            print(f"NLP model '{self.name}' unavailable: {e}")
+        except Exception as e:
+            self.error = f"{e.__class__.__name__}: {e}"
+            self.state = STATE_FAILED
+            print(f"Error loading NLP model '{self.name}': {self.error}")
+        self.load_seconds = round(time.perf_counter() - started, 3)
+
+    def expected_version(self) -> str:
+        """Version the model's files load as, or STATE_UNAVAILABLE; computed once, never loads the model."""
+        if self._expected_version is None:
+            try:
+                self._expected_version = self._versioner()
+            except ModelUnavailable:
+                self._expected_version = STATE_UNAVAILABLE
+        return self._expected_version
+
+    def fingerprint(self) -> str:
+        """version once loaded, the state if loading did not succeed, expected_version() until then."""
+        if self.state == STATE_READY:
+            return self.version
+        if self.state in (STATE_UNAVAILABLE, STATE_FAILED):
+            return self.state
+        return self.expected_version()
+
+    def status(self) -> Dict[str, Any]:
+        return {"state": self.state, "version": self.version, "load_seconds": self.load_seconds, "error": self.error}
+
+
+def _load_spacy_pipeline():
+    import spacy
+
+    try:
+        pipeline = spacy.load(SPACY_MODEL_NAME)
+    except OSError:
+        raise ModelUnavailable(
+            f"spaCy model '{SPACY_MODEL_NAME}' is not installed (python -m spacy download {SPACY_MODEL_NAME})"
+        )
+    if 'lemmatizer' not in pipeline.pipe_names:
+        print("Warning: 'lemmatizer' component not found in the loaded spaCy model. Lemmatization may not work correctly.")
+    return pipeline
+
+
+def _load_joblib(*paths: str):
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        raise ModelUnavailable(f"not found: {', '.join(missing)}")
+    import joblib
+
+    loaded = tuple(joblib.load(path) for path in paths)
+    return loaded if len(loaded) > 1 else loaded[0]
+
+
+def _spacy_model_version() -> str:
+    from importlib import metadata
+
+    try:
+        return f"{SPACY_MODEL_NAME}-{metadata.version(SPACY_MODEL_NAME)}"
+    except metadata.PackageNotFoundError:
+        raise ModelUnavailable(f"spaCy model '{SPACY_MODEL_NAME}' is not installed")
+
+
+def _files_version(*paths: str) -> str:
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        raise ModelUnavailable(f"not found: {', '.join(missing)}")
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+spacy_pipeline = LazyModel("spacy", _load_spacy_pipeline, _spacy_model_version)
+travel_style_model = LazyModel(
+    "travel_style", lambda: _load_joblib(STYLE_MODEL_PATH), lambda: _files_version(STYLE_MODEL_PATH)
+)
+interest_classifier = LazyModel(
+    "interest_classifier",
+    lambda: _load_joblib(INTEREST_MODEL_PATH, INTEREST_BINARIZER_PATH),
+    lambda: _files_version(INTEREST_MODEL_PATH, INTEREST_BINARIZER_PATH),
+)
+ALL_MODELS = (spacy_pipeline, travel_style_model, interest_classifier)
+
+
+def start_background_loading() -> Optional[threading.Thread]:
+    """Loads every model on a daemon thread so the server can accept requests meanwhile."""
+    if NLP_MODEL_LOADING != "background":
+        return None
+
+    def load_all():
+        for model in ALL_MODELS:
+            model.get()
+
+    thread = threading.Thread(target=load_all, name="nlp-model-loader", daemon=True)
+    thread.start()
+    return thread
+
+
+def version_fingerprint() -> str:
+    """
+    "name=version" of every model, or "name=<state>" for one that is unavailable or failed, since
+    the keyword fallbacks then produce different results. Never waits for a model to load: one
+    still loading is identified by the version its files will load as.
+    """
+    return ";".join(f"{model.name}={model.fingerprint()}" for model in ALL_MODELS)
+
+
+def readiness() -> Dict[str, Any]:
+    """Per-model load state; ready once no model is still pending (missing models count, keywords cover them)."""
+    models = {model.name: model.status() for model in ALL_MODELS}
+    is_ready = all(m["state"] in (STATE_READY, STATE_UNAVAILABLE, STATE_FAILED) for m in models.values())
+    if NLP_MODEL_LOADING == "lazy":
+        is_ready = all(m["state"] != STATE_LOADING for m in models.values())
+    return {"ready": is_ready, "loading_mode": NLP_MODEL_LOADING, "models": models}
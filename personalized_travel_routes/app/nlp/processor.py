@@ -1,89 +1,38 @@
-import spacy
-import os
-import joblib
 import re
-import numpy as np
 from typing import Dict, Any, Optional, List, Tuple, Union
 from datetime import date, timedelta
-from sklearn.preprocessing import MultiLabelBinarizer
 
+import numpy as np
+
+from app.nlp.cache import copy_extraction_result, extraction_cache, extraction_cache_key, normalize_query_text
+from app.nlp.keyword_matcher import KeywordMatcher
+from app.nlp.models import spacy_pipeline, travel_style_model, interest_classifier, version_fingerprint
 
-PROCESSOR_DIR = os.path.dirname(__file__)
-STYLE_MODEL_PATH = os.path.join(PROCESSOR_DIR, "travel_style_model.pkl")
-INTEREST_MODEL_PATH = os.path.join(PROCESSOR_DIR, "interest_classifier_model.pkl")
-INTEREST_BINARIZER_PATH = os.path.join(PROCESSOR_DIR, "interest_label_binarizer.pkl")
 
 INTEREST_PREDICTION_THRESHOLD = 0.2
+# Part of the extraction cache key: bump when results change for the same models and text.
+EXTRACTION_LOGIC_VERSION = 3
+NLP_PIPE_BATCH_SIZE = 64
 
-
-nlp = None
-try:
-    print("Loading spaCy Russian model...")
-    nlp = spacy.load("ru_core_news_sm")
-    print("spaCy model loaded.")
-except OSError:
-    print("SpaCy Russian model not found. Downloading...")
-    try:
-        spacy.cli.download("ru_core_news_sm")
-        nlp = spacy.load("ru_core_news_sm")
-        print("SpaCy model downloaded and loaded.")
-    except Exception as e:
-        print(f"Error downloading/loading spaCy model: {e}")
-
-nlp_lemmatizer = None
-try:
-    print("Loading spaCy Russian model for lemmatization...")
-    nlp_lemmatizer = spacy.load("ru_core_news_sm", disable=["parser", "ner", "textcat", "senter"])
-    print("SpaCy model loaded for lemmatization.")
-    if 'lemmatizer' not in nlp_lemmatizer.pipe_names:
-        print("Warning: 'lemmatizer' component not found in the loaded spaCy model. Lemmatization may not work correctly.")
-except OSError:
-    print("SpaCy Russian model not found for lemmatization. Downloading...")
-    try:
-        spacy.cli.download("ru_core_news_sm")
-        nlp_lemmatizer = spacy.load("ru_core_news_sm", disable=["parser", "ner", "textcat", "senter"])
-        print("SpaCy model downloaded and loaded for lemmatization.")
-        if 'lemmatizer' not in nlp_lemmatizer.pipe_names:
-             print("Warning: 'lemmatizer' component not found after download and load.")
-    except Exception as e:
-        print(f"Error downloading/loading spaCy model for lemmatization: {e}")
-except Exception as e:
-    print(f"Error loading spaCy model: {e}")
-    nlp_lemmatizer = None
+# Components a lemmatize-only call skips; they are disabled per call, the pipeline itself is shared.
+LEMMATIZE_ONLY_DISABLED_PIPES = ("parser", "ner", "textcat", "senter")
 
 
-def lemmatize_text(text):
-    if nlp_lemmatizer is None:
-         return text
-    doc = nlp_lemmatizer(text)
+def lemmas_from_doc(doc) -> str:
     return " ".join([token.lemma_ for token in doc if not token.is_punct and not token.is_space])
 
 
-travel_style_model = None
-if os.path.exists(STYLE_MODEL_PATH):
-    try:
-        print(f"Loading travel style classification model from {STYLE_MODEL_PATH}...")
-        travel_style_model = joblib.load(STYLE_MODEL_PATH)
-        print("Travel style classification model loaded successfully.")
-    except Exception as e:
-        print(f"Error loading travel style model: {e}")
-        print(f"Details: {e.__class__.__name__}: {e}")
-
-
-interest_classifier_model = None
-interest_label_binarizer = None
-if os.path.exists(INTEREST_MODEL_PATH) and os.path.exists(INTEREST_BINARIZER_PATH):
-    try:
-        print(f"Loading interest classification model from {INTEREST_MODEL_PATH}...")
-        interest_classifier_model = joblib.load(INTEREST_MODEL_PATH)
-        print(f"Loading interest label binarizer from {INTEREST_BINARIZER_PATH}...")
-        interest_label_binarizer = joblib.load(INTEREST_BINARIZER_PATH)
-        print("Interest models loaded successfully.")
-    except Exception as e:
-        print(f"Error loading interest models: {e}")
-        print(f"Details: {e.__class__.__name__}: {e}")
-else:
-     print(f"Interest models not found. Interests will be determined by keywords.")
+def lemmatize_text(text):
+    """
+    Lemmatizes with the shared pipeline, skipping parser/NER for this call only. Unlike
+    nlp.select_pipes, per-call disabling does not mutate the pipeline, so concurrent requests
+    in other threads keep their full pipeline.
+    """
+    nlp = spacy_pipeline.get()
+    if nlp is None:
+         return text
+    doc = nlp(text, disable=[name for name in LEMMATIZE_ONLY_DISABLED_PIPES if name in nlp.pipe_names])
+    return lemmas_from_doc(doc)
 
 
 INTEREST_KEYWORDS_FALLBACK = {
@@ -135,133 +84,178 @@ TRAVEL_STYLE_KEYWORDS_FALLBACK = {
      "Сафари": ["сафари", "животные", "Африка"],
      "Исследовательский туризм": ["исследование", "экспедиция", "наука"],
 }
+interest_keyword_matcher = KeywordMatcher(INTEREST_KEYWORDS_FALLBACK, lemmatize_text)
+travel_style_keyword_matcher = KeywordMatcher(TRAVEL_STYLE_KEYWORDS_FALLBACK, lemmatize_text)
 
 
-def extract_travel_info(text: str) -> Dict[str, Any]:
+def _entities_from_doc(doc, processed_text: str):
     dates: Optional[Union[str, Tuple[date, date], timedelta]] = None
     budget: Optional[float] = None
     destinations: set[str] = set()
-    raw_entities: List[Tuple[str, str]] = []
-
-    processed_text = text.lower()
-    if nlp_lemmatizer is not None:
-         try:
-              doc_lemmatizer = nlp_lemmatizer(text)
-              processed_text = " ".join([token.lemma_ for token in doc_lemmatizer if not token.is_punct and not token.is_space])
-         except Exception as e:
-              print(f"Error during lemmatization: {e}")
-              processed_text = text.lower()
-
-
-    if nlp is not None:
-        try:
-            doc_nlp = nlp(text)
-            raw_entities = [(ent.text, ent.label_) for ent in doc_nlp.ents]
-
-            for ent in doc_nlp.ents:
-                if ent.label_ == "DATE" or ent.label_ == "DURATION":
-                    dates = ent.text
-
-                elif ent.label_ == "MONEY":
-                     try:
-                         budget_text = ent.text.replace(",", ".").replace(" ", "").lower()
-                         budget_text = budget_text.replace("рублей", "").replace("руб", "").replace("$", "").replace("€", "")
-                         numbers = re.findall(r'\d+\.?\d*', budget_text)
-                         if numbers:
-                             budget = float(numbers[0])
-                     except ValueError:
-                         pass
-
-                elif ent.label_ == "LOC" or ent.label_ == "GPE":
-                     destinations.add(ent.text)
-
-            if dates is None:
-                 duration_match = re.search(r'на (\d+)\s*(день|дня|дней|неделю|недели|недель|месяц|месяца|месяцев)', processed_text)
-                 if duration_match:
-                     number = int(duration_match.group(1))
-                     unit = duration_match.group(2)
-                     dates = f"{number} {unit}"
-
-            if budget is None:
-                budget_match = re.search(r'(бюджет|до|около|стоимость)\s*(\d+)', processed_text)
-                if budget_match:
-                     try:
-                         budget = float(budget_match.group(2))
-                     except ValueError:
-                         pass
+    raw_entities: List[Tuple[str, str]] = [(ent.text, ent.label_) for ent in doc.ents]
+
+    for ent in doc.ents:
+        if ent.label_ == "DATE" or ent.label_ == "DURATION":
+            dates = ent.text
+
+        elif ent.label_ == "MONEY":
+             try:
+                 budget_text = ent.text.replace(",", ".").replace(" ", "").lower()
+                 budget_text = budget_text.replace("рублей", "").replace("руб", "").replace("$", "").replace("€", "")
+                 numbers = re.findall(r'\d+\.?\d*', budget_text)
+                 if numbers:
+                     budget = float(numbers[0])
+             except ValueError:
+                 pass
 
+        elif ent.label_ == "LOC" or ent.label_ == "GPE":
+             destinations.add(ent.text)
+
+    if dates is None:
+         duration_match = re.search(r'на (\d+)\s*(день|дня|дней|неделю|недели|недель|месяц|месяца|месяцев)', processed_text)
+         if duration_match:
+             number = int(duration_match.group(1))
+             unit = duration_match.group(2)
+             dates = f"{number} {unit}"
+
+    if budget is None:
+        budget_match = re.search(r'(бюджет|до|около|стоимость)\s*(\d+)', processed_text)
+        if budget_match:
+             try:
+                 budget = float(budget_match.group(2))
+             except ValueError:
+                 pass
 
-        except Exception as e:
-            print(f"Error during main nlp processing: {e}")
-            raw_entities = []
-            destinations = set()
-            dates = None
-            budget = None
+    return dates, budget, destinations, raw_entities
 
 
-    travel_style: Optional[str] = None
-    if travel_style_model:
+def _predict_travel_styles(processed_texts: List[str], is_lemmatized: List[bool]) -> List[Optional[str]]:
+    travel_styles: List[Optional[str]] = [None] * len(processed_texts)
+    style_model = travel_style_model.get()
+    if style_model:
         try:
-            processed_text_for_model = processed_text
-            predicted_style = travel_style_model.predict([processed_text_for_model])[0]
-            travel_style = predicted_style
+            travel_styles = list(style_model.predict(processed_texts))
         except Exception as e:
             print(f"Error predicting style with model: {e}")
 
-    if travel_style is None:
-         for style, keywords in TRAVEL_STYLE_KEYWORDS_FALLBACK.items():
-             for keyword in keywords:
-                 if keyword in processed_text:
-                      travel_style = style
-                      break
-             if travel_style:
-                 break
+    for i, processed_text in enumerate(processed_texts):
+        if travel_styles[i] is None:
+             matched_styles = travel_style_keyword_matcher.match(processed_text, lemmatized=is_lemmatized[i])
+             travel_styles[i] = matched_styles[0] if matched_styles else None
+    return travel_styles
+
 
-    interests_list: List[str] = []
+def _predict_interests(processed_texts: List[str], is_lemmatized: List[bool]) -> List[List[str]]:
+    interests_lists: List[List[str]] = [[] for _ in processed_texts]
+    interest_classifier_model, interest_label_binarizer = interest_classifier.get() or (None, None)
     if interest_classifier_model and interest_label_binarizer:
         try:
-            processed_text_for_model = processed_text
-            
             scores = None
 
             if hasattr(interest_classifier_model, 'predict_proba'):
-                 scores = interest_classifier_model.predict_proba([processed_text_for_model])
+                 scores = interest_classifier_model.predict_proba(processed_texts)
             elif hasattr(interest_classifier_model, 'decision_function'):
-                 scores = interest_classifier_model.decision_function([processed_text_for_model])
-                 pass
+                 scores = interest_classifier_model.decision_function(processed_texts)
             else:
-                 binary_predictions = interest_classifier_model.predict([processed_text_for_model])
-                 predicted_interests_model = interest_label_binarizer.inverse_transform(binary_predictions)
-                 if predicted_interests_model:
-                      interests_list = list(predicted_interests_model[0])
-                 scores = None
-
+                 binary_predictions = interest_classifier_model.predict(processed_texts)
+                 interests_lists = [list(labels) for labels in interest_label_binarizer.inverse_transform(binary_predictions)]
 
             if scores is not None:
-                 predicted_labels_indices = [
-                     i for i, score in enumerate(scores[0])
-                     if score >= INTEREST_PREDICTION_THRESHOLD
-                 ]
-                 interests_list = [interest_label_binarizer.classes_[i] for i in predicted_labels_indices]
-
+                 is_predicted = np.asarray(scores) >= INTEREST_PREDICTION_THRESHOLD
+                 classes = np.asarray(interest_label_binarizer.classes_)
+                 interests_lists = [classes[row].tolist() for row in is_predicted]
 
         except Exception as e:
             print(f"Error predicting interests with model or threshold: {e}")
-            interests_list = []
+            interests_lists = [[] for _ in processed_texts]
 
-    if not interests_list:
-        interests_set_fallback = set()
-        for interest_category, keywords in INTEREST_KEYWORDS_FALLBACK.items():
-             for keyword in keywords:
-                 if keyword in processed_text:
-                     interests_set_fallback.add(interest_category)
+    for i, processed_text in enumerate(processed_texts):
+        if not interests_lists[i]:
+            interests_lists[i] = interest_keyword_matcher.match(processed_text, lemmatized=is_lemmatized[i])
+    return interests_lists
 
-        interests_list = list(interests_set_fallback)
 
+def _extract_uncached(texts: List[str], batch_size: int) -> List[Dict[str, Any]]:
+    processed_texts = [text.lower() for text in texts]
+    # Keyword fallbacks match lemmas exactly and everything else through keyword stems.
+    is_lemmatized = [False] * len(texts)
+    entities = [(None, None, set(), []) for _ in texts]
 
-    return {
-        "interests": interests_list,
-        "travel_style": travel_style,
-        "destination": list(destinations),
-        "raw_entities": raw_entities
-    }
\ No newline at end of file
+    nlp = spacy_pipeline.get()
+    if nlp is not None:
+        try:
+            docs = list(nlp.pipe(texts, batch_size=batch_size))
+        except Exception as e:
+            print(f"Error during main nlp processing: {e}")
+            docs = []
+        for i, doc in enumerate(docs):
+            try:
+                processed_texts[i] = lemmas_from_doc(doc)
+                is_lemmatized[i] = True
+            except Exception as e:
+                print(f"Error during lemmatization: {e}")
+                processed_texts[i] = texts[i].lower()
+            try:
+                entities[i] = _entities_from_doc(doc, processed_texts[i])
+            except Exception as e:
+                print(f"Error during main nlp processing: {e}")
+
+    travel_styles = _predict_travel_styles(processed_texts, is_lemmatized)
+    interests_lists = _predict_interests(processed_texts, is_lemmatized)
+
+    return [
+        {
+            "interests": interests_lists[i],
+            "travel_style": travel_styles[i],
+            "destination": list(entities[i][2]),
+            "raw_entities": entities[i][3],
+        }
+        for i in range(len(texts))
+    ]
+
+
+def _extraction_fingerprint() -> str:
+    return f"extraction={EXTRACTION_LOGIC_VERSION};{version_fingerprint()}"
+
+
+def extract_travel_info_batch(texts: List[str], batch_size: int = NLP_PIPE_BATCH_SIZE) -> List[Dict[str, Any]]:
+    """
+    extract_travel_info for many texts: spaCy runs them through nlp.pipe in batches of
+    batch_size, and the style and interest classifiers are each called once for the whole list.
+    Results are in input order and identical to calling extract_travel_info per text.
+
+    Texts are normalized first (see normalize_query_text) and looked up in extraction_cache;
+    only distinct texts that miss are run through the models.
+    """
+    if not texts:
+        return []
+    fingerprint = _extraction_fingerprint()
+    normalized_texts = [normalize_query_text(text) for text in texts]
+    keys = [extraction_cache_key(text, fingerprint) for text in normalized_texts]
+
+    results: Dict[str, Dict[str, Any]] = {}
+    missing: Dict[str, str] = {}
+    for key, text in zip(keys, normalized_texts):
+        if key in results or key in missing:
+            continue
+        cached = extraction_cache.get(key)
+        if cached is not None:
+            results[key] = cached
+        else:
+            missing[key] = text
+
+    if missing:
+        extracted = _extract_uncached(list(missing.values()), batch_size)
+        # A model whose load failed changes the fingerprint: store under the one that produced the results.
+        stored_fingerprint = _extraction_fingerprint()
+        for (key, text), result in zip(missing.items(), extracted):
+            stored_key = key if stored_fingerprint == fingerprint else extraction_cache_key(text, stored_fingerprint)
+            extraction_cache.put(stored_key, result)
+            results[key] = result
+
+    # Repeated texts in one batch get separate copies, like separate calls would.
+    return [copy_extraction_result(results[key]) for key in keys]
+
+
+def extract_travel_info(text: str) -> Dict[str, Any]:
+    return extract_travel_info_batch([text])[0]
@@ -0,0 +1,115 @@
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import case, func, or_, select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from database.models import Location
+from app.routing.scoring import (
+    INTEREST_WEIGHT,
+    RATING_WEIGHT,
+    COST_WEIGHT,
+    MAX_RATING,
+    DEFAULT_RATING,
+    build_interest_match_matrix,
+)
+from app.services.opening_hours import compile_opening_hours_cached
+
+# Columns the optimizer and the route text need; everything else on Location stays in the DB.
+CANDIDATE_COLUMNS = (
+    Location.id,
+    Location.name,
+    Location.description,
+    Location.latitude,
+    Location.longitude,
+    Location.type,
+    Location.cost,
+    Location.cost_currency,
+    Location.rating,
+    Location.opening_hours,
+    Location.opening_hours_compiled,
+)
+
+
+def destination_filter(cities: Sequence[str], countries: Sequence[str]):
+    """Exact, index-friendly match on values resolved by the destination gazetteer."""
+    return or_(Location.city.in_(sorted(cities)), Location.country.in_(sorted(countries)))
+
+
+def fetch_location_types(db_session: Session, where_clause) -> np.ndarray:
+    """Distinct stored type values among the matching locations (there are only a handful)."""
+    types = db_session.execute(select(Location.type).where(where_clause).distinct()).scalars().all()
+    return np.array(types, dtype=object)
+
+
+def cost_rub_expression():
+    """Persisted cost in RUB (kept current by app.services.currency), 0 when the cost or its currency is unknown."""
+    return func.coalesce(Location.cost_rub, 0.0)
+
+
+def candidate_score_expression(interest_score_by_type: Dict[Optional[str], float]):
+    """
+    INTEREST_WEIGHT * share of matched interests + RATING_WEIGHT * rating / 5
+    + COST_WEIGHT * (1 - cost / max cost). The interest share is precomputed per distinct stored
+    type (there are only a handful), so no case folding or synonym lookup has to happen in SQL.
+    The cost term is normalised by the most expensive row of the filtered set via a window max.
+    """
+    matched_types = {t: s for t, s in interest_score_by_type.items() if t is not None and s > 0}
+    interest_score = case(matched_types, value=Location.type, else_=0.0) if matched_types else 0.0
+    rating_score = func.coalesce(Location.rating, DEFAULT_RATING) / MAX_RATING
+    cost_rub = cost_rub_expression()
+    max_cost_rub = func.max(cost_rub).over()
+    cost_score = case((max_cost_rub > 0, 1.0 - cost_rub / max_cost_rub), else_=1.0)
+    return INTEREST_WEIGHT * interest_score + RATING_WEIGHT * rating_score + COST_WEIGHT * cost_score, cost_rub
+
+
+def interest_scores_by_type(location_types: np.ndarray, interests: List[str], interest_synonyms) -> Dict[Optional[str], float]:
+    """Share of the user's interests matched by each distinct stored type value."""
+    distinct_types = list(dict.fromkeys(location_types.tolist()))
+    match_matrix = build_interest_match_matrix(distinct_types, interests, interest_synonyms)
+    if match_matrix.shape[1] == 0:
+        return {}
+    shares = match_matrix.sum(axis=1) / match_matrix.shape[1]
+    return dict(zip(distinct_types, shares.tolist()))
+
+
+def fetch_ranked_candidates(
+    db_session: Session,
+    where_clause,
+    interest_score_by_type: Dict[Optional[str], float],
+    limit: int,
+) -> List[Row]:
+    """
+    Scores, orders and truncates candidates inside the database and returns only the top
+    `limit` rows, projected to CANDIDATE_COLUMNS plus `score` and `cost_rub`. Rows are
+    attribute-accessible (row.id, row.name, ...) and stand in for Location objects downstream.
+    Ties are broken by id so the result is deterministic.
+    """
+    score, cost_rub = candidate_score_expression(interest_score_by_type)
+    ranked = (
+        select(*CANDIDATE_COLUMNS, score.label("score"), cost_rub.label("cost_rub"))
+        .where(where_clause)
+        .subquery()
+    )
+    return db_session.execute(
+        select(ranked).order_by(ranked.c.score.desc(), ranked.c.id).limit(limit)
+    ).all()
+
+
+def backfill_compiled_opening_hours(db_session: Session, rows: Sequence[Row]) -> Dict[int, bytes]:
+    """
+    Returns packed opening hours per row id, compiling the rows that were never compiled and
+    writing them back with one executemany UPDATE (flushed with the caller's transaction).
+    """
+    packed_by_id = {}
+    missing = []
+    for row in rows:
+        packed = row.opening_hours_compiled
+        if packed is None:
+            packed = compile_opening_hours_cached(row.opening_hours)
+            missing.append({"id": row.id, "opening_hours_compiled": packed})
+        packed_by_id[row.id] = bytes(packed)
+    if missing:
+        db_session.execute(update(Location), missing)
+    return packed_by_id
@@ -0,0 +1,110 @@
+from typing import List
+
+import numpy as np
+
+
+KM_PER_DEGREE_LAT = 110.57
+KM_PER_DEGREE_LON_AT_EQUATOR = 111.32
+BALANCED_KMEANS_MAX_ITER = 10
+CLUSTER_CAPACITY_SLACK = 0.15
+
+
+def project_to_local_km(latitudes, longitudes) -> np.ndarray:
+    """Equirectangular projection around the mean latitude; accurate enough inside a city or region."""
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    lat0 = np.radians(latitudes.mean()) if latitudes.size else 0.0
+    x = longitudes * KM_PER_DEGREE_LON_AT_EQUATOR * np.cos(lat0)
+    y = latitudes * KM_PER_DEGREE_LAT
+    return np.column_stack((x, y))
+
+
+def _balanced_assign(distances: np.ndarray, weights: np.ndarray, capacity: float) -> np.ndarray:
+    """
+    Assigns every point to its nearest centroid, then repeatedly spills the points of
+    overloaded clusters to their next preference. Inside an overloaded cluster the points
+    that would lose the most by moving (highest regret) stay.
+    """
+    num_points, num_clusters = distances.shape
+    preference = np.argsort(distances, axis=1)
+    rank = np.zeros(num_points, dtype=np.int64)
+    labels = preference[:, 0].copy()
+    rows = np.arange(num_points)
+
+    for _ in range(num_clusters):
+        load = np.bincount(labels, weights=weights, minlength=num_clusters)
+        overloaded = np.flatnonzero(load > capacity)
+        if overloaded.size == 0:
+            break
+        next_choice = preference[rows, np.minimum(rank + 1, num_clusters - 1)]
+        regret = distances[rows, next_choice] - distances[rows, labels]
+        for cluster in overloaded:
+            members = np.flatnonzero(labels == cluster)
+            members = members[np.argsort(-regret[members], kind="stable")]
+            spill = members[np.cumsum(weights[members]) > capacity]
+            spill = spill[rank[spill] < num_clusters - 1]
+            rank[spill] += 1
+            labels[spill] = preference[spill, rank[spill]]
+    return labels
+
+
+def partition_into_days(
+    latitudes,
+    longitudes,
+    visit_durations_hours,
+    num_days: int,
+    max_iter: int = BALANCED_KMEANS_MAX_ITER,
+    seed: int = 0,
+) -> List[np.ndarray]:
+    """
+    Splits candidates into num_days compact groups with balanced k-means on projected
+    coordinates, where each point weighs its visit duration and no group may exceed the
+    average load by more than CLUSTER_CAPACITY_SLACK.
+
+    Returns:
+        One array of candidate indices per day, ordered so that consecutive days are
+        geographically adjacent (nearest-neighbour chain over the centroids).
+    """
+    points = project_to_local_km(latitudes, longitudes)
+    weights = np.asarray(visit_durations_hours, dtype=np.float64)
+    num_points = points.shape[0]
+    if num_days <= 1 or num_points == 0:
+        return [np.arange(num_points)] + [np.empty(0, dtype=np.int64) for _ in range(max(num_days - 1, 0))]
+
+    num_clusters = min(num_days, num_points)
+    capacity = weights.sum() / num_clusters * (1.0 + CLUSTER_CAPACITY_SLACK)
+    rng = np.random.default_rng(seed)
+
+    # k-means++ seeding
+    centroids = [points[rng.integers(num_points)]]
+    for _ in range(1, num_clusters):
+        sq_dist = np.min(((points[:, np.newaxis, :] - np.array(centroids)[np.newaxis]) ** 2).sum(axis=2), axis=1)
+        total = sq_dist.sum()
+        next_idx = rng.choice(num_points, p=sq_dist / total) if total > 0 else rng.integers(num_points)
+        centroids.append(points[next_idx])
+    centroids = np.array(centroids)
+
+    labels = np.full(num_points, -1, dtype=np.int64)
+    for _ in range(max_iter):
+        distances = np.sqrt(((points[:, np.newaxis, :] - centroids[np.newaxis]) ** 2).sum(axis=2))
+        new_labels = _balanced_assign(distances, weights, capacity)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        cluster_weight = np.bincount(labels, weights=weights + 1e-9, minlength=num_clusters)
+        has_members = cluster_weight > 0
+        for axis in range(points.shape[1]):
+            axis_sum = np.bincount(labels, weights=(weights + 1e-9) * points[:, axis], minlength=num_clusters)
+            centroids[has_members, axis] = axis_sum[has_members] / cluster_weight[has_members]
+
+    order = [0]
+    remaining = set(range(1, num_clusters))
+    while remaining:
+        last = centroids[order[-1]]
+        nearest = min(remaining, key=lambda k: float(((centroids[k] - last) ** 2).sum()))
+        order.append(nearest)
+        remaining.remove(nearest)
+
+    groups = [np.flatnonzero(labels == k) for k in order]
+    groups.extend(np.empty(0, dtype=np.int64) for _ in range(num_days - num_clusters))
+    return groups
@@ -1,75 +1,108 @@
 import numpy as np
 import math
 import os
-import re
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Set, Tuple, Optional
 from datetime import date, timedelta, datetime, time 
 
+from sqlalchemy import insert
 from sqlalchemy.orm import Session 
 
 from database.models import Location, Activity, User 
 from database.models import Route as DBRoute, RouteLocationMap
-from app.services.distance import calculate_distance, estimate_travel_time
+from app.services.distance import calculate_distance_matrix, estimate_travel_time_matrix
 from app.services.currency import convert_currency
+from app.services.spatial_index import get_location_spatial_index, LocationSpatialIndex
+from app.services.opening_hours import unpack_opening_hours
+from app.services.gazetteer import resolve_destinations
 
 from app import schemas
 
-from app.nlp.processor import nlp_lemmatizer, nlp 
-from app.routing.optimizer import optimize_route_greedy 
-
-
-INTEREST_WEIGHT = 1.0 
-RATING_WEIGHT = 0.5   
-COST_WEIGHT = 0.2     
-
-DEFAULT_VISIT_DURATIONS_HOURS: Dict[str, float] = {
-    "музей": 2.0, "парк": 1.5, "ресторан": 1.5, "кафе": 1.0, "достопримечательность": 1.0,
-    "экскурсия": 2.5, "активность": 1.5, "шопинг": 1.5, "ночная жизнь": 3.0, "религия": 1.0,
-    "архитектура": 0.5, "искусство": 2.0, "природа": 2.0, "животные": 2.0, "фотография": 1.5,
-    "пляж": 3.0, "релакс": 2.0, "спорт": 2.0, "музыка": 2.5, "культура": 2.0,
-    "винный туризм": 3.0, "дегустации": 1.5, "походы": 4.0, "еда": 1.5, "история": 1.5,
-}
-DEFAULT_TRAVEL_SPEED_KM_H = 5.0 
-MAX_DAILY_ACTIVITY_HOURS = 8.0  
-DAY_START_TIME = time(9, 0)     
-
-def lemmatize_destination_names(destinations: List[str]) -> List[str]:
-     if nlp_lemmatizer is None:
-          print("Warning: Lemmatizer not loaded. Cannot lemmatize destinations.")
-          return [d.lower() for d in destinations if d]
-
-     lemmatized_list = []
-     for dest in destinations:
-          if dest:
-               doc = nlp_lemmatizer(dest)
-               lemmatized_dest = " ".join([token.lemma_ for token in doc if not token.is_punct and not token.is_space]).strip()
-               if lemmatized_dest:
-                    lemmatized_list.append(lemmatized_dest)
-     return list(set([d.lower() for d in lemmatized_list]))
-
-
-def parse_opening_hours(hours_str: Optional[str]) -> List[Dict[str, Any]]:
-    if not hours_str:
-        return []
-    hours_str_lower = hours_str.lower()
-    if "круглосуточно" in hours_str_lower:
-        return [{'always_open': True}]
-    match = re.search(r'([-а-яА-Я, ]+)\s*(\d{1,2}:\d{2})\s*-\s*(\d{1,2}:\d{2})', hours_str)
-    if not match:
-        return []
-    day_part, start_time_str, end_time_str = match.groups()
-    try:
-        start_hour, start_minute = map(int, start_time_str.split(':'))
-        end_hour, end_minute = map(int, end_time_str.split(':'))
-        start_time_obj = time(start_hour, start_minute)
-        end_time_obj = time(end_hour, end_minute)
-    except ValueError:
-        return []
-    
-    days_map_keys = ['пн', 'вт', 'ср', 'чт', 'пт', 'сб', 'вс']
-    if day_part.strip().lower() == 'ежедневно':
-         return [{'days': days_map_keys, 'start_time': start_time_obj, 'end_time': end_time_obj}]
-    return []
+from app.nlp.processor import INTEREST_KEYWORDS_FALLBACK
+from app.routing.optimizer import optimize_route_greedy, OPTIMIZER_STRATEGIES
+from app.routing.local_search import improve_route_local_search
+from app.routing.matrix_cache import travel_matrix_cache
+from app.routing.candidates import (
+    backfill_compiled_opening_hours,
+    destination_filter,
+    fetch_location_types,
+    fetch_ranked_candidates,
+    interest_scores_by_type,
+)
+from app.routing.schedule import (
+    DEFAULT_VISIT_DURATIONS_HOURS,
+    DEFAULT_TRAVEL_SPEED_KM_H,
+    MAX_DAILY_ACTIVITY_HOURS,
+    DAY_START_TIME,
+    RouteSchedule,
+    build_route_schedule,
+    default_visit_duration_hours,
+)
+
+
+CANDIDATE_RADIUS_KM = 15.0
+MAX_CANDIDATE_RADIUS_KM = 120.0
+# "greedy" / "clustered" (both followed by local search) or "time_windows" (respects opening hours, no reordering afterwards).
+ROUTE_OPTIMIZER_STRATEGY = os.getenv("ROUTE_OPTIMIZER_STRATEGY", "greedy")
+LOCAL_SEARCH_STRATEGIES = ("greedy", "clustered")
+
+def select_geographically_coherent_mask(
+    location_ids: np.ndarray,
+    latitudes: np.ndarray,
+    longitudes: np.ndarray,
+    spatial_index: LocationSpatialIndex,
+    min_count: int,
+) -> np.ndarray:
+    """
+    Keeps only the matched locations around the median point of the match set, widening
+    the radius until at least min_count locations are kept (or MAX_CANDIDATE_RADIUS_KM is hit).
+
+    Returns:
+        Boolean mask over location_ids; all True when filtering would keep too few.
+    """
+    keep_all = np.ones(location_ids.size, dtype=bool)
+    if location_ids.size <= min_count:
+        return keep_all
+    anchor_lat = float(np.median(latitudes))
+    anchor_lon = float(np.median(longitudes))
+
+    radius_km = CANDIDATE_RADIUS_KM
+    while True:
+        is_nearby = np.isin(location_ids, spatial_index.query_radius(anchor_lat, anchor_lon, radius_km))
+        if is_nearby.sum() >= min_count or radius_km >= MAX_CANDIDATE_RADIUS_KM:
+            break
+        radius_km *= 2
+    if is_nearby.sum() < min_count:
+        return keep_all
+    print(f"Spatial filter kept {int(is_nearby.sum())} of {location_ids.size} locations within {radius_km:.0f} km.")
+    return is_nearby
+
+
+def select_coherent_destination_mask(
+    location_ids: np.ndarray,
+    latitudes: np.ndarray,
+    longitudes: np.ndarray,
+    cities: Set[str],
+    countries: Set[str],
+    spatial_index: LocationSpatialIndex,
+    min_count: int,
+) -> np.ndarray:
+    """
+    select_geographically_coherent_mask run separately for every resolved city and country,
+    so a multi-city trip keeps a compact area in each destination instead of losing the
+    smaller cities to a filter centred on the biggest one.
+
+    Returns:
+        Boolean mask over location_ids (the points of all destinations together), the union of the per-destination masks.
+    """
+    destinations = [({city}, set()) for city in sorted(cities)] + [(set(), {country}) for country in sorted(countries)]
+    if len(destinations) == 1:
+        return select_geographically_coherent_mask(location_ids, latitudes, longitudes, spatial_index, min_count)
+    is_coherent = np.zeros(location_ids.size, dtype=bool)
+    for destination_cities, destination_countries in destinations:
+        group_ids, group_latitudes, group_longitudes = spatial_index.destination_points(destination_cities, destination_countries)
+        group_mask = select_geographically_coherent_mask(group_ids, group_latitudes, group_longitudes, spatial_index, min_count)
+        is_coherent |= np.isin(location_ids, group_ids[group_mask])
+    return is_coherent
 
 
 def format_route_text_with_days_times(
@@ -78,7 +111,8 @@ def format_route_text_with_days_times(
     trip_duration_days_total: int,
     pois_on_route: List[schemas.RouteLocationDetail], 
     total_estimated_cost_user_currency: float,
-    budget_currency_str: str
+    budget_currency_str: str,
+    schedule: Optional[RouteSchedule] = None,
 ) -> str:
     route_text_parts = []
     route_text_parts.append(f"Обновленный маршрут для путешествия в {', '.join(destination_names)} ({trip_duration_days_total} дней):\n")
@@ -86,94 +120,43 @@ def format_route_text_with_days_times(
     if not pois_on_route:
         route_text_parts.append("В маршруте нет запланированных мест.\n")
     else:
-        current_day_number = 1
-        current_date_iter = start_date_obj
-        current_time_in_day_dt = datetime.combine(current_date_iter, DAY_START_TIME) 
-        
-        daily_time_spent_total_hours = 0.0
-        
-        prev_poi_coords: Optional[Tuple[float, float]] = None
+        if schedule is None:
+            schedule = build_route_schedule(pois_on_route, start_date_obj, trip_duration_days_total)
         days_of_week_names = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
-        day_pois_text_parts = []
 
-        for i, poi_detail in enumerate(pois_on_route):
-            poi_primary_type = poi_detail.location_type.lower() if poi_detail.location_type else "достопримечательность"
+        for day in schedule.days:
+            day_of_week_name = days_of_week_names[day.day_date.weekday()]
+            if day.stop_indices.size == 0:
+                route_text_parts.append(f"\nДень {day.day_number} ({day_of_week_name}): Свободный день или нет запланированных мест.")
+                continue
 
-            visit_duration_hours = DEFAULT_VISIT_DURATIONS_HOURS.get(poi_primary_type, 1.5)
+            route_text_parts.append(f"\nДень {day.day_number} ({day_of_week_name}):")
+            for poi_index, arrival_time_str in zip(day.stop_indices.tolist(), day.arrival_times()):
+                poi_detail = pois_on_route[poi_index]
+                poi_text = f"\n- {arrival_time_str} {poi_detail.location_name}"
+                if poi_detail.activity_name:
+                    poi_text += f" (Активность: {poi_detail.activity_name})"
 
-            travel_time_from_prev_hours = 0.0
-            if prev_poi_coords and poi_detail.latitude is not None and poi_detail.longitude is not None:
-                distance_km = calculate_distance(
-                    prev_poi_coords[0], prev_poi_coords[1],
-                    poi_detail.latitude, poi_detail.longitude
-                )
-                travel_time_from_prev_hours = estimate_travel_time(distance_km, DEFAULT_TRAVEL_SPEED_KM_H)
-            
-            potential_next_poi_total_time = travel_time_from_prev_hours + visit_duration_hours
-            
-            if (daily_time_spent_total_hours > 0 and daily_time_spent_total_hours + potential_next_poi_total_time > MAX_DAILY_ACTIVITY_HOURS) \
-               or current_day_number > trip_duration_days_total:
-                
-                if day_pois_text_parts:
-                    day_of_week_name = days_of_week_names[current_date_iter.weekday()]
-                    route_text_parts.append(f"\nДень {current_day_number} ({day_of_week_name}):")
-                    route_text_parts.extend(day_pois_text_parts)
-                    day_pois_text_parts = []
-                
-                current_day_number += 1
-                if current_day_number > trip_duration_days_total:
-                    if i < len(pois_on_route):
-                         route_text_parts.append(f"\nОставшиеся {len(pois_on_route) - i} мест(а) не поместились в {trip_duration_days_total} дней.")
-                    break 
-
-                current_date_iter += timedelta(days=1)
-                current_time_in_day_dt = datetime.combine(current_date_iter, DAY_START_TIME)
-                daily_time_spent_total_hours = 0.0
-                travel_time_from_prev_hours = 0.0
-            
-            current_time_in_day_dt += timedelta(hours=travel_time_from_prev_hours)
-            arrival_time_str = current_time_in_day_dt.strftime('%H:%M')
+                description_to_show = None
+                if poi_detail.activity_description:
+                    description_to_show = poi_detail.activity_description
+                elif poi_detail.location_description:
+                    description_to_show = poi_detail.location_description
 
-            poi_text = f"\n- {arrival_time_str} {poi_detail.location_name}"
-            if poi_detail.activity_name:
-                poi_text += f" (Активность: {poi_detail.activity_name})"
-            
-            description_to_show = None
-            if poi_detail.activity_description:
-                description_to_show = poi_detail.activity_description
-            elif poi_detail.location_description:
-                description_to_show = poi_detail.location_description
-
-            if description_to_show:
-               snippet = description_to_show.split('.')[0] 
-               if len(snippet) > 0 : snippet += '.' 
-               
-               max_snippet_length = 120 
-               if len(snippet) > max_snippet_length:
-                   snippet = snippet[:max_snippet_length] + "..."
-
-               poi_text += f"\n    ({snippet})" 
-            
-            day_pois_text_parts.append(poi_text)
+                if description_to_show:
+                   snippet = description_to_show.split('.')[0] 
+                   if len(snippet) > 0 : snippet += '.' 
+                   
+                   max_snippet_length = 120 
+                   if len(snippet) > max_snippet_length:
+                       snippet = snippet[:max_snippet_length] + "..."
 
-            current_time_in_day_dt += timedelta(hours=visit_duration_hours)
-            daily_time_spent_total_hours += travel_time_from_prev_hours + visit_duration_hours
-            
-            if poi_detail.latitude is not None and poi_detail.longitude is not None:
-                prev_poi_coords = (poi_detail.latitude, poi_detail.longitude)
-            else:
-                prev_poi_coords = None
-        
-        if day_pois_text_parts: 
-            day_of_week_name = days_of_week_names[current_date_iter.weekday()]
-            route_text_parts.append(f"\nДень {current_day_number} ({day_of_week_name}):")
-            route_text_parts.extend(day_pois_text_parts)
-
-        while current_day_number < trip_duration_days_total:
-            current_day_number += 1
-            current_date_iter += timedelta(days=1)
-            day_of_week_name = days_of_week_names[current_date_iter.weekday()]
-            route_text_parts.append(f"\nДень {current_day_number} ({day_of_week_name}): Свободный день или нет запланированных мест.")
+                   poi_text += f"\n    ({snippet})" 
+
+                route_text_parts.append(poi_text)
+
+        if schedule.num_unscheduled:
+            route_text_parts.append(f"\nОставшиеся {schedule.num_unscheduled} мест(а) не поместились в {trip_duration_days_total} дней.")
 
     route_text_parts.append(f"\n\nОценочная стоимость маршрута: {total_estimated_cost_user_currency:.2f} {budget_currency_str}")
     route_text_parts.append(f"\nПримерная общая продолжительность: {trip_duration_days_total} дней.\n")
@@ -181,6 +164,21 @@ def format_route_text_with_days_times(
     return "".join(route_text_parts)
 
 
+def persist_generated_route(db_session: Session, route_values: Dict[str, Any], location_ids: List[int]) -> DBRoute:
+    """
+    Writes a route and its stops in two statements: INSERT ... RETURNING for the route row and
+    a single executemany INSERT for all RouteLocationMap rows (visit_order follows location_ids).
+    Does not commit, so the caller decides the transaction boundary.
+    """
+    db_route = db_session.scalars(insert(DBRoute).values(**route_values).returning(DBRoute)).one()
+    if location_ids:
+        db_session.execute(insert(RouteLocationMap), [
+            {"route_id": db_route.id, "location_id": location_id, "activity_id": None, "visit_order": visit_order}
+            for visit_order, location_id in enumerate(location_ids)
+        ])
+    return db_route
+
+
 def generate_route(
     destinations: List[str],
     start_date: date,
@@ -191,60 +189,81 @@ def generate_route(
     travel_style: Optional[str], 
     user_id: int, 
     query_id: int,
-    db_session: Session
+    db_session: Session,
+    commit: bool = True,
 ) -> Tuple[int, str, str, Optional[DBRoute]]: 
 
-    lemmatized_destinations = lemmatize_destination_names(destinations)
-    if not lemmatized_destinations:
+    if not any(d and d.strip() for d in destinations):
          return 400, "Processing Error", "Не удалось обработать указанные места назначения.", None
 
-    locations_query = db_session.query(Location)
-    from sqlalchemy import or_ 
-    city_country_filters = []
-    if lemmatized_destinations:
-         city_country_filters = [
-             (Location.city.ilike(dest) | Location.country.ilike(dest)) 
-             for dest in lemmatized_destinations
-         ]
-    if city_country_filters:
-         locations_query = locations_query.filter(or_(*city_country_filters))
-    all_locations = locations_query.all()
-    if not all_locations:
+    resolved_cities, resolved_countries = resolve_destinations(db_session, destinations)
+    if not resolved_cities and not resolved_countries:
+         return 400, "No locations found", f"К сожалению, по вашему запросу в направлении '{', '.join(destinations)}' ничего не найдено.", None
+
+    where_destination = destination_filter(resolved_cities, resolved_countries)
+    spatial_index = get_location_spatial_index(db_session)
+    location_ids, location_latitudes, location_longitudes = spatial_index.destination_points(
+        resolved_cities, resolved_countries
+    )
+    if location_ids.size == 0:
          return 400, "No locations found", f"К сожалению, по вашему запросу в направлении '{', '.join(destinations)}' ничего не найдено.", None
     
-    candidate_pois_data = []
+    trip_duration_days = (end_date - start_date).days + 1
+    estimated_pois_needed = trip_duration_days * 4 
+    num_candidates = max(estimated_pois_needed * 2, 10)
+    is_coherent = select_coherent_destination_mask(
+        location_ids, location_latitudes, location_longitudes, resolved_cities, resolved_countries,
+        spatial_index, num_candidates,
+    )
+    # When the filter dropped something, the SQL below only reads the coherent rows, looked up by primary key.
+    where_candidates = where_destination
+    if not is_coherent.all():
+        where_candidates = where_destination & Location.id.in_(location_ids[is_coherent].tolist())
+
     user_budget_rub = convert_currency(budget, budget_currency, "RUB") if budget is not None and budget_currency else math.inf
 
-    for loc in all_locations:
-        loc_type_single = loc.type.lower() if loc.type else "достопримечательность"
-        visit_duration = DEFAULT_VISIT_DURATIONS_HOURS.get(loc_type_single, 1.5)
-        loc_cost_rub = convert_currency(loc.cost, loc.cost_currency, "RUB") if loc.cost is not None and loc.cost_currency else 0.0
-        opening_hours_p = parse_opening_hours(loc.opening_hours) 
-                                                                
-
-        candidate_pois_data.append({
-            "location": loc, 
-            "score": 0, 
-            "visit_duration_hours": visit_duration,
-            "cost_rub": loc_cost_rub,
-            "opening_hours_parsed": opening_hours_p, 
+    candidate_rows = fetch_ranked_candidates(
+        db_session,
+        where_candidates,
+        interest_scores_by_type(fetch_location_types(db_session, where_candidates), interests, INTEREST_KEYWORDS_FALLBACK),
+        limit=num_candidates,
+    )
+    packed_hours_by_id = backfill_compiled_opening_hours(db_session, candidate_rows)
+
+    top_n_candidates_data = []
+    for row in candidate_rows:
+        top_n_candidates_data.append({
+            "location": row, 
+            "score": float(row.score), 
+            "visit_duration_hours": default_visit_duration_hours(row.type),
+            "cost_rub": float(row.cost_rub),
+            "opening_hours_bitmap": unpack_opening_hours(packed_hours_by_id[row.id]),
         })
 
-    candidate_pois_data.sort(key=lambda x: x["score"], reverse=True)
-    trip_duration_days = (end_date - start_date).days + 1
-    estimated_pois_needed = trip_duration_days * 4 
-    top_n_candidates_data = candidate_pois_data[:max(estimated_pois_needed * 2, 10)]
-
     if not top_n_candidates_data:
          return 400, "No suitable places found", "К сожалению, по вашему запросу не удалось найти подходящие места.", None
 
-    num_candidates = len(top_n_candidates_data)
-    distance_matrix_km = np.zeros((num_candidates, num_candidates)) 
-    travel_time_matrix_hours = np.zeros((num_candidates, num_candidates))
+    # Keyed on the destination's full POI set, not the coherent subset, so every request for the city shares one matrix.
+    city_matrix = travel_matrix_cache.get_city_matrix(
+        city_key="|".join(sorted(resolved_cities | resolved_countries)),
+        location_ids=location_ids,
+        latitudes=location_latitudes,
+        longitudes=location_longitudes,
+        travel_speed_km_h=DEFAULT_TRAVEL_SPEED_KM_H,
+    )
+    if city_matrix is not None:
+        travel_time_matrix_hours = city_matrix.slice([c["location"].id for c in top_n_candidates_data])
+    else:
+        candidate_latitudes = np.array([c["location"].latitude for c in top_n_candidates_data], dtype=np.float64)
+        candidate_longitudes = np.array([c["location"].longitude for c in top_n_candidates_data], dtype=np.float64)
+        distance_matrix_km = calculate_distance_matrix(candidate_latitudes, candidate_longitudes)
+        travel_time_matrix_hours = estimate_travel_time_matrix(distance_matrix_km, DEFAULT_TRAVEL_SPEED_KM_H)
 
 
-    print("Calling Greedy optimizer...")
-    optimized_poi_indices_by_day: Dict[int, List[int]] = optimize_route_greedy(
+    strategy_name = ROUTE_OPTIMIZER_STRATEGY if ROUTE_OPTIMIZER_STRATEGY in OPTIMIZER_STRATEGIES else "greedy"
+    optimizer_func = OPTIMIZER_STRATEGIES[strategy_name]
+    print(f"Calling {optimizer_func.__name__}...")
+    optimized_poi_indices_by_day: Dict[int, List[int]] = optimizer_func(
        candidate_pois_data=top_n_candidates_data,
        travel_time_matrix_hours=travel_time_matrix_hours, 
        trip_duration_days=trip_duration_days,
@@ -253,6 +272,14 @@ def generate_route(
     )
     print(f"Optimizer returned: {optimized_poi_indices_by_day}")
 
+    if optimized_poi_indices_by_day and strategy_name in LOCAL_SEARCH_STRATEGIES:
+        optimized_poi_indices_by_day, travel_hours_saved = improve_route_local_search(
+            route_by_day=optimized_poi_indices_by_day,
+            travel_time_matrix_hours=travel_time_matrix_hours,
+            visit_durations_hours=np.array([c["visit_duration_hours"] for c in top_n_candidates_data]),
+        )
+        print(f"Local search saved {travel_hours_saved:.2f} h of travel: {optimized_poi_indices_by_day}")
+
     if not optimized_poi_indices_by_day or not any(optimized_poi_indices_by_day.values()):
          return 400, "Generation failed", "Не удалось построить маршрут из подходящих мест.", None
     
@@ -281,12 +308,9 @@ def generate_route(
             ))
             global_visit_idx += 1
             
-    total_cost_rub_from_optimizer = 0
-    for day_pois_indices in optimized_poi_indices_by_day.values():
-        for index in day_pois_indices:
-            cost_val = top_n_candidates_data[index].get("cost_rub")
-            if cost_val is not None:
-                total_cost_rub_from_optimizer += cost_val
+    candidate_costs_rub = np.array([c["cost_rub"] for c in top_n_candidates_data], dtype=np.float64)
+    visited_indices = [index for day_pois_indices in optimized_poi_indices_by_day.values() for index in day_pois_indices]
+    total_cost_rub_from_optimizer = float(candidate_costs_rub[visited_indices].sum())
 
 
     total_cost_user_curr = convert_currency(
@@ -295,45 +319,47 @@ def generate_route(
     if total_cost_user_curr is None: total_cost_user_curr = total_cost_rub_from_optimizer 
 
     
+    route_schedule = build_route_schedule(flat_ordered_pois_for_text, start_date, trip_duration_days)
     generated_text = format_route_text_with_days_times(
         destination_names=destinations,
         start_date_obj=start_date,
         trip_duration_days_total=trip_duration_days,
         pois_on_route=flat_ordered_pois_for_text,
         total_estimated_cost_user_currency=total_cost_user_curr,
-        budget_currency_str=budget_currency if budget_currency else "RUB"
+        budget_currency_str=budget_currency if budget_currency else "RUB",
+        schedule=route_schedule,
     )
     
+    # A caller-owned transaction may already hold other rows (the Query): only the route's savepoint is undone on failure.
+    route_savepoint = None if commit else db_session.begin_nested()
     try:
-        db_route = DBRoute(
-             user_id=user_id,
-             query_id=query_id,
-             start_date=datetime.combine(start_date, time.min),
-             end_date=datetime.combine(end_date, time.max),
-             total_cost=total_cost_rub_from_optimizer, 
-             total_cost_currency="RUB", 
-             duration_days=trip_duration_days,
-             is_finalized=False
+        db_route = persist_generated_route(
+            db_session,
+            route_values=dict(
+                user_id=user_id,
+                query_id=query_id,
+                start_date=datetime.combine(start_date, time.min),
+                end_date=datetime.combine(end_date, time.max),
+                total_cost=total_cost_rub_from_optimizer,
+                total_cost_currency="RUB",
+                duration_days=trip_duration_days,
+                is_finalized=False,
+            ),
+            location_ids=[
+                top_n_candidates_data[candidate_list_index]["location"].id
+                for day_num in sorted(optimized_poi_indices_by_day.keys())
+                for candidate_list_index in optimized_poi_indices_by_day[day_num]
+            ],
         )
-        db_session.add(db_route)
-        db_session.commit()
-        db_session.refresh(db_route)
-
-        global_db_visit_order = 0
-        for day_num in sorted(optimized_poi_indices_by_day.keys()): 
-             for candidate_list_index in optimized_poi_indices_by_day[day_num]:
-                  location_obj: Location = top_n_candidates_data[candidate_list_index]["location"]
-                  db_route_loc = RouteLocationMap(
-                      route_id=db_route.id,
-                      location_id=location_obj.id,
-                      activity_id=None, 
-                      visit_order=global_db_visit_order
-                  )
-                  db_session.add(db_route_loc)
-                  global_db_visit_order += 1
-        db_session.commit()
+        if route_savepoint is not None:
+            route_savepoint.commit()
+        else:
+            db_session.commit()
     except Exception as e:
-        db_session.rollback()
+        if route_savepoint is not None:
+            route_savepoint.rollback()
+        else:
+            db_session.rollback()
         print(f"Error saving route to DB: {e}")
         import traceback
         traceback.print_exc()
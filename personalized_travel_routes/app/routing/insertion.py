@@ -0,0 +1,69 @@
+from typing import Optional, Sequence
+
+import numpy as np
+
+from app import schemas
+from app.routing.schedule import DEFAULT_TRAVEL_SPEED_KM_H, MAX_DAILY_ACTIVITY_HOURS, RouteSchedule
+from app.services.distance import calculate_distance, estimate_travel_time_matrix
+
+
+def cheapest_insertion_position(
+    pois_on_route: Sequence[schemas.RouteLocationDetail],
+    route_schedule: RouteSchedule,
+    latitude: float,
+    longitude: float,
+    visit_duration_hours: float,
+    travel_speed_km_h: float = DEFAULT_TRAVEL_SPEED_KM_H,
+) -> Optional[int]:
+    """
+    Position in the visit order where a new stop adds the least travel time while its day stays
+    within MAX_DAILY_ACTIVITY_HOURS (travel + visits), evaluated in O(n) with vectorized haversine.
+
+    Legs do not cross day boundaries (each day starts at its first stop), so a position between
+    two days is tried both as the end of the earlier day and as the start of the later one.
+    Stops the schedule could not fit into the trip are never used as neighbours.
+
+    Returns:
+        Index to insert at (0..len(pois_on_route)), or None when no day has room for the stop.
+    """
+    num_stops = len(pois_on_route)
+    if num_stops == 0:
+        return 0
+
+    day_of_stop = np.zeros(num_stops, dtype=np.int64)
+    day_total_hours = np.zeros(len(route_schedule.days) + 1, dtype=np.float64)
+    for day in route_schedule.days:
+        day_of_stop[day.stop_indices] = day.day_number
+        day_total_hours[day.day_number] = day.total_hours
+
+    latitudes = np.array([d.latitude for d in pois_on_route], dtype=np.float64)
+    longitudes = np.array([d.longitude for d in pois_on_route], dtype=np.float64)
+    to_new_hours = estimate_travel_time_matrix(calculate_distance(latitudes, longitudes, latitude, longitude), travel_speed_km_h)
+    leg_hours = estimate_travel_time_matrix(
+        calculate_distance(latitudes[:-1], longitudes[:-1], latitudes[1:], longitudes[1:]), travel_speed_km_h
+    )
+
+    day_before = np.concatenate(([0], day_of_stop))  # day of the stop preceding position p
+    day_after = np.concatenate((day_of_stop, [0]))   # day of the stop following position p
+    positions = np.arange(num_stops + 1)
+    is_inner = (day_before == day_after) & (day_after > 0)
+    is_boundary = day_before != day_after
+
+    inner_positions = positions[is_inner]
+    inner_delta = to_new_hours[inner_positions - 1] + to_new_hours[inner_positions] - leg_hours[inner_positions - 1]
+    append_positions = positions[is_boundary & (day_before > 0)]
+    append_delta = to_new_hours[append_positions - 1]
+    prepend_positions = positions[is_boundary & (day_after > 0)]
+    prepend_delta = to_new_hours[prepend_positions]
+
+    candidate_positions = np.concatenate((inner_positions, append_positions, prepend_positions))
+    candidate_days = np.concatenate((day_after[inner_positions], day_before[append_positions], day_after[prepend_positions]))
+    candidate_delta = np.concatenate((inner_delta, append_delta, prepend_delta))
+
+    is_feasible = day_total_hours[candidate_days] + visit_duration_hours + candidate_delta <= MAX_DAILY_ACTIVITY_HOURS
+    if not is_feasible.any():
+        return None
+    feasible = np.flatnonzero(is_feasible)
+    # Cheapest first, earliest position on ties.
+    best = feasible[np.lexsort((candidate_positions[feasible], candidate_delta[feasible]))[0]]
+    return int(candidate_positions[best])
@@ -0,0 +1,220 @@
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.routing.optimizer import MAX_DAILY_TRAVEL_TIME_HOURS, ESTIMATED_DAILY_VISIT_TIME_HOURS
+
+
+DEFAULT_LOCAL_SEARCH_DEADLINE_MS = 50.0
+OR_OPT_MAX_SEGMENT_LENGTH = 3
+IMPROVEMENT_EPSILON = 1e-9
+
+
+def _day_travel_hours(day: List[int], travel_time_matrix_hours: np.ndarray) -> float:
+    if len(day) < 2:
+        return 0.0
+    day_arr = np.asarray(day)
+    return float(travel_time_matrix_hours[day_arr[:-1], day_arr[1:]].sum())
+
+
+def route_travel_hours(route_by_day: Dict[int, List[int]], travel_time_matrix_hours: np.ndarray) -> float:
+    return sum(_day_travel_hours(day, travel_time_matrix_hours) for day in route_by_day.values())
+
+
+def _leg(travel_time_matrix_hours: np.ndarray, from_index, to_index) -> float:
+    if from_index is None or to_index is None:
+        return 0.0
+    return travel_time_matrix_hours[from_index, to_index]
+
+
+def _day_is_feasible(visit_hours: float, travel_hours: float, num_pois: int, max_day_hours: Optional[float]) -> bool:
+    # The first POI of a day is always allowed, both in optimize_route_greedy and in build_route_schedule.
+    if num_pois <= 1:
+        return True
+    if max_day_hours is not None:
+        return visit_hours + travel_hours <= max_day_hours
+    return visit_hours <= ESTIMATED_DAILY_VISIT_TIME_HOURS and travel_hours <= MAX_DAILY_TRAVEL_TIME_HOURS
+
+
+class _Deadline:
+    def __init__(self, deadline_ms: float):
+        self._deadline = time.perf_counter() + deadline_ms / 1000.0
+
+    def expired(self) -> bool:
+        return time.perf_counter() >= self._deadline
+
+
+def _two_opt_day(day: List[int], T: np.ndarray, deadline: _Deadline) -> bool:
+    """Reverses day[i..j] when that shortens the open path. Assumes a symmetric matrix."""
+    n = len(day)
+    improved = False
+    for i in range(n - 1):
+        for j in range(i + 1, n):
+            if deadline.expired():
+                return improved
+            prev_node = day[i - 1] if i > 0 else None
+            next_node = day[j + 1] if j + 1 < n else None
+            delta = (_leg(T, prev_node, day[j]) + _leg(T, day[i], next_node)
+                     - _leg(T, prev_node, day[i]) - _leg(T, day[j], next_node))
+            if delta < -IMPROVEMENT_EPSILON:
+                day[i:j + 1] = day[i:j + 1][::-1]
+                improved = True
+    return improved
+
+
+def _or_opt_day(day: List[int], T: np.ndarray, deadline: _Deadline) -> bool:
+    """Moves a segment of 1..OR_OPT_MAX_SEGMENT_LENGTH consecutive POIs to a better position in the same day."""
+    n = len(day)
+    for seg_len in range(1, min(OR_OPT_MAX_SEGMENT_LENGTH, n - 1) + 1):
+        for start in range(n - seg_len + 1):
+            if deadline.expired():
+                return False
+            end = start + seg_len - 1
+            prev_node = day[start - 1] if start > 0 else None
+            next_node = day[end + 1] if end + 1 < n else None
+            removal_gain = (_leg(T, prev_node, day[start]) + _leg(T, day[end], next_node)
+                            - _leg(T, prev_node, next_node))
+            rest = day[:start] + day[end + 1:]
+            segment = day[start:end + 1]
+            for pos in range(len(rest) + 1):
+                if pos == start:
+                    continue
+                before = rest[pos - 1] if pos > 0 else None
+                after = rest[pos] if pos < len(rest) else None
+                insertion_cost = (_leg(T, before, segment[0]) + _leg(T, segment[-1], after)
+                                  - _leg(T, before, after))
+                if insertion_cost - removal_gain < -IMPROVEMENT_EPSILON:
+                    day[:] = rest[:pos] + segment + rest[pos:]
+                    return True
+    return False
+
+
+def _best_insertion(day: List[int], poi: int, T: np.ndarray) -> Tuple[int, float]:
+    best_pos, best_cost = 0, float("inf")
+    for pos in range(len(day) + 1):
+        before = day[pos - 1] if pos > 0 else None
+        after = day[pos] if pos < len(day) else None
+        cost = _leg(T, before, poi) + _leg(T, poi, after) - _leg(T, before, after)
+        if cost < best_cost:
+            best_pos, best_cost = pos, cost
+    return best_pos, best_cost
+
+
+def _relocate_between_days(route_by_day: Dict[int, List[int]], T: np.ndarray, durations: np.ndarray,
+                           visit_hours: Dict[int, float], travel_hours: Dict[int, float],
+                           deadline: _Deadline, max_day_hours: Optional[float]) -> bool:
+    day_nums = sorted(route_by_day.keys())
+    for from_day in day_nums:
+        source = route_by_day[from_day]
+        for pos in range(len(source)):
+            if deadline.expired():
+                return False
+            poi = source[pos]
+            prev_node = source[pos - 1] if pos > 0 else None
+            next_node = source[pos + 1] if pos + 1 < len(source) else None
+            removal_gain = _leg(T, prev_node, poi) + _leg(T, poi, next_node) - _leg(T, prev_node, next_node)
+            for to_day in day_nums:
+                if to_day == from_day:
+                    continue
+                target = route_by_day[to_day]
+                insert_pos, insertion_cost = _best_insertion(target, poi, T)
+                if insertion_cost - removal_gain >= -IMPROVEMENT_EPSILON:
+                    continue
+                new_target_visit = visit_hours[to_day] + durations[poi]
+                new_target_travel = travel_hours[to_day] + insertion_cost
+                if not _day_is_feasible(new_target_visit, new_target_travel, len(target) + 1, max_day_hours):
+                    continue
+                del source[pos]
+                target.insert(insert_pos, poi)
+                visit_hours[from_day] -= durations[poi]
+                travel_hours[from_day] -= removal_gain
+                visit_hours[to_day] = new_target_visit
+                travel_hours[to_day] = new_target_travel
+                return True
+    return False
+
+
+def _swap_between_days(route_by_day: Dict[int, List[int]], T: np.ndarray, durations: np.ndarray,
+                       visit_hours: Dict[int, float], travel_hours: Dict[int, float],
+                       deadline: _Deadline, max_day_hours: Optional[float]) -> bool:
+    day_nums = [d for d in sorted(route_by_day.keys()) if route_by_day[d]]
+    for a_idx, day_a in enumerate(day_nums):
+        for day_b in day_nums[a_idx + 1:]:
+            route_a, route_b = route_by_day[day_a], route_by_day[day_b]
+            for pos_a, poi_a in enumerate(route_a):
+                prev_a = route_a[pos_a - 1] if pos_a > 0 else None
+                next_a = route_a[pos_a + 1] if pos_a + 1 < len(route_a) else None
+                for pos_b, poi_b in enumerate(route_b):
+                    if deadline.expired():
+                        return False
+                    prev_b = route_b[pos_b - 1] if pos_b > 0 else None
+                    next_b = route_b[pos_b + 1] if pos_b + 1 < len(route_b) else None
+                    delta_a = (_leg(T, prev_a, poi_b) + _leg(T, poi_b, next_a)
+                               - _leg(T, prev_a, poi_a) - _leg(T, poi_a, next_a))
+                    delta_b = (_leg(T, prev_b, poi_a) + _leg(T, poi_a, next_b)
+                               - _leg(T, prev_b, poi_b) - _leg(T, poi_b, next_b))
+                    if delta_a + delta_b >= -IMPROVEMENT_EPSILON:
+                        continue
+                    new_visit_a = visit_hours[day_a] - durations[poi_a] + durations[poi_b]
+                    new_visit_b = visit_hours[day_b] - durations[poi_b] + durations[poi_a]
+                    if not (_day_is_feasible(new_visit_a, travel_hours[day_a] + delta_a, len(route_a), max_day_hours)
+                            and _day_is_feasible(new_visit_b, travel_hours[day_b] + delta_b, len(route_b), max_day_hours)):
+                        continue
+                    route_a[pos_a], route_b[pos_b] = poi_b, poi_a
+                    visit_hours[day_a], visit_hours[day_b] = new_visit_a, new_visit_b
+                    travel_hours[day_a] += delta_a
+                    travel_hours[day_b] += delta_b
+                    return True
+    return False
+
+
+def improve_route_local_search(
+    route_by_day: Dict[int, List[int]],
+    travel_time_matrix_hours: np.ndarray,
+    visit_durations_hours: np.ndarray,
+    deadline_ms: float = DEFAULT_LOCAL_SEARCH_DEADLINE_MS,
+    max_day_hours: Optional[float] = None,
+) -> Tuple[Dict[int, List[int]], float]:
+    """
+    Improves a plan from optimize_route_greedy with intra-day 2-opt/Or-opt and inter-day
+    relocate/swap moves until no move helps or the wall-clock deadline passes.
+
+    Only improving moves are applied (delta-evaluated against the travel-time matrix), so the
+    plan held at any moment is the best found so far. The set of POIs, and therefore the cost,
+    never changes; inter-day moves respect the daily visit and travel limits of the greedy, or,
+    when max_day_hours is given, a single cap on visit + travel hours per day (the limit
+    build_route_schedule splits saved routes with).
+
+    Returns:
+        (improved plan with the same day keys, travel hours saved).
+    """
+    if not route_by_day:
+        return route_by_day, 0.0
+
+    deadline = _Deadline(deadline_ms)
+    T = np.asarray(travel_time_matrix_hours, dtype=np.float64)
+    durations = np.asarray(visit_durations_hours, dtype=np.float64)
+    plan = {day_num: list(pois) for day_num, pois in route_by_day.items()}
+    initial_travel_hours = route_travel_hours(plan, T)
+
+    visit_hours = {d: float(durations[pois].sum()) if pois else 0.0 for d, pois in plan.items()}
+    travel_hours = {d: _day_travel_hours(pois, T) for d, pois in plan.items()}
+
+    improved = True
+    while improved and not deadline.expired():
+        improved = False
+        for day_num, pois in plan.items():
+            day_improved = _two_opt_day(pois, T, deadline)
+            while _or_opt_day(pois, T, deadline):
+                day_improved = True
+            if day_improved:
+                travel_hours[day_num] = _day_travel_hours(pois, T)
+                improved = True
+        if _relocate_between_days(plan, T, durations, visit_hours, travel_hours, deadline, max_day_hours):
+            improved = True
+        elif _swap_between_days(plan, T, durations, visit_hours, travel_hours, deadline, max_day_hours):
+            improved = True
+
+    travel_hours_saved = max(initial_travel_hours - route_travel_hours(plan, T), 0.0)
+    return plan, travel_hours_saved
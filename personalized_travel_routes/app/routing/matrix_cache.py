@@ -0,0 +1,177 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+import numpy as np
+
+from app.services.distance import calculate_distance_matrix, estimate_travel_time_matrix
+
+
+ROUTING_DIR = os.path.dirname(__file__)
+DEFAULT_MATRIX_CACHE_DIR = os.path.join(ROUTING_DIR, "..", "..", ".cache", "travel_matrices")
+MATRIX_CACHE_DIR = os.getenv("TRAVEL_MATRIX_CACHE_DIR", DEFAULT_MATRIX_CACHE_DIR)
+MATRIX_CACHE_MAX_ENTRIES = 8
+# 5000 x 5000 float32 is ~100 MB; larger POI sets are computed per request instead.
+MAX_CACHED_MATRIX_POINTS = 5000
+
+
+class CityTravelMatrix:
+    """Travel-time matrix (hours, float32) for a city's full POI set, rows/columns ordered by location id."""
+
+    def __init__(self, location_ids: np.ndarray, travel_time_matrix_hours: np.ndarray):
+        self.location_ids = location_ids
+        self.travel_time_matrix_hours = travel_time_matrix_hours
+
+    def slice(self, location_ids: Sequence[int]) -> np.ndarray:
+        """Returns the sub-matrix for location_ids (in the given order) via fancy indexing."""
+        positions = np.searchsorted(self.location_ids, np.asarray(location_ids, dtype=np.int64))
+        return np.asarray(self.travel_time_matrix_hours[np.ix_(positions, positions)], dtype=np.float64)
+
+
+def location_set_version(location_ids: np.ndarray, latitudes: np.ndarray, longitudes: np.ndarray) -> str:
+    """Content hash of the (sorted) ids and their coordinates; changes whenever a Location row is added, removed or moved."""
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(location_ids, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(latitudes, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(longitudes, dtype=np.float64).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _safe_file_part(value: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", value, flags=re.UNICODE).strip("_") or "all"
+
+
+class TravelMatrixCache:
+    """
+    Two-level cache of per-city travel-time matrices keyed by (city, location-set version, travel mode).
+
+    Level 1 is an in-memory LRU of MATRIX_CACHE_MAX_ENTRIES matrices; level 2 is a directory of
+    .npy files opened memory-mapped, shared by all workers. A new version of a city/mode replaces
+    the files of the previous one.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = MATRIX_CACHE_DIR, max_entries: int = MATRIX_CACHE_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, CityTravelMatrix]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _file_prefix(self, city_key: str, travel_mode: str) -> str:
+        return f"{_safe_file_part(city_key)}__{_safe_file_part(travel_mode)}__"
+
+    def _load_from_disk(self, city_key: str, travel_mode: str, version: str) -> Optional[CityTravelMatrix]:
+        if not self.cache_dir:
+            return None
+        base = os.path.join(self.cache_dir, self._file_prefix(city_key, travel_mode) + version)
+        try:
+            ids = np.load(base + "_ids.npy")
+            matrix = np.load(base + "_matrix.npy", mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        return CityTravelMatrix(ids, matrix)
+
+    @staticmethod
+    def _write_atomically(path: str, array: np.ndarray) -> None:
+        """Writes under a per-process temporary name, then renames, so a concurrent reader never sees a partial file."""
+        tmp_path = f"{path[:-len('.npy')]}.{os.getpid()}.tmp.npy"
+        try:
+            np.save(tmp_path, array)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _save_to_disk(self, city_key: str, travel_mode: str, version: str, entry: CityTravelMatrix) -> None:
+        if not self.cache_dir:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            prefix = self._file_prefix(city_key, travel_mode)
+            for file_name in os.listdir(self.cache_dir):
+                if file_name.startswith(prefix) and not file_name.startswith(prefix + version):
+                    os.remove(os.path.join(self.cache_dir, file_name))
+            base = os.path.join(self.cache_dir, prefix + version)
+            self._write_atomically(base + "_ids.npy", entry.location_ids)
+            self._write_atomically(base + "_matrix.npy", entry.travel_time_matrix_hours)
+        except OSError as e:
+            print(f"Warning: could not persist travel matrix for '{city_key}': {e}")
+
+    def get_city_matrix(
+        self,
+        city_key: str,
+        location_ids: Sequence[int],
+        latitudes: Sequence[float],
+        longitudes: Sequence[float],
+        travel_speed_km_h: float,
+    ) -> Optional[CityTravelMatrix]:
+        """
+        Returns the matrix for the city's full POI set, computing and storing it on a miss.
+        Returns None when the set is larger than MAX_CACHED_MATRIX_POINTS.
+        """
+        ids = np.asarray(location_ids, dtype=np.int64)
+        if ids.size == 0 or ids.size > MAX_CACHED_MATRIX_POINTS:
+            return None
+        order = np.argsort(ids, kind="stable")
+        ids = ids[order]
+        lats = np.asarray(latitudes, dtype=np.float64)[order]
+        lons = np.asarray(longitudes, dtype=np.float64)[order]
+
+        travel_mode = f"speed{travel_speed_km_h:g}"
+        version = location_set_version(ids, lats, lons)
+        key = (city_key, version, travel_mode)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+
+        entry = self._load_from_disk(city_key, travel_mode, version)
+        if entry is None:
+            distance_matrix_km = calculate_distance_matrix(lats, lons, dtype=np.float32)
+            entry = CityTravelMatrix(ids, estimate_travel_time_matrix(distance_matrix_km, travel_speed_km_h))
+            self._save_to_disk(city_key, travel_mode, version, entry)
+            print(f"Travel matrix cache miss for '{city_key}' ({ids.size} POIs), computed and stored.")
+
+        with self._lock:
+            for stale_key in [k for k in self._entries if k[0] == city_key and k[2] == travel_mode and k != key]:
+                del self._entries[stale_key]
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def find_covering_matrix(self, location_ids: Sequence[int], travel_speed_km_h: float) -> Optional[CityTravelMatrix]:
+        """
+        In-memory lookup of a cached city matrix that contains every id in location_ids, for callers
+        (such as re-optimizing a saved route) that know the stops but not the city's full POI set.
+        Returns None when no resident matrix covers them.
+        """
+        ids = np.unique(np.asarray(location_ids, dtype=np.int64))
+        travel_mode = f"speed{travel_speed_km_h:g}"
+        with self._lock:
+            entries = [entry for key, entry in reversed(self._entries.items()) if key[2] == travel_mode]
+        for entry in entries:
+            positions = np.searchsorted(entry.location_ids, ids)
+            if positions.size and positions.max() < entry.location_ids.size and np.array_equal(entry.location_ids[positions], ids):
+                return entry
+        return None
+
+    def invalidate_city(self, city_key: Optional[str] = None) -> None:
+        """Drops cached matrices of one city (or all cities) from memory and disk."""
+        with self._lock:
+            for key in [k for k in self._entries if city_key is None or k[0] == city_key]:
+                del self._entries[key]
+        if self.cache_dir and os.path.isdir(self.cache_dir):
+            prefix = f"{_safe_file_part(city_key)}__" if city_key is not None else ""
+            for file_name in os.listdir(self.cache_dir):
+                if file_name.startswith(prefix) and file_name.endswith(".npy"):
+                    os.remove(os.path.join(self.cache_dir, file_name))
+
+
+travel_matrix_cache = TravelMatrixCache()
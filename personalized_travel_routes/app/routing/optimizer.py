@@ -4,6 +4,9 @@ from datetime import date, datetime, timedelta
 
 import numpy as np 
 
+from app.routing.clustering import partition_into_days
+from app.services.opening_hours import SLOTS_PER_DAY, SLOTS_PER_HOUR
+
 
 MAX_DAILY_TRAVEL_TIME_HOURS = 3.0
 ESTIMATED_DAILY_VISIT_TIME_HOURS = 5.0
@@ -21,14 +24,19 @@ def optimize_route_greedy(
     if num_candidates == 0:
         return {}
 
-    visited_poi_indices = set()
     route_by_day: Dict[int, List[int]] = {}
 
     remaining_budget_rub = budget_rub if budget_rub is not None else math.inf
 
-    poi_scores = [p['score'] for p in candidate_pois_data]
-    poi_costs_rub = [p['cost_rub'] for p in candidate_pois_data]
-    poi_visit_durations = [p['visit_duration_hours'] for p in candidate_pois_data]
+    poi_scores = np.array([p['score'] for p in candidate_pois_data], dtype=np.float64)
+    poi_scores[np.isnan(poi_scores)] = -math.inf
+    poi_costs_rub = np.array([p['cost_rub'] for p in candidate_pois_data], dtype=np.float64)
+    poi_visit_durations = np.array([p['visit_duration_hours'] for p in candidate_pois_data], dtype=np.float64)
+    travel_time_matrix_hours = np.asarray(travel_time_matrix_hours, dtype=np.float64)
+
+    is_available = np.ones(num_candidates, dtype=bool)
+    num_visited = 0
+    masked_scores = np.empty(num_candidates, dtype=np.float64)
 
     for day_num in range(1, trip_duration_days + 1):
         route_by_day[day_num] = []
@@ -39,47 +47,25 @@ def optimize_route_greedy(
 
         print(f"--- Building Day {day_num} (Remaining Budget: {remaining_budget_rub:.2f}) ---")
 
-        while len(visited_poi_indices) < num_candidates:
-            best_next_poi_index = -1
-            best_score = -math.inf
-
-            available_poi_indices = [
-                i for i in range(num_candidates) if i not in visited_poi_indices
-            ]
-
-            if not available_poi_indices:
-                 break
-
-            for next_poi_index in available_poi_indices:
-                poi_data = candidate_pois_data[next_poi_index]
-                loc_cost = poi_costs_rub[next_poi_index]
-                visit_duration = poi_visit_durations[next_poi_index]
+        while num_visited < num_candidates:
+            is_feasible = is_available & ~(poi_costs_rub > remaining_budget_rub)
+            if current_poi_index is not None:
+                is_feasible &= ~((current_day_visit_time_hours + poi_visit_durations) > ESTIMATED_DAILY_VISIT_TIME_HOURS)
+                is_feasible &= ~((current_day_travel_time_hours + travel_time_matrix_hours[current_poi_index]) > MAX_DAILY_TRAVEL_TIME_HOURS)
 
-                if remaining_budget_rub is not None and loc_cost > remaining_budget_rub:
-                    continue
+            masked_scores.fill(-math.inf)
+            np.copyto(masked_scores, poi_scores, where=is_feasible)
+            best_next_poi_index = int(np.argmax(masked_scores))
 
-                time_needed_for_visit = visit_duration
-                travel_time_from_current = 0.0
-                if current_poi_index != None:
-                     travel_time_from_current = travel_time_matrix_hours[current_poi_index, next_poi_index]
-                     time_needed_for_visit += travel_time_from_current
-                     if (current_day_visit_time_hours + visit_duration > ESTIMATED_DAILY_VISIT_TIME_HOURS) or \
-                        (current_day_travel_time_hours + travel_time_from_current > MAX_DAILY_TRAVEL_TIME_HOURS):
-                         continue
-
-                current_score = poi_scores[next_poi_index]
-                if current_score > best_score:
-                     best_score = current_score
-                     best_next_poi_index = next_poi_index
-
-            if best_next_poi_index != -1:
+            if masked_scores[best_next_poi_index] != -math.inf:
                 selected_poi_index = best_next_poi_index
                 route_by_day[day_num].append(selected_poi_index)
-                visited_poi_indices.add(selected_poi_index)
+                is_available[selected_poi_index] = False
+                num_visited += 1
 
                 remaining_budget_rub -= poi_costs_rub[selected_poi_index]
                 current_day_visit_time_hours += poi_visit_durations[selected_poi_index]
-                if current_poi_index != None:
+                if current_poi_index is not None:
                      current_day_travel_time_hours += travel_time_matrix_hours[current_poi_index, selected_poi_index]
 
                 current_poi_index = selected_poi_index
@@ -95,4 +81,219 @@ def optimize_route_greedy(
         print("Greedy algorithm generated an empty route.")
         return {}
 
-    return route_by_day
\ No newline at end of file
+    return route_by_day
+
+
+TIME_WINDOW_DAY_START_HOUR = 9.0
+TIME_WINDOW_DAY_END_HOUR = 21.0
+MAX_WAIT_HOURS = 1.0
+ZERO_SCORE_PRIORITY = 1e-3
+
+
+def build_opening_slot_arrays(
+    candidate_pois_data: List[Dict[str, Any]],
+    start_date: date,
+    trip_duration_days: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Turns the compiled 'opening_hours_bitmap' of each candidate into per-trip-day slot lookups.
+
+    Returns:
+        (open_prefix, next_open_slot), both of shape (num_candidates, trip_duration_days, SLOTS_PER_DAY + 1).
+        open_prefix[i, d, s] is the number of open slots before slot s, so a visit covering
+        slots [a, b) is possible iff open_prefix[..., b] - open_prefix[..., a] == b - a.
+        next_open_slot[i, d, s] is the first open slot >= s (SLOTS_PER_DAY if none).
+        POIs with an unknown schedule (bitmap None) are treated as always open.
+    """
+    num_candidates = len(candidate_pois_data)
+    trip_weekdays = [(start_date + timedelta(days=d)).weekday() for d in range(trip_duration_days)]
+
+    weekly_open = np.ones((num_candidates, 7, SLOTS_PER_DAY), dtype=bool)
+    for i, poi in enumerate(candidate_pois_data):
+        bitmap = poi.get('opening_hours_bitmap')
+        if bitmap is not None:
+            weekly_open[i] = bitmap
+    is_open = weekly_open[:, trip_weekdays, :]
+
+    open_prefix = np.zeros(is_open.shape[:2] + (SLOTS_PER_DAY + 1,), dtype=np.int16)
+    np.cumsum(is_open, axis=2, out=open_prefix[:, :, 1:])
+
+    slot_if_open = np.where(is_open, np.arange(SLOTS_PER_DAY, dtype=np.int16), np.int16(SLOTS_PER_DAY))
+    next_open_slot = np.full(open_prefix.shape, SLOTS_PER_DAY, dtype=np.int16)
+    next_open_slot[:, :, :-1] = np.minimum.accumulate(slot_if_open[:, :, ::-1], axis=2)[:, :, ::-1]
+    return open_prefix, next_open_slot
+
+
+def _fits_open_window(open_prefix: np.ndarray, first_slot: int, last_slot: int, durations_hours: np.ndarray) -> np.ndarray:
+    """(num_candidates, days) mask: is there an uninterrupted open stretch inside [first_slot, last_slot) long enough for the visit."""
+    fits = np.zeros(open_prefix.shape[:2], dtype=bool)
+    duration_slots = np.maximum(np.ceil(durations_hours * SLOTS_PER_HOUR).astype(np.int64), 1)
+    for length in np.unique(duration_slots).tolist():
+        if length > last_slot - first_slot:
+            continue
+        rows = np.flatnonzero(duration_slots == length)
+        open_in_window = open_prefix[rows, :, first_slot + length:last_slot + 1] - open_prefix[rows, :, first_slot:last_slot + 1 - length]
+        fits[rows] = (open_in_window == length).any(axis=2)
+    return fits
+
+
+def optimize_route_time_windows(
+    candidate_pois_data: List[Dict[str, Any]],
+    travel_time_matrix_hours: np.ndarray,
+    trip_duration_days: int,
+    budget_rub: Optional[float],
+    start_date: date,
+) -> Dict[int, List[int]]:
+    """
+    Orienteering-style day builder that respects opening hours.
+
+    Each day starts at TIME_WINDOW_DAY_START_HOUR; a POI can be appended only if the visit
+    fits inside its window for that weekday (waiting at most MAX_WAIT_HOURS for it to open),
+    ends before TIME_WINDOW_DAY_END_HOUR and keeps the greedy's daily visit/travel limits.
+    Among feasible POIs the one with the best score per hour spent (travel + wait + visit)
+    is taken. POIs that cannot fit on a day at all are pruned once per day before the loop.
+
+    Returns the same Dict[int, List[int]] shape as optimize_route_greedy.
+    """
+    num_candidates = len(candidate_pois_data)
+    if num_candidates == 0:
+        return {}
+
+    open_prefix, next_open_slot = build_opening_slot_arrays(candidate_pois_data, start_date, trip_duration_days)
+    poi_scores = np.array([p['score'] for p in candidate_pois_data], dtype=np.float64)
+    poi_scores = np.nan_to_num(poi_scores, nan=0.0) + ZERO_SCORE_PRIORITY
+    poi_costs_rub = np.array([p['cost_rub'] for p in candidate_pois_data], dtype=np.float64)
+    poi_visit_durations = np.array([p['visit_duration_hours'] for p in candidate_pois_data], dtype=np.float64)
+    travel_time_matrix_hours = np.asarray(travel_time_matrix_hours, dtype=np.float64)
+
+    day_first_slot = int(TIME_WINDOW_DAY_START_HOUR * SLOTS_PER_HOUR)
+    day_last_slot = int(TIME_WINDOW_DAY_END_HOUR * SLOTS_PER_HOUR)
+    fits_day = _fits_open_window(open_prefix, day_first_slot, day_last_slot, poi_visit_durations)
+
+    remaining_budget_rub = budget_rub if budget_rub is not None else math.inf
+    is_available = np.ones(num_candidates, dtype=bool)
+    route_by_day: Dict[int, List[int]] = {}
+
+    for day_idx in range(trip_duration_days):
+        day_num = day_idx + 1
+        route_by_day[day_num] = []
+
+        day_candidates = np.flatnonzero(fits_day[:, day_idx] & is_available)
+        if day_candidates.size == 0:
+            continue
+        day_prefix = open_prefix[day_candidates, day_idx]
+        day_next_open = next_open_slot[day_candidates, day_idx]
+        day_rows = np.arange(day_candidates.size)
+        day_durations = poi_visit_durations[day_candidates]
+        day_costs = poi_costs_rub[day_candidates]
+        day_scores = poi_scores[day_candidates]
+        day_available = np.ones(day_candidates.size, dtype=bool)
+
+        current_poi_index = None
+        current_time_hours = TIME_WINDOW_DAY_START_HOUR
+        day_visit_hours = 0.0
+        day_travel_hours = 0.0
+
+        while day_available.any():
+            if current_poi_index is None:
+                travel = np.zeros(day_candidates.size)
+            else:
+                travel = travel_time_matrix_hours[current_poi_index, day_candidates]
+            arrival = current_time_hours + travel
+            arrival_slot = np.clip(np.floor(arrival * SLOTS_PER_HOUR).astype(np.int64), 0, SLOTS_PER_DAY)
+            open_slot = day_next_open[day_rows, arrival_slot]
+            visit_start = np.where(open_slot == arrival_slot, arrival, open_slot / SLOTS_PER_HOUR)
+            wait = visit_start - arrival
+            finish = visit_start + day_durations
+
+            start_slot = np.minimum(np.floor(visit_start * SLOTS_PER_HOUR).astype(np.int64), SLOTS_PER_DAY)
+            end_slot = np.clip(np.ceil(finish * SLOTS_PER_HOUR - 1e-9).astype(np.int64), start_slot, SLOTS_PER_DAY)
+            stays_open = (day_prefix[day_rows, end_slot] - day_prefix[day_rows, start_slot]) == (end_slot - start_slot)
+
+            is_feasible = day_available & (day_costs <= remaining_budget_rub) & stays_open
+            is_feasible &= (finish <= TIME_WINDOW_DAY_END_HOUR) & (wait <= MAX_WAIT_HOURS)
+            if current_poi_index is not None:
+                is_feasible &= (day_visit_hours + day_durations) <= ESTIMATED_DAILY_VISIT_TIME_HOURS
+                is_feasible &= (day_travel_hours + travel) <= MAX_DAILY_TRAVEL_TIME_HOURS
+            if not is_feasible.any():
+                break
+
+            priority = np.where(is_feasible, day_scores / (travel + wait + day_durations), -np.inf)
+            local_index = int(np.argmax(priority))
+            selected_poi_index = int(day_candidates[local_index])
+
+            route_by_day[day_num].append(selected_poi_index)
+            day_available[local_index] = False
+            is_available[selected_poi_index] = False
+            remaining_budget_rub -= poi_costs_rub[selected_poi_index]
+            day_visit_hours += day_durations[local_index]
+            day_travel_hours += travel[local_index]
+            current_time_hours = finish[local_index]
+            current_poi_index = selected_poi_index
+
+            print(f"  Day {day_num}: {candidate_pois_data[selected_poi_index]['location'].name} at {visit_start[local_index]:.2f}h")
+
+    if not any(route_by_day.values()):
+        print("Time-window optimizer generated an empty route.")
+        return {}
+
+    return route_by_day
+
+
+def optimize_route_clustered(
+    candidate_pois_data: List[Dict[str, Any]],
+    travel_time_matrix_hours: np.ndarray,
+    trip_duration_days: int,
+    budget_rub: Optional[float],
+    start_date: date,
+) -> Dict[int, List[int]]:
+    """
+    Splits candidates into trip_duration_days compact geographic groups (balanced k-means
+    weighted by visit duration), then sequences the days in order with the greedy on each
+    group's sub-matrix. The budget is global: every day gets whatever the previous days left.
+
+    Returns the same Dict[int, List[int]] shape as optimize_route_greedy.
+    """
+    num_candidates = len(candidate_pois_data)
+    if num_candidates == 0:
+        return {}
+
+    travel_time_matrix_hours = np.asarray(travel_time_matrix_hours, dtype=np.float64)
+    poi_costs_rub = np.array([p['cost_rub'] for p in candidate_pois_data], dtype=np.float64)
+    day_groups = partition_into_days(
+        [p['location'].latitude for p in candidate_pois_data],
+        [p['location'].longitude for p in candidate_pois_data],
+        [p['visit_duration_hours'] for p in candidate_pois_data],
+        trip_duration_days,
+    )
+    remaining_budget_rub = budget_rub
+
+    day_plans: List[List[int]] = []
+    for day_idx, group in enumerate(day_groups):
+        if group.size == 0:
+            day_plans.append([])
+            continue
+        day_plan = optimize_route_greedy(
+            candidate_pois_data=[candidate_pois_data[i] for i in group],
+            travel_time_matrix_hours=travel_time_matrix_hours[np.ix_(group, group)],
+            trip_duration_days=1,
+            budget_rub=remaining_budget_rub,
+            start_date=start_date + timedelta(days=day_idx),
+        )
+        plan = [int(group[i]) for i in day_plan.get(1, [])]
+        if remaining_budget_rub is not None:
+            remaining_budget_rub -= float(poi_costs_rub[plan].sum())
+        day_plans.append(plan)
+
+    route_by_day = {day_idx + 1: plan for day_idx, plan in enumerate(day_plans)}
+    if not any(route_by_day.values()):
+        print("Clustered optimizer generated an empty route.")
+        return {}
+    return route_by_day
+
+
+OPTIMIZER_STRATEGIES = {
+    "greedy": optimize_route_greedy,
+    "time_windows": optimize_route_time_windows,
+    "clustered": optimize_route_clustered,
+}
@@ -0,0 +1,96 @@
+import time
+from datetime import date
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app import schemas
+from app.routing.local_search import IMPROVEMENT_EPSILON, improve_route_local_search
+from app.routing.matrix_cache import travel_matrix_cache
+from app.routing.schedule import DEFAULT_TRAVEL_SPEED_KM_H, MAX_DAILY_ACTIVITY_HOURS, RouteSchedule, build_route_schedule
+from app.services.distance import calculate_distance_matrix, estimate_travel_time_matrix
+
+
+DEFAULT_REOPTIMIZE_DEADLINE_MS = 200.0
+MAX_REOPTIMIZE_DEADLINE_MS = 2000.0
+# Local search always gets at least this much, even if fetching the matrix used up the budget.
+MIN_LOCAL_SEARCH_DEADLINE_MS = 5.0
+
+
+def route_travel_time_matrix(
+    location_ids: Sequence[int],
+    latitudes: Sequence[float],
+    longitudes: Sequence[float],
+    travel_speed_km_h: float = DEFAULT_TRAVEL_SPEED_KM_H,
+) -> np.ndarray:
+    """
+    Travel-time matrix between a route's stops (in the given order, duplicates allowed): sliced from
+    a resident city matrix when one covers every stop, computed directly otherwise.
+    """
+    city_matrix = travel_matrix_cache.find_covering_matrix(location_ids, travel_speed_km_h)
+    if city_matrix is not None:
+        return city_matrix.slice(location_ids)
+    distance_matrix_km = calculate_distance_matrix(
+        np.asarray(latitudes, dtype=np.float64), np.asarray(longitudes, dtype=np.float64)
+    )
+    return estimate_travel_time_matrix(distance_matrix_km, travel_speed_km_h)
+
+
+def warm_start_plan(route_schedule: RouteSchedule, num_stops: int) -> Dict[int, List[int]]:
+    """The route's current day split as {day: [stop index, ...]}; stops past the last day stay on it."""
+    plan = {day.day_number: day.stop_indices.tolist() for day in route_schedule.days}
+    if plan and route_schedule.num_unscheduled:
+        plan[max(plan)].extend(range(num_stops - route_schedule.num_unscheduled, num_stops))
+    return plan
+
+
+def scheduled_travel_hours(route_schedule: RouteSchedule) -> float:
+    return float(sum(day.travel_hours.sum() for day in route_schedule.days))
+
+
+def reoptimize_stop_order(
+    pois_on_route: Sequence[schemas.RouteLocationDetail],
+    start_date: Optional[date],
+    trip_duration_days: int,
+    deadline_ms: float = DEFAULT_REOPTIMIZE_DEADLINE_MS,
+) -> Optional[List[int]]:
+    """
+    Re-sequences the stops of a saved route across its days, starting from the current order and
+    running the same intra-/inter-day local search as route generation until deadline_ms has passed
+    (matrix lookup included). The set of stops never changes.
+
+    Saved routes store only the visit order and are split into days by build_route_schedule, so
+    the local search works under the same MAX_DAILY_ACTIVITY_HOURS cap, and the new order is kept
+    only if, re-split that way, it schedules every stop the old one did with less travel.
+
+    Returns:
+        map_ids in the new visit order, or None when the current order could not be improved.
+    """
+    started = time.perf_counter()
+    if len(pois_on_route) < 2 or trip_duration_days < 1:
+        return None
+
+    route_schedule = build_route_schedule(pois_on_route, start_date, trip_duration_days)
+    plan = warm_start_plan(route_schedule, len(pois_on_route))
+    travel_time_matrix_hours = route_travel_time_matrix(
+        [d.location_id for d in pois_on_route],
+        [d.latitude for d in pois_on_route],
+        [d.longitude for d in pois_on_route],
+    )
+    remaining_ms = deadline_ms - (time.perf_counter() - started) * 1000.0
+    improved_plan, _ = improve_route_local_search(
+        route_by_day=plan,
+        travel_time_matrix_hours=travel_time_matrix_hours,
+        visit_durations_hours=route_schedule.visit_durations_hours,
+        deadline_ms=max(remaining_ms, MIN_LOCAL_SEARCH_DEADLINE_MS),
+        max_day_hours=MAX_DAILY_ACTIVITY_HOURS,
+    )
+    new_order = [index for day_num in sorted(improved_plan) for index in improved_plan[day_num]]
+    if new_order == list(range(len(pois_on_route))):
+        return None
+    new_schedule = build_route_schedule([pois_on_route[index] for index in new_order], start_date, trip_duration_days)
+    travel_hours_saved = scheduled_travel_hours(route_schedule) - scheduled_travel_hours(new_schedule)
+    if new_schedule.num_unscheduled > route_schedule.num_unscheduled or travel_hours_saved <= IMPROVEMENT_EPSILON:
+        return None
+    print(f"Re-optimization saved {travel_hours_saved:.2f} h of travel in {(time.perf_counter() - started) * 1000.0:.1f} ms.")
+    return [pois_on_route[index].map_id for index in new_order]
@@ -0,0 +1,77 @@
+from typing import Sequence
+
+from sqlalchemy import Numeric, case, cast, func, select, update
+from sqlalchemy.orm import Session
+
+from database.models import Activity, Location, Route, RouteLocationMap
+
+
+def route_stops_cost_rub(route_id: int):
+    """Scalar subquery: RUB cost of all stops of the route (each stop's location plus its activity, if any)."""
+    return (
+        select(func.round(cast(func.coalesce(func.sum(
+            func.coalesce(Location.cost_rub, 0.0) + func.coalesce(Activity.cost_rub, 0.0)
+        ), 0.0), Numeric), 2))
+        .select_from(RouteLocationMap)
+        .join(Location, Location.id == RouteLocationMap.location_id)
+        .outerjoin(Activity, Activity.id == RouteLocationMap.activity_id)
+        .where(RouteLocationMap.route_id == route_id)
+        .scalar_subquery()
+    )
+
+
+def refresh_route_total_cost(db_session: Session, route: Route) -> None:
+    """
+    Recomputes the stored total from the route's stops in the UPDATE itself (like the version bump),
+    so concurrent edits do not overwrite each other's totals and a rates reload between edits
+    cannot leave it drifting. Pending stop changes are flushed first so the sum sees them.
+    """
+    db_session.flush()
+    route.total_cost = route_stops_cost_rub(route.id)
+    route.total_cost_currency = "RUB"
+
+
+def next_visit_order(db_session: Session, route_id: int) -> int:
+    max_visit_order = db_session.query(func.max(RouteLocationMap.visit_order)).filter(
+        RouteLocationMap.route_id == route_id
+    ).scalar()
+    return 0 if max_visit_order is None else max_visit_order + 1
+
+
+def shift_visit_orders(db_session: Session, route_id: int, from_visit_order: int, delta: int) -> None:
+    """
+    Moves every stop with visit_order >= from_visit_order by delta with two set-based UPDATEs.
+
+    uq_route_order is checked row by row on most backends, so a plain "visit_order + delta" can
+    collide halfway through. The rows are first parked at distinct negative values and then
+    flipped back, which never produces a duplicate whatever order the rows are visited in.
+    """
+    db_session.execute(
+        update(RouteLocationMap)
+        .where(RouteLocationMap.route_id == route_id, RouteLocationMap.visit_order >= from_visit_order)
+        .values(visit_order=-(RouteLocationMap.visit_order + delta) - 1),
+        execution_options={"synchronize_session": False},
+    )
+    db_session.execute(
+        update(RouteLocationMap)
+        .where(RouteLocationMap.route_id == route_id, RouteLocationMap.visit_order < 0)
+        .values(visit_order=-RouteLocationMap.visit_order - 1),
+        execution_options={"synchronize_session": False},
+    )
+
+
+def reorder_stops(db_session: Session, route_id: int, ordered_map_ids: Sequence[int]) -> None:
+    """Rewrites visit_order of the route's stops to follow ordered_map_ids, with the same two-step parking as shift_visit_orders."""
+    new_visit_orders = {map_id: visit_order for visit_order, map_id in enumerate(ordered_map_ids)}
+    db_session.execute(
+        update(RouteLocationMap)
+        .where(RouteLocationMap.route_id == route_id, RouteLocationMap.id.in_(list(new_visit_orders)))
+        .values(visit_order=-case(new_visit_orders, value=RouteLocationMap.id) - 1),
+        execution_options={"synchronize_session": False},
+    )
+    db_session.execute(
+        update(RouteLocationMap)
+        .where(RouteLocationMap.route_id == route_id, RouteLocationMap.visit_order < 0)
+        .values(visit_order=-RouteLocationMap.visit_order - 1),
+        execution_options={"synchronize_session": False},
+    )
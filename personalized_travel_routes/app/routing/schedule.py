@@ -0,0 +1,146 @@
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app import schemas
+from app.services.distance import calculate_distance, estimate_travel_time_matrix
+
+
+DEFAULT_VISIT_DURATIONS_HOURS: Dict[str, float] = {
+    "музей": 2.0, "парк": 1.5, "ресторан": 1.5, "кафе": 1.0, "достопримечательность": 1.0,
+    "экскурсия": 2.5, "активность": 1.5, "шопинг": 1.5, "ночная жизнь": 3.0, "религия": 1.0,
+    "архитектура": 0.5, "искусство": 2.0, "природа": 2.0, "животные": 2.0, "фотография": 1.5,
+    "пляж": 3.0, "релакс": 2.0, "спорт": 2.0, "музыка": 2.5, "культура": 2.0,
+    "винный туризм": 3.0, "дегустации": 1.5, "походы": 4.0, "еда": 1.5, "история": 1.5,
+}
+DEFAULT_VISIT_DURATION_HOURS = 1.5
+DEFAULT_TRAVEL_SPEED_KM_H = 5.0
+MAX_DAILY_ACTIVITY_HOURS = 8.0
+DAY_START_TIME = time(9, 0)
+
+
+def default_visit_duration_hours(location_type: Optional[str]) -> float:
+    poi_primary_type = location_type.lower() if location_type else "достопримечательность"
+    return DEFAULT_VISIT_DURATIONS_HOURS.get(poi_primary_type, DEFAULT_VISIT_DURATION_HOURS)
+
+
+class DaySchedule:
+    """
+    One day of a route. stop_indices point into the POI list the schedule was built from;
+    arrival_hours are offsets from DAY_START_TIME, travel_hours is the leg that leads to each
+    stop (0 for the first stop of the day).
+    """
+
+    def __init__(
+        self,
+        day_number: int,
+        day_date: Optional[date],
+        stop_indices: np.ndarray,
+        arrival_hours: np.ndarray,
+        travel_hours: np.ndarray,
+        visit_durations_hours: np.ndarray,
+    ):
+        self.day_number = day_number
+        self.day_date = day_date
+        self.stop_indices = stop_indices
+        self.arrival_hours = arrival_hours
+        self.travel_hours = travel_hours
+        self.visit_durations_hours = visit_durations_hours
+
+    @property
+    def total_hours(self) -> float:
+        return float(self.travel_hours.sum() + self.visit_durations_hours.sum())
+
+    def arrival_times(self) -> List[str]:
+        day_start = datetime.combine(self.day_date or date.min, DAY_START_TIME)
+        return [(day_start + timedelta(hours=float(h))).strftime('%H:%M') for h in self.arrival_hours]
+
+
+class RouteSchedule:
+    """Day split and timetable of an ordered list of route stops; computed once, rendered many times."""
+
+    def __init__(
+        self,
+        days: List[DaySchedule],
+        visit_durations_hours: np.ndarray,
+        num_unscheduled: int,
+    ):
+        self.days = days
+        self.visit_durations_hours = visit_durations_hours
+        self.num_unscheduled = num_unscheduled
+
+    def annotate(self, pois_on_route: Sequence[schemas.RouteLocationDetail]) -> None:
+        """Fills visit_duration_hours, day_number and arrival_time of the details the schedule was built from."""
+        for poi_index, poi_detail in enumerate(pois_on_route):
+            poi_detail.visit_duration_hours = float(self.visit_durations_hours[poi_index])
+        for day in self.days:
+            for stop_index, arrival_time in zip(day.stop_indices.tolist(), day.arrival_times()):
+                pois_on_route[stop_index].day_number = day.day_number
+                pois_on_route[stop_index].arrival_time = arrival_time
+
+
+def build_route_schedule(
+    pois_on_route: Sequence[schemas.RouteLocationDetail],
+    start_date: Optional[date],
+    trip_duration_days: int,
+    travel_speed_km_h: float = DEFAULT_TRAVEL_SPEED_KM_H,
+) -> RouteSchedule:
+    """
+    Splits the ordered stops into days of at most MAX_DAILY_ACTIVITY_HOURS (travel + visits),
+    starting each day at DAY_START_TIME. Leg distances are computed in one vectorized haversine
+    call and arrival times by a per-day cumulative sum; only the day-break decision is a scan.
+    A stop without coordinates contributes no travel time to or from its neighbours.
+
+    Stops that do not fit into trip_duration_days are left out and counted in num_unscheduled.
+    """
+    num_pois = len(pois_on_route)
+    visit_durations = np.array([
+        d.visit_duration_hours if d.visit_duration_hours is not None else default_visit_duration_hours(d.location_type)
+        for d in pois_on_route
+    ], dtype=np.float64)
+    latitudes = np.array([d.latitude if d.latitude is not None else np.nan for d in pois_on_route], dtype=np.float64)
+    longitudes = np.array([d.longitude if d.longitude is not None else np.nan for d in pois_on_route], dtype=np.float64)
+
+    leg_travel = np.zeros(num_pois, dtype=np.float64)
+    if num_pois > 1:
+        leg_km = calculate_distance(latitudes[:-1], longitudes[:-1], latitudes[1:], longitudes[1:])
+        leg_travel[1:] = np.nan_to_num(estimate_travel_time_matrix(leg_km, travel_speed_km_h), nan=0.0)
+
+    day_of_stop = np.zeros(num_pois, dtype=np.int64)
+    num_scheduled = 0
+    day_number = 1
+    day_spent_hours = 0.0
+    for i in range(num_pois):
+        step_hours = leg_travel[i] + visit_durations[i]
+        if (day_spent_hours > 0 and day_spent_hours + step_hours > MAX_DAILY_ACTIVITY_HOURS) or day_number > trip_duration_days:
+            day_number += 1
+            if day_number > trip_duration_days:
+                break
+            day_spent_hours = 0.0
+            leg_travel[i] = 0.0
+            step_hours = visit_durations[i]
+        day_of_stop[i] = day_number
+        day_spent_hours += step_hours
+        num_scheduled += 1
+
+    day_of_stop = day_of_stop[:num_scheduled]
+    travel = leg_travel[:num_scheduled]
+    visits = visit_durations[:num_scheduled]
+    elapsed = np.cumsum(travel + visits)
+    first_stop_of_day = np.flatnonzero(np.diff(day_of_stop, prepend=0))
+    elapsed_before_day = (elapsed - travel - visits)[first_stop_of_day]
+    arrival_hours = elapsed - visits - np.repeat(elapsed_before_day, np.diff(np.append(first_stop_of_day, num_scheduled)))
+
+    days = []
+    for day_number in range(1, max(trip_duration_days, 0) + 1):
+        stop_indices = np.flatnonzero(day_of_stop == day_number)
+        days.append(DaySchedule(
+            day_number=day_number,
+            day_date=start_date + timedelta(days=day_number - 1) if start_date else None,
+            stop_indices=stop_indices,
+            arrival_hours=arrival_hours[stop_indices],
+            travel_hours=travel[stop_indices],
+            visit_durations_hours=visits[stop_indices],
+        ))
+    return RouteSchedule(days, visit_durations, num_pois - num_scheduled)
@@ -0,0 +1,40 @@
+from typing import List, Dict, Optional, Sequence
+
+import numpy as np
+
+
+INTEREST_WEIGHT = 1.0
+RATING_WEIGHT = 0.5
+COST_WEIGHT = 0.2
+
+MAX_RATING = 5.0
+DEFAULT_RATING = MAX_RATING / 2
+
+
+def build_interest_match_matrix(
+    location_types: Sequence[Optional[str]],
+    interests: List[str],
+    interest_synonyms: Optional[Dict[str, List[str]]] = None,
+) -> np.ndarray:
+    """
+    Builds a boolean candidates x interests matrix: True where the candidate's type is the
+    interest itself or one of its synonyms.
+
+    Matching is done once per distinct type (a handful per city), then broadcast to all
+    candidates with fancy indexing.
+    """
+    interest_vocab = [i.lower() for i in interests if i]
+    num_candidates = len(location_types)
+    if not interest_vocab or num_candidates == 0:
+        return np.zeros((num_candidates, len(interest_vocab)), dtype=bool)
+
+    normalized_types = np.array([t.lower() if t else "" for t in location_types], dtype=object)
+    unique_types, type_inverse = np.unique(normalized_types, return_inverse=True)
+
+    synonyms = interest_synonyms or {}
+    type_matches = np.zeros((len(unique_types), len(interest_vocab)), dtype=bool)
+    for j, interest in enumerate(interest_vocab):
+        accepted = {interest, *(kw.lower() for kw in synonyms.get(interest, []))}
+        type_matches[:, j] = [t in accepted for t in unique_types]
+
+    return type_matches[type_inverse]
@@ -2,6 +2,8 @@ from pydantic import BaseModel, Field, model_validator
 from typing import List, Optional, Any, Tuple, Union
 from datetime import datetime, date, timedelta
 
+MAX_PARSE_BATCH_SIZE = 1000
+
 
 class UserCreate(BaseModel):
     email: str
@@ -48,6 +50,9 @@ class ExtractedParams(BaseModel):
     budget: Optional[float] = None
     budget_currency: Optional[str] = None
 
+class QueryParseBatchRequest(BaseModel):
+    texts: List[str] = Field(..., min_length=1, max_length=MAX_PARSE_BATCH_SIZE)
+
 class QueryCreate(BaseModel):
      user_id: int
      query_text: str
@@ -88,6 +93,8 @@ class RouteLocationDetail(BaseModel):
     latitude: Optional[float] = None
     longitude: Optional[float] = None
     visit_duration_hours: Optional[float] = Field(None, ge=0)
+    day_number: Optional[int] = None
+    arrival_time: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -136,6 +143,13 @@ class SearchResultItem(BaseModel):
     class Config:
         from_attributes = True
 
+class ReplacementSuggestion(SearchResultItem):
+    location_type: Optional[str] = None
+    rating: Optional[float] = None
+    cost: Optional[float] = None
+    cost_currency: Optional[str] = None
+    distance_km: float
+
 class RecommendedItem(BaseModel):
     id: int
     name: str
@@ -151,7 +165,10 @@ class RecommendedItem(BaseModel):
 class POIReplacementRequest(BaseModel):
     new_item_type: str = Field(..., pattern="^(location|activity)$") # Валидация значения
     new_item_id: int
+    allow_distant: bool = True # false — отклонить место дальше ROUTE_COHERENCE_RADIUS_KM от всех точек маршрута
 
 class POIAdditionRequest(BaseModel):
     item_type: str = Field(..., pattern="^(location|activity)$")
-    item_id: int
\ No newline at end of file
+    item_id: int
+    placement: str = Field("end", pattern="^(end|cheapest)$") # "cheapest" — позиция с минимальным приростом времени в пути
+    allow_distant: bool = True # false — отклонить место дальше ROUTE_COHERENCE_RADIUS_KM от всех точек маршрута
\ No newline at end of file
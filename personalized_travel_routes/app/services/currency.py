@@ -1,25 +1,112 @@
-from typing import Dict, Optional
-
-EXCHANGE_RATES: Dict[str, Dict[str, float]] = {
-    "RUB": {
-        "RUB": 1.0,
-        "USD": 1/90.0, 
-        "EUR": 1/100.0,
-        "GBP": 1/115.0,
-    },
-    "USD": {
-        "RUB": 90.0,
-        "USD": 1.0,
-        "EUR": 0.90, 
-        "GBP": 0.78,
-    },
-    "EUR": {
-        "RUB": 100.0,
-        "USD": 1.11,
-        "EUR": 1.0,
-        "GBP": 0.87,
-    },
-}
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import case, event, func, inspect, update
+from sqlalchemy.orm import Session
+
+from database.models import Location, Activity
+
+
+SERVICES_DIR = os.path.dirname(__file__)
+DEFAULT_EXCHANGE_RATES_FILE = os.path.join(SERVICES_DIR, "..", "data", "exchange_rates.json")
+EXCHANGE_RATES_FILE = os.getenv("EXCHANGE_RATES_FILE", DEFAULT_EXCHANGE_RATES_FILE)
+# 0 disables hot reload; otherwise the file's mtime is checked at most this often.
+EXCHANGE_RATES_RELOAD_SECONDS = float(os.getenv("EXCHANGE_RATES_RELOAD_SECONDS", "0"))
+BASE_CURRENCY = "RUB"
+
+
+class ExchangeRateTable:
+    """
+    Fixed exchange rates loaded from a JSON file of the form
+    {"base": "RUB", "rates": {"USD": 90.0, ...}} (units of base per unit of currency).
+
+    Cross rates are kept as a dense matrix, matrix[i, j] = amount of currency j per unit of
+    currency i, so whole arrays convert with one fancy-indexing lookup. `version` grows on
+    every (re)load and tells callers that persisted normalized costs are stale.
+    """
+
+    def __init__(self, path: str = EXCHANGE_RATES_FILE, reload_seconds: float = EXCHANGE_RATES_RELOAD_SECONDS):
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self.version = 0
+        self.currencies: Sequence[str] = ()
+        self.index_by_currency: Dict[str, int] = {}
+        self.base_per_unit = np.empty(0)
+        self.matrix = np.empty((0, 0))
+        self._mtime: Optional[float] = None
+        self._last_check_ts = 0.0
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self) -> None:
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        base = data.get("base", BASE_CURRENCY).upper()
+        rates = {code.upper(): float(rate) for code, rate in data["rates"].items()}
+        rates[base] = 1.0
+        currencies = tuple(sorted(rates))
+        base_per_unit = np.array([rates[c] for c in currencies], dtype=np.float64)
+        with self._lock:
+            self.currencies = currencies
+            self.index_by_currency = {c: i for i, c in enumerate(currencies)}
+            self.base_per_unit = base_per_unit
+            self.matrix = base_per_unit[:, None] / base_per_unit[None, :]
+            self._mtime = os.path.getmtime(self.path)
+            self.version += 1
+        print(f"Exchange rates loaded from {self.path}: {', '.join(currencies)} (version {self.version}).")
+
+    def reload_if_changed(self) -> bool:
+        """Re-reads the rates file when hot reload is on and the file changed; True if it was reloaded."""
+        if self.reload_seconds <= 0:
+            return False
+        now = time.monotonic()
+        if now - self._last_check_ts < self.reload_seconds:
+            return False
+        self._last_check_ts = now
+        try:
+            if os.path.getmtime(self.path) == self._mtime:
+                return False
+            self.load()
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Warning: could not reload exchange rates from {self.path}: {e}")
+            return False
+        return True
+
+    def rate(self, from_currency: str, to_currency: str) -> Optional[float]:
+        i = self.index_by_currency.get(from_currency.upper())
+        j = self.index_by_currency.get(to_currency.upper())
+        if i is None or j is None:
+            return None
+        return float(self.matrix[i, j])
+
+    def currency_indices(self, currencies: Iterable[Optional[str]]) -> np.ndarray:
+        """Row index of each currency code in the rate matrix, -1 for missing or unknown codes."""
+        return np.array(
+            [self.index_by_currency.get(c.upper(), -1) if c else -1 for c in currencies], dtype=np.int64
+        )
+
+    def convert_array(self, amounts, from_currencies: Iterable[Optional[str]], to_currency: str) -> np.ndarray:
+        """
+        Vectorized convert_currency: one rate-matrix lookup for the whole array.
+
+        Returns:
+            float64 array, NaN where the amount is missing or a currency is not supported.
+        """
+        amounts = np.asarray([np.nan if a is None else a for a in amounts], dtype=np.float64)
+        from_indices = self.currency_indices(from_currencies)
+        to_index = self.index_by_currency.get(to_currency.upper())
+        if to_index is None:
+            return np.full(amounts.shape, np.nan)
+        rates = np.where(from_indices >= 0, self.matrix[from_indices, to_index], np.nan)
+        return amounts * rates
+
+
+exchange_rates = ExchangeRateTable()
+
 
 def convert_currency(amount: float, from_currency: str, to_currency: str) -> Optional[float]:
     """
@@ -36,12 +123,114 @@ def convert_currency(amount: float, from_currency: str, to_currency: str) -> Opt
     if from_currency == to_currency:
         return amount
 
-    from_currency = from_currency.upper()
-    to_currency = to_currency.upper()
-
-    if from_currency not in EXCHANGE_RATES or to_currency not in EXCHANGE_RATES[from_currency]:
+    exchange_rate = exchange_rates.rate(from_currency, to_currency)
+    if exchange_rate is None:
         print(f"Warning: Exchange rate from {from_currency} to {to_currency} not found.")
         return None
-
-    exchange_rate = EXCHANGE_RATES[from_currency][to_currency]
     return amount * exchange_rate
+
+
+def convert_currency_array(amounts, from_currencies: Iterable[Optional[str]], to_currency: str) -> np.ndarray:
+    return exchange_rates.convert_array(amounts, from_currencies, to_currency)
+
+
+def cost_in_base_currency(cost: Optional[float], cost_currency: Optional[str]) -> Optional[float]:
+    """Value stored in the cost_rub columns: None when the cost or its currency is unknown."""
+    if cost is None or not cost_currency:
+        return None
+    rate = exchange_rates.rate(cost_currency, BASE_CURRENCY)
+    return cost * rate if rate is not None else None
+
+
+def cost_rub_sql(cost_column, currency_column):
+    """SQL twin of cost_in_base_currency for set-based recomputation."""
+    base_index = exchange_rates.index_by_currency[BASE_CURRENCY]
+    rates = {c: float(exchange_rates.matrix[i, base_index]) for c, i in exchange_rates.index_by_currency.items()}
+    return cost_column * case(rates, value=func.upper(currency_column), else_=None)
+
+
+_synced_rates_version = 0
+_sync_lock = threading.Lock()
+# Called after sync_costs_rub commits: its set-based UPDATEs fire no ORM listeners, so caches
+# derived from cost_rub register here instead.
+_costs_synced_callbacks: List[Callable[[], None]] = []
+
+
+def on_costs_synced(callback: Callable[[], None]) -> None:
+    _costs_synced_callbacks.append(callback)
+
+
+def sync_costs_rub(db_session: Session) -> bool:
+    """
+    Brings locations.cost_rub / activities.cost_rub in line with the current rates with two
+    set-based UPDATEs that only touch rows whose value changes, so workers syncing at the same
+    time do not queue on each other's row locks. Commits db_session and only then records the
+    rates version as synced; meant for a dedicated session, not a request's.
+
+    Returns:
+        True if the columns were recomputed, False if they already matched this rates version.
+    """
+    global _synced_rates_version
+    with _sync_lock:
+        version = exchange_rates.version
+        if _synced_rates_version == version:
+            return False
+        try:
+            for model in (Location, Activity):
+                cost_rub = cost_rub_sql(model.cost, model.cost_currency)
+                db_session.execute(
+                    update(model).where(model.cost_rub.is_distinct_from(cost_rub)).values(cost_rub=cost_rub),
+                    execution_options={"synchronize_session": False},
+                )
+            db_session.commit()
+        except Exception:
+            db_session.rollback()
+            raise
+        _synced_rates_version = version
+    for callback in _costs_synced_callbacks:
+        callback()
+    print(f"Recomputed cost_rub of locations and activities for exchange rates version {version}.")
+    return True
+
+
+def _sync_in_own_session(session_factory: Callable[[], Session]) -> None:
+    db_session = session_factory()
+    try:
+        sync_costs_rub(db_session)
+    except Exception as e:
+        print(f"Warning: could not recompute cost_rub: {e}")
+    finally:
+        db_session.close()
+
+
+def start_rates_sync(session_factory: Callable[[], Session]) -> Optional[threading.Thread]:
+    """
+    Syncs cost_rub with the loaded rates once (rows written by raw SQL or under an older rates
+    file). With hot reload on, a daemon thread then polls the rates file and re-syncs after
+    every reload, or retries a sync that failed.
+    """
+    _sync_in_own_session(session_factory)
+    if EXCHANGE_RATES_RELOAD_SECONDS <= 0:
+        return None
+
+    def watch_rates():
+        while True:
+            time.sleep(EXCHANGE_RATES_RELOAD_SECONDS)
+            exchange_rates.reload_if_changed()
+            if _synced_rates_version != exchange_rates.version:
+                _sync_in_own_session(session_factory)
+
+    thread = threading.Thread(target=watch_rates, name="exchange-rates-sync", daemon=True)
+    thread.start()
+    return thread
+
+
+def _normalize_cost_on_change(mapper, connection, target) -> None:
+    attrs = inspect(target).attrs
+    if target.cost_rub is None or attrs.cost.history.has_changes() or attrs.cost_currency.history.has_changes():
+        target.cost_rub = cost_in_base_currency(target.cost, target.cost_currency)
+
+
+for _model in (Location, Activity):
+    event.listen(_model, "before_insert", _normalize_cost_on_change)
+    event.listen(_model, "before_update", _normalize_cost_on_change)
@@ -40,4 +40,80 @@ def estimate_travel_time(distance_km: float, travel_speed_km_h: float) -> float:
      """
      if travel_speed_km_h <= 0:
          return 0
-     return distance_km / travel_speed_km_h
\ No newline at end of file
+     return distance_km / travel_speed_km_h
+
+def calculate_distance_matrix(
+    latitudes,
+    longitudes,
+    dtype=np.float64,
+    upper_triangle: bool = False,
+) -> np.ndarray:
+    """
+    Calculates pairwise Haversine distances between all points in one NumPy broadcast.
+
+    Args:
+        latitudes, longitudes: Sequences (or arrays) of coordinates in degrees, length N.
+        dtype: Floating point type of the result (np.float64 or np.float32).
+        upper_triangle: If True, returns only the strictly upper triangle (i < j) as a
+            condensed 1-D array of length N*(N-1)/2, row-major (same layout as
+            scipy.spatial.distance.squareform).
+
+    Returns:
+        N x N distance matrix in kilometers, or its condensed upper triangle.
+    """
+    R = 6371
+
+    lat_rad = np.radians(np.asarray(latitudes, dtype=dtype))
+    lon_rad = np.radians(np.asarray(longitudes, dtype=dtype))
+    num_points = lat_rad.shape[0]
+
+    if upper_triangle:
+        i_idx, j_idx = np.triu_indices(num_points, k=1)
+        dlat = lat_rad[j_idx] - lat_rad[i_idx]
+        dlon = lon_rad[j_idx] - lon_rad[i_idx]
+        cos_product = np.cos(lat_rad[i_idx]) * np.cos(lat_rad[j_idx])
+    else:
+        dlat = lat_rad[np.newaxis, :] - lat_rad[:, np.newaxis]
+        dlon = lon_rad[np.newaxis, :] - lon_rad[:, np.newaxis]
+        cos_lat = np.cos(lat_rad)
+        cos_product = cos_lat[:, np.newaxis] * cos_lat[np.newaxis, :]
+
+    a = np.sin(dlat / 2)**2 + cos_product * np.sin(dlon / 2)**2
+    np.clip(a, 0.0, 1.0, out=a)
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    return (R * c).astype(dtype, copy=False)
+
+
+def estimate_travel_time_matrix(distance_matrix_km: np.ndarray, travel_speed_km_h: float) -> np.ndarray:
+     """
+     Estimates travel times for a whole distance matrix (full or condensed).
+
+     Args:
+         distance_matrix_km: Distances in kilometers, as returned by calculate_distance_matrix.
+         travel_speed_km_h: Average travel speed in kilometers per hour.
+
+     Returns:
+         Array of the same shape and dtype with travel times in hours. All zeros if speed is 0.
+     """
+     if travel_speed_km_h <= 0:
+         return np.zeros_like(distance_matrix_km)
+     return distance_matrix_km / distance_matrix_km.dtype.type(travel_speed_km_h)
+
+
+def condensed_to_square(condensed: np.ndarray, num_points: int) -> np.ndarray:
+    """
+    Expands a condensed upper-triangle array back into a symmetric N x N matrix.
+
+    Args:
+        condensed: Array of length N*(N-1)/2 produced with upper_triangle=True.
+        num_points: N.
+
+    Returns:
+        Symmetric N x N matrix with a zero diagonal.
+    """
+    square = np.zeros((num_points, num_points), dtype=condensed.dtype)
+    i_idx, j_idx = np.triu_indices(num_points, k=1)
+    square[i_idx, j_idx] = condensed
+    square[j_idx, i_idx] = condensed
+    return square
@@ -0,0 +1,273 @@
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database.models import Location
+
+REFRESH_INTERVAL_SECONDS = 60.0
+# A destination that does not resolve re-checks the fingerprint at most this often.
+MISS_REFRESH_INTERVAL_SECONDS = 5.0
+# Typos resolve silently only above this Dice similarity and only when the runner-up stored name
+# scores at least FUZZY_MATCH_MARGIN lower; weaker or ambiguous matches become suggestions instead.
+FUZZY_MATCH_THRESHOLD = 0.7
+FUZZY_MATCH_MARGIN = 0.15
+FUZZY_SUGGESTION_THRESHOLD = 0.5
+MAX_SUGGESTIONS = 3
+LEADING_PREPOSITIONS = {"в", "во", "на", "из", "до", "по"}
+
+# A resolved destination: ("city" | "country", value exactly as stored in the locations table).
+GazetteerEntry = Tuple[str, str]
+
+_VELAR_OR_SIBILANT = set("гкхжшщч")
+_HUSHING_OR_TS = set("жшщчц")
+_INDECLINABLE_ENDINGS = set("оеиуюэы")
+
+# (nominative ending, [genitive, dative, accusative, instrumental, prepositional]) — longest ending first.
+_ADJECTIVE_ENDINGS = [
+    ("ий", ["его", "ему", "ий", "им", "ем"]),
+    ("ый", ["ого", "ому", "ый", "ым", "ом"]),
+    ("ой", ["ого", "ому", "ой", "ым", "ом"]),
+    ("ая", ["ой", "ой", "ую", "ой", "ой"]),
+    ("ое", ["ого", "ому", "ое", "ым", "ом"]),
+]
+
+
+def normalize_place_name(text: str) -> str:
+    text = text.lower().replace("ё", "е")
+    text = re.sub(r"[^\w\s-]+", " ", text)
+    words = re.sub(r"\s*-\s*", "-", text).split()
+    while len(words) > 1 and words[0] in LEADING_PREPOSITIONS:
+        words = words[1:]
+    return " ".join(words)
+
+
+def _noun_case_forms(word: str) -> List[List[str]]:
+    """Case forms of a single (normalized) noun; returns one list per plausible declension."""
+    if word.endswith("ия"):
+        stem = word[:-2]
+        return [[stem + e for e in ("ии", "ии", "ию", "ией", "ии")]]
+    if word.endswith("а"):
+        stem = word[:-1]
+        genitive = "и" if stem and stem[-1] in _VELAR_OR_SIBILANT else "ы"
+        return [[stem + e for e in (genitive, "е", "у", "ой", "е")]]
+    if word.endswith("я"):
+        stem = word[:-1]
+        return [[stem + e for e in ("и", "е", "ю", "ей", "е")]]
+    if word.endswith("ь"):
+        stem = word[:-1]
+        return [
+            [stem + e for e in ("и", "и", "ь", "ью", "и")],
+            [stem + e for e in ("я", "ю", "ь", "ем", "е")],
+        ]
+    if word.endswith("й"):
+        stem = word[:-1]
+        return [[stem + e for e in ("я", "ю", "й", "ем", "е")]]
+    if not word or word[-1] in _INDECLINABLE_ENDINGS or not word[-1].isalpha():
+        return []
+    instrumental = "ем" if word[-1] in _HUSHING_OR_TS else "ом"
+    return [[word + e for e in ("а", "у", "", instrumental, "е")]]
+
+
+def _word_case_forms(word: str, is_last_word: bool) -> List[List[str]]:
+    if "-" in word:
+        parts = word.split("-")
+        # "ростов-на-дону" declines its first part, "санкт-петербург" / "нью-йорк" their last one.
+        inflected_index = 0 if "на" in parts[1:-1] else len(parts) - 1
+        return [
+            ["-".join(parts[:inflected_index] + [form] + parts[inflected_index + 1:]) for form in forms]
+            for forms in _word_case_forms(parts[inflected_index], is_last_word)
+        ]
+    if not is_last_word:
+        for ending, case_endings in _ADJECTIVE_ENDINGS:
+            if word.endswith(ending) and len(word) > len(ending) + 1:
+                return [[word[:-len(ending)] + e for e in case_endings]]
+    return _noun_case_forms(word)
+
+
+def inflected_forms(name: str) -> Set[str]:
+    """
+    Normalized name plus its genitive/dative/accusative/instrumental/prepositional forms
+    ("москва" -> "москвы", "москве", "москву", "москвой"; "нижний новгород" -> "нижнего новгорода", ...).
+    Rule-based: place names are few and mostly regular, and this runs once per distinct name.
+    """
+    normalized = normalize_place_name(name)
+    forms = {normalized}
+    words = normalized.split()
+    if not words:
+        return forms
+    per_word = [_word_case_forms(w, i == len(words) - 1) or [[w] * 5] for i, w in enumerate(words)]
+    for case_index in range(5):
+        variants = [""]
+        for word_declensions in per_word:
+            variants = [f"{prefix} {d[case_index]}".strip() for prefix in variants for d in word_declensions]
+        forms.update(variants)
+    return forms
+
+
+def _trigrams(key: str) -> Set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class DestinationGazetteer:
+    """
+    In-memory index of every distinct Location.city / Location.country value.
+
+    Each stored name is registered under its normalized and inflected forms, so a destination
+    typed in any grammatical case resolves with one dict lookup; a trigram index over the same
+    keys catches typos (Dice similarity >= FUZZY_MATCH_THRESHOLD, clearly ahead of any other stored name).
+    The index is rebuilt when the (max id, row count) fingerprint of the locations table changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries_by_key: Dict[str, Set[GazetteerEntry]] = {}
+        self._trigram_keys: Dict[str, Set[str]] = {}
+        self._fingerprint: Optional[Tuple[int, int]] = None
+        self._last_refresh_ts = 0.0
+
+    def reset(self) -> None:
+        """Forgets every name; the next refresh_from_db() rebuilds from the table."""
+        with self._lock:
+            self.build([], [])
+            self._fingerprint = None
+            self._last_refresh_ts = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries_by_key)
+
+    def build(self, cities: Iterable[Optional[str]], countries: Iterable[Optional[str]]) -> None:
+        entries_by_key: Dict[str, Set[GazetteerEntry]] = defaultdict(set)
+        for field, values in (("city", cities), ("country", countries)):
+            for value in values:
+                if not value or not value.strip():
+                    continue
+                for form in inflected_forms(value):
+                    entries_by_key[form].add((field, value))
+        trigram_keys: Dict[str, Set[str]] = defaultdict(set)
+        for key in entries_by_key:
+            for trigram in _trigrams(key):
+                trigram_keys[trigram].add(key)
+        with self._lock:
+            self._entries_by_key = dict(entries_by_key)
+            self._trigram_keys = dict(trigram_keys)
+
+    def refresh_from_db(self, db_session: Session, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_refresh_ts < REFRESH_INTERVAL_SECONDS:
+            return
+        with self._lock:
+            max_id, row_count = db_session.query(func.max(Location.id), func.count(Location.id)).one()
+            fingerprint = (max_id or 0, row_count)
+            if fingerprint != self._fingerprint:
+                rows = db_session.query(Location.city, Location.country).distinct().all()
+                self.build({r[0] for r in rows}, {r[1] for r in rows})
+                self._fingerprint = fingerprint
+                print(f"Destination gazetteer rebuilt: {len(self)} name forms.")
+            self._last_refresh_ts = now
+
+    def _fuzzy_scores(self, key: str) -> Dict[str, float]:
+        """Best Dice similarity per stored name (over all its forms) that shares a trigram with key."""
+        query_trigrams = _trigrams(key)
+        overlap: Dict[str, int] = defaultdict(int)
+        for trigram in query_trigrams:
+            for candidate in self._trigram_keys.get(trigram, ()):
+                overlap[candidate] += 1
+        scores_by_name: Dict[str, float] = {}
+        for candidate, shared in overlap.items():
+            score = 2.0 * shared / (len(query_trigrams) + len(_trigrams(candidate)))
+            for _, value in self._entries_by_key[candidate]:
+                if score > scores_by_name.get(value, 0.0):
+                    scores_by_name[value] = score
+        return scores_by_name
+
+    def _fuzzy_lookup(self, key: str) -> Set[GazetteerEntry]:
+        scores_by_name = self._fuzzy_scores(key)
+        if not scores_by_name:
+            return set()
+        ranked = sorted(scores_by_name.items(), key=lambda item: -item[1])
+        best_name, best_score = ranked[0]
+        runner_up_score = ranked[1][1] if len(ranked) > 1 else 0.0
+        if best_score < FUZZY_MATCH_THRESHOLD or best_score - runner_up_score < FUZZY_MATCH_MARGIN:
+            return set()
+        return {
+            entry
+            for form in inflected_forms(best_name)
+            for entry in self._entries_by_key.get(form, ())
+            if entry[1] == best_name
+        }
+
+    def resolve(self, destination: str) -> Set[GazetteerEntry]:
+        key = normalize_place_name(destination or "")
+        if not key:
+            return set()
+        with self._lock:
+            exact = self._entries_by_key.get(key)
+            if exact:
+                return set(exact)
+            return self._fuzzy_lookup(key)
+
+    def suggest(self, destination: str) -> List[str]:
+        """Stored names similar to an unresolved destination, best first (at most MAX_SUGGESTIONS)."""
+        key = normalize_place_name(destination or "")
+        if not key:
+            return []
+        with self._lock:
+            scores_by_name = self._fuzzy_scores(key)
+        ranked = sorted(scores_by_name.items(), key=lambda item: (-item[1], item[0]))
+        return [name for name, score in ranked if score >= FUZZY_SUGGESTION_THRESHOLD][:MAX_SUGGESTIONS]
+
+    def refresh_after_miss(self, db_session: Session) -> None:
+        """Fingerprint check for a destination that did not resolve, rate-limited to one per MISS_REFRESH_INTERVAL_SECONDS."""
+        if time.monotonic() - self._last_refresh_ts >= MISS_REFRESH_INTERVAL_SECONDS:
+            self.refresh_from_db(db_session, force=True)
+
+
+destination_gazetteer = DestinationGazetteer()
+
+
+def resolve_destinations(db_session: Session, destinations: Iterable[str]) -> Tuple[Set[str], Set[str]]:
+    """
+    Maps user-supplied destination strings to stored city and country values.
+    A destination that does not resolve triggers a fingerprint check (at most once per
+    MISS_REFRESH_INTERVAL_SECONDS), so places added moments ago are found without waiting
+    for the refresh interval.
+
+    Returns:
+        (cities, countries) exactly as stored in the locations table.
+    """
+    destination_gazetteer.refresh_from_db(db_session)
+    entries: Set[GazetteerEntry] = set()
+    for destination in destinations:
+        resolved = destination_gazetteer.resolve(destination)
+        if not resolved and destination and destination.strip():
+            destination_gazetteer.refresh_after_miss(db_session)
+            resolved = destination_gazetteer.resolve(destination)
+        entries |= resolved
+    cities = {value for field, value in entries if field == "city"}
+    countries = {value for field, value in entries if field == "country"}
+    return cities, countries
+
+
+def destination_suggestions(db_session: Session, destinations: Iterable[str]) -> Dict[str, List[str]]:
+    """
+    For every destination that does not resolve, the stored names it most likely meant.
+    Destinations that resolve, or resemble nothing, are left out.
+    """
+    destination_gazetteer.refresh_from_db(db_session)
+    suggestions: Dict[str, List[str]] = {}
+    for destination in destinations:
+        if not destination or not destination.strip() or destination_gazetteer.resolve(destination):
+            continue
+        destination_gazetteer.refresh_after_miss(db_session)
+        if destination_gazetteer.resolve(destination):
+            continue
+        options = destination_gazetteer.suggest(destination)
+        if options:
+            suggestions[destination] = options
+    return suggestions
@@ -0,0 +1,219 @@
+import re
+from functools import lru_cache
+from typing import List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import event, inspect
+
+from database.models import Location
+
+
+SLOT_MINUTES = 15
+SLOTS_PER_HOUR = 60 // SLOT_MINUTES
+SLOTS_PER_DAY = 24 * SLOTS_PER_HOUR
+DAYS_PER_WEEK = 7
+ALL_DAYS = frozenset(range(DAYS_PER_WEEK))
+WEEKDAY_NAMES = ['пн', 'вт', 'ср', 'чт', 'пт', 'сб', 'вс']
+
+_DAY_ALIASES = [
+    (r'понедельник\w*|пон|пн', 0),
+    (r'вторник\w*|вт', 1),
+    (r'сред\w*|ср', 2),
+    (r'четверг\w*|чт', 3),
+    (r'пятниц\w*|пт', 4),
+    (r'суббот\w*|сб', 5),
+    (r'воскресень\w*|вс', 6),
+]
+_DAY = '|'.join(f'(?:{alias})' for alias, _ in _DAY_ALIASES)
+_TIME = r'(\d{1,2})[:.](\d{2})'
+
+_TOKEN_RE = re.compile(
+    rf'(?P<interval>{_TIME}\s*-\s*{_TIME})'
+    rf'|(?P<interval_words>с\s*{_TIME}\s*до\s*{_TIME})'
+    rf'|(?P<day_range>\b(?:{_DAY})\b\.?\s*-\s*\b(?:{_DAY})\b)'
+    rf'|(?P<day>\b(?:{_DAY})\b)'
+    r'|(?P<daily>ежедневно|каждый\s+день|без\s+выходных)'
+    r'|(?P<weekdays>будни|по\s+будням)'
+    r'|(?P<weekend>выходные|по\s+выходным)'
+    r'|(?P<closed>выходной|закрыто|не\s+работает)'
+    r'|(?P<always>круглосуточно|24\s*/\s*7|24\s+часа)'
+    r'|(?P<break>перерыв|обед)'
+    r'|(?P<separator>;|\n)'
+)
+
+
+def _day_index(token: str) -> int:
+    for alias, index in _DAY_ALIASES:
+        if re.fullmatch(alias, token):
+            return index
+    raise ValueError(token)
+
+
+def _day_range(start: int, end: int) -> Set[int]:
+    if start <= end:
+        return set(range(start, end + 1))
+    return set(range(start, DAYS_PER_WEEK)) | set(range(0, end + 1))
+
+
+def _to_slot(hour: str, minute: str) -> int:
+    h, m = int(hour), int(minute)
+    if not (0 <= h <= 24 and 0 <= m < 60) or (h == 24 and m):
+        raise ValueError(f"{hour}:{minute}")
+    return (h * 60 + m) // SLOT_MINUTES
+
+
+class _Group:
+    def __init__(self):
+        self.days: Optional[Set[int]] = None
+        self.intervals: List[Tuple[int, int]] = []
+        self.breaks: List[Tuple[int, int]] = []
+        self.closed = False
+        self.always = False
+        self.break_pending = False
+
+    def has_schedule(self) -> bool:
+        return bool(self.intervals or self.breaks or self.closed or self.always)
+
+
+def _apply_group(bitmap: np.ndarray, group: _Group) -> None:
+    days = sorted(group.days if group.days is not None else ALL_DAYS)
+    for day in days:
+        bitmap[day, :] = group.always and not group.closed
+    if group.closed:
+        return
+    for day in days:
+        for start, end in group.intervals:
+            if end > start:
+                bitmap[day, start:end] = True
+            else:
+                # Past midnight: the tail belongs to the next day.
+                bitmap[day, start:] = True
+                bitmap[(day + 1) % DAYS_PER_WEEK, :end] = True
+        for start, end in group.breaks:
+            bitmap[day, start:end] = False
+
+
+def compile_opening_hours(hours_str: Optional[str]) -> Optional[np.ndarray]:
+    """
+    Compiles a free-form Russian opening-hours string into a weekly bitmap.
+
+    Understands weekday lists and ranges ("Пн, Ср", "Вт-Вс", "будни", "выходные", "ежедневно"),
+    several intervals per day ("10:00-14:00, 15:00-19:00", "с 10:00 до 18:00"), breaks
+    ("перерыв 13:00-14:00"), days off ("Пн выходной"), "круглосуточно" and intervals past
+    midnight. Later day groups override earlier ones for the days they name.
+
+    Returns:
+        Boolean array of shape (7, SLOTS_PER_DAY), True where the place is open, or None when
+        nothing could be recognised (unknown schedule).
+    """
+    if not hours_str:
+        return None
+
+    text = hours_str.lower().replace('–', '-').replace('—', '-')
+    bitmap = np.zeros((DAYS_PER_WEEK, SLOTS_PER_DAY), dtype=bool)
+    groups: List[_Group] = []
+    group = _Group()
+
+    def start_new_group():
+        nonlocal group
+        if group.has_schedule() or group.days is not None:
+            groups.append(group)
+        group = _Group()
+
+    def add_days(days: Set[int]):
+        if group.has_schedule():
+            start_new_group()
+        group.days = (group.days or set()) | days
+
+    try:
+        for match in _TOKEN_RE.finditer(text):
+            kind = match.lastgroup
+            token = match.group(kind)
+            if kind in ('interval', 'interval_words'):
+                times = re.findall(_TIME, token)
+                interval = (_to_slot(*times[0]), _to_slot(*times[1]))
+                if group.break_pending:
+                    group.breaks.append(interval)
+                    group.break_pending = False
+                else:
+                    group.intervals.append(interval)
+            elif kind == 'day_range':
+                first, last = re.findall(rf'\b(?:{_DAY})\b', token)
+                add_days(_day_range(_day_index(first), _day_index(last)))
+            elif kind == 'day':
+                add_days({_day_index(token)})
+            elif kind == 'daily':
+                add_days(set(ALL_DAYS))
+            elif kind == 'weekdays':
+                add_days(set(range(5)))
+            elif kind == 'weekend':
+                add_days({5, 6})
+            elif kind == 'closed':
+                group.closed = True
+            elif kind == 'always':
+                group.always = True
+            elif kind == 'break':
+                group.break_pending = True
+            elif kind == 'separator':
+                start_new_group()
+    except ValueError:
+        return None
+    start_new_group()
+
+    if not any(g.has_schedule() for g in groups):
+        return None
+    for g in groups:
+        if g.has_schedule():
+            _apply_group(bitmap, g)
+    return bitmap
+
+
+def pack_opening_hours(bitmap: Optional[np.ndarray]) -> bytes:
+    """84 bytes for a known schedule, b'' for an unknown one (NULL in the DB means "not compiled yet")."""
+    if bitmap is None:
+        return b''
+    return np.packbits(bitmap.ravel()).tobytes()
+
+
+@lru_cache(maxsize=4096)
+def unpack_opening_hours(packed: bytes) -> Optional[np.ndarray]:
+    if not packed:
+        return None
+    bits = np.unpackbits(np.frombuffer(packed, dtype=np.uint8))[:DAYS_PER_WEEK * SLOTS_PER_DAY]
+    bitmap = bits.astype(bool).reshape(DAYS_PER_WEEK, SLOTS_PER_DAY)
+    bitmap.flags.writeable = False
+    return bitmap
+
+
+@lru_cache(maxsize=4096)
+def compile_opening_hours_cached(hours_str: Optional[str]) -> bytes:
+    return pack_opening_hours(compile_opening_hours(hours_str))
+
+
+def location_opening_hours_bitmap(location: Location) -> Optional[np.ndarray]:
+    """
+    O(1) lookup of a location's compiled schedule. Rows that were never compiled (e.g. inserted
+    by raw SQL) are compiled once and written back on the session's next flush.
+    """
+    packed = location.opening_hours_compiled
+    if packed is None:
+        packed = compile_opening_hours_cached(location.opening_hours)
+        location.opening_hours_compiled = packed
+    return unpack_opening_hours(bytes(packed))
+
+
+def is_open_during(bitmap: Optional[np.ndarray], weekday: int, start_hour: float, end_hour: float) -> bool:
+    if bitmap is None:
+        return True
+    start_slot = int(start_hour * SLOTS_PER_HOUR)
+    end_slot = min(int(np.ceil(end_hour * SLOTS_PER_HOUR)), SLOTS_PER_DAY)
+    return bool(bitmap[weekday, start_slot:end_slot].all())
+
+
+def _compile_on_change(mapper, connection, target: Location) -> None:
+    if target.opening_hours_compiled is None or inspect(target).attrs.opening_hours.history.has_changes():
+        target.opening_hours_compiled = compile_opening_hours_cached(target.opening_hours)
+
+
+event.listen(Location, "before_insert", _compile_on_change)
+event.listen(Location, "before_update", _compile_on_change)
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from app import schemas
+from app.services.currency import exchange_rates
+
+
+ROUTE_CACHE_MAX_ENTRIES = 1024
+# Optional second level shared by all workers; unset keeps the cache in-process only.
+ROUTE_CACHE_DIR = os.getenv("ROUTE_CACHE_DIR")
+
+
+def content_fingerprint(details_list: List[schemas.RouteLocationDetail], text_format_params: dict) -> str:
+    """
+    Digest of what a rendered route shows besides the route's own rows: the stops' Location and
+    Activity fields, the source Query's destination and the exchange rates used for the amounts.
+    None of these bump Route.version, so they are part of the cache key instead.
+    """
+    payload = json.dumps({
+        "stops": [detail.model_dump(mode="json") for detail in details_list],
+        "params": text_format_params,
+        "rates": dict(zip(exchange_rates.currencies, exchange_rates.base_per_unit.tolist())),
+    }, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class RenderedRouteCache:
+    """
+    Cache of fully built FullRouteDetailsResponse objects keyed by (route_id, version, fingerprint),
+    where fingerprint is content_fingerprint() of the data the response is rendered from.
+
+    Route.version is bumped by every mutation of a route, and the fingerprint changes with the
+    locations, the query and the rates, so an entry never has to be invalidated explicitly: a
+    stale key is simply never asked for again. Storing a newer entry of a route drops the older
+    ones from memory and disk.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = ROUTE_CACHE_DIR, max_entries: int = ROUTE_CACHE_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        # route_id -> (version, fingerprint, response); one entry per route, in LRU order.
+        self._entries: "OrderedDict[int, Tuple[int, str, schemas.FullRouteDetailsResponse]]" = OrderedDict()
+        # route_id -> cache file this process wrote or read, so older files are removed without listing the directory.
+        self._files: "OrderedDict[int, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _file_path(self, route_id: int, version: int, fingerprint: str) -> str:
+        return os.path.join(self.cache_dir, f"route_{route_id}_v{version}_{fingerprint}.json")
+
+    def _remember(self, route_id: int, version: int, fingerprint: str, response: schemas.FullRouteDetailsResponse) -> None:
+        with self._lock:
+            self._entries[route_id] = (version, fingerprint, response)
+            self._entries.move_to_end(route_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _track_file(self, route_id: int, path: str) -> None:
+        """Records the route's current cache file and deletes the ones it replaces or pushes out of the index."""
+        with self._lock:
+            stale_paths = [self._files.pop(route_id, path)]
+            self._files[route_id] = path
+            while len(self._files) > self.max_entries:
+                stale_paths.append(self._files.popitem(last=False)[1])
+        for stale_path in stale_paths:
+            if stale_path == path:
+                continue
+            try:
+                os.remove(stale_path)
+            except OSError:
+                pass
+
+    def get(self, route_id: int, version: int, fingerprint: str) -> Optional[schemas.FullRouteDetailsResponse]:
+        with self._lock:
+            entry = self._entries.get(route_id)
+            if entry is not None and entry[:2] == (version, fingerprint):
+                self._entries.move_to_end(route_id)
+                self.hits += 1
+                return entry[2]
+
+        if self.cache_dir:
+            path = self._file_path(route_id, version, fingerprint)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    response = schemas.FullRouteDetailsResponse.model_validate_json(f.read())
+            except (OSError, ValueError):
+                response = None
+            if response is not None:
+                self._remember(route_id, version, fingerprint, response)
+                self._track_file(route_id, path)
+                with self._lock:
+                    self.disk_hits += 1
+                return response
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, route_id: int, version: int, fingerprint: str, response: schemas.FullRouteDetailsResponse) -> None:
+        self._remember(route_id, version, fingerprint, response)
+        if not self.cache_dir:
+            return
+        path = self._file_path(route_id, version, fingerprint)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(response.model_dump_json())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: could not persist rendered route {route_id}: {e}")
+            return
+        self._track_file(route_id, path)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+rendered_route_cache = RenderedRouteCache()
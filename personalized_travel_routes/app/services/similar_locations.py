@@ -0,0 +1,199 @@
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+
+from database.models import Location
+from app.services.currency import on_costs_synced
+from app.services.spatial_index import chord_to_km, km_to_chord, lat_lon_to_unit_xyz
+
+SUGGESTIONS_PER_LOCATION = 10
+# Nearest same-type locations examined per location before ranking by cost similarity.
+NEIGHBOUR_POOL_SIZE = 30
+MAX_SUGGESTION_DISTANCE_KM = 15.0
+# Score = distance / MAX_SUGGESTION_DISTANCE_KM + COST_SIMILARITY_WEIGHT * |ln(1 + cost_a) - ln(1 + cost_b)|.
+COST_SIMILARITY_WEIGHT = 0.5
+REFRESH_INTERVAL_SECONDS = 60.0
+TRACKED_ATTRIBUTES = ("latitude", "longitude", "type", "cost_rub")
+
+# (location_id, distance_km), most similar first.
+Suggestion = Tuple[int, float]
+
+
+def _type_key(location_type: Optional[str]) -> str:
+    return (location_type or "").strip().lower()
+
+
+class SimilarLocationIndex:
+    """
+    Precomputed replacement suggestions: for every location, the SUGGESTIONS_PER_LOCATION most
+    similar locations of the same type within MAX_SUGGESTION_DISTANCE_KM, ranked by distance and
+    by how close their cost in RUB is.
+
+    Suggestions are computed per type group with one batched cKDTree query. ORM writes to a
+    location mark it dirty (see the listeners below), and the next refresh recomputes only the
+    type groups the dirty rows left or joined. Changes made behind the ORM's back are caught by a
+    (max id, row count) fingerprint check, at most every REFRESH_INTERVAL_SECONDS; a cost_rub
+    sync after a rates reload rewrites too many rows for that and invalidates the whole index.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._rows: Dict[int, Tuple[str, float, float, float]] = {}
+        self._suggestions: Dict[int, List[Suggestion]] = {}
+        self._dirty_ids: Set[int] = set()
+        self._fingerprint: Optional[Tuple[int, int]] = None
+        self._last_refresh_ts = 0.0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._rows = {}
+            self._suggestions = {}
+            self._dirty_ids = set()
+            self._fingerprint = None
+            self._last_refresh_ts = 0.0
+
+    def mark_dirty(self, location_id: Optional[int]) -> None:
+        if location_id is not None:
+            with self._lock:
+                self._dirty_ids.add(location_id)
+
+    def invalidate(self) -> None:
+        """Makes the next refresh rebuild the whole index."""
+        with self._lock:
+            self._fingerprint = None
+
+    def _read_fingerprint(self, db_session: Session) -> Tuple[int, int]:
+        """(max id, row count) of the locations that have coordinates, i.e. of what _rows should hold."""
+        max_id, row_count = db_session.query(func.coalesce(func.max(Location.id), 0), func.count(Location.id)).filter(
+            Location.latitude.isnot(None), Location.longitude.isnot(None)
+        ).one()
+        return int(max_id), int(row_count)
+
+    def _load_rows(self, db_session: Session, location_ids: Optional[Iterable[int]] = None):
+        query = db_session.query(Location.id, Location.type, Location.latitude, Location.longitude, Location.cost_rub)
+        if location_ids is not None:
+            query = query.filter(Location.id.in_(list(location_ids)))
+        return {
+            row_id: (_type_key(loc_type), lat, lon, cost_rub or 0.0)
+            for row_id, loc_type, lat, lon, cost_rub in query.all()
+            if lat is not None and lon is not None
+        }
+
+    def _recompute_types(self, type_keys: Iterable[str]) -> None:
+        ids_by_type: Dict[str, List[int]] = defaultdict(list)
+        wanted = set(type_keys)
+        for row_id, (type_key, _, _, _) in self._rows.items():
+            if type_key in wanted:
+                ids_by_type[type_key].append(row_id)
+        for type_key in wanted:
+            ids = np.array(sorted(ids_by_type.get(type_key, [])), dtype=np.int64)
+            if ids.size == 0:
+                continue
+            rows = [self._rows[i] for i in ids.tolist()]
+            xyz = lat_lon_to_unit_xyz([r[1] for r in rows], [r[2] for r in rows])
+            log_costs = np.log1p(np.maximum([r[3] for r in rows], 0.0))
+            k = min(NEIGHBOUR_POOL_SIZE + 1, ids.size)
+            chords, neighbour_rows = cKDTree(xyz).query(
+                xyz, k=k, distance_upper_bound=km_to_chord(MAX_SUGGESTION_DISTANCE_KM)
+            )
+            chords = chords.reshape(ids.size, k)
+            neighbour_rows = neighbour_rows.reshape(ids.size, k)
+            # Missing neighbours come back as row index == ids.size with an infinite distance.
+            is_valid = (neighbour_rows < ids.size) & (neighbour_rows != np.arange(ids.size)[:, None])
+            safe_rows = np.where(is_valid, neighbour_rows, 0)
+            distances_km = chord_to_km(np.where(is_valid, chords, 0.0))
+            scores = (distances_km / MAX_SUGGESTION_DISTANCE_KM
+                      + COST_SIMILARITY_WEIGHT * np.abs(log_costs[safe_rows] - log_costs[:, None]))
+            scores[~is_valid] = np.inf
+            order = np.argsort(scores, axis=1, kind="stable")[:, :SUGGESTIONS_PER_LOCATION]
+            for row_index, location_id in enumerate(ids.tolist()):
+                self._suggestions[location_id] = [
+                    (int(ids[safe_rows[row_index, j]]), float(distances_km[row_index, j]))
+                    for j in order[row_index].tolist() if is_valid[row_index, j]
+                ]
+
+    def build(self, db_session: Session) -> None:
+        with self._lock:
+            self._rows = self._load_rows(db_session)
+            self._suggestions = {}
+            self._dirty_ids = set()
+            self._recompute_types({r[0] for r in self._rows.values()})
+            self._fingerprint = self._read_fingerprint(db_session)
+            self._last_refresh_ts = time.monotonic()
+        print(f"Similar-location index built over {len(self._rows)} locations.")
+
+    def refresh(self, db_session: Session) -> None:
+        with self._lock:
+            if self._fingerprint is None:
+                self.build(db_session)
+                return
+            now = time.monotonic()
+            if now - self._last_refresh_ts >= REFRESH_INTERVAL_SECONDS:
+                self._last_refresh_ts = now
+                max_id, row_count = self._read_fingerprint(db_session)
+                if (max_id, row_count) != self._fingerprint:
+                    known_max_id = max(self._rows, default=0)
+                    new_ids = [r[0] for r in db_session.query(Location.id).filter(
+                        Location.id > known_max_id, Location.latitude.isnot(None), Location.longitude.isnot(None)
+                    ).all()]
+                    if row_count != len(self._rows) + len(new_ids):
+                        self.build(db_session)
+                        return
+                    self._dirty_ids.update(new_ids)
+                self._fingerprint = (max_id, row_count)
+            if not self._dirty_ids:
+                return
+            dirty_ids, self._dirty_ids = self._dirty_ids, set()
+            fresh_rows = self._load_rows(db_session, dirty_ids)
+            affected_types = set()
+            for location_id in dirty_ids:
+                old_row = self._rows.pop(location_id, None)
+                self._suggestions.pop(location_id, None)
+                if old_row is not None:
+                    affected_types.add(old_row[0])
+                if location_id in fresh_rows:
+                    self._rows[location_id] = fresh_rows[location_id]
+                    affected_types.add(fresh_rows[location_id][0])
+            self._recompute_types(affected_types)
+        print(f"Similar-location index: {len(dirty_ids)} changed locations, recomputed types {sorted(affected_types)}.")
+
+    def suggestions_for(self, location_id: int, limit: int = SUGGESTIONS_PER_LOCATION,
+                        exclude_ids: Iterable[int] = ()) -> List[Suggestion]:
+        excluded = set(exclude_ids)
+        with self._lock:
+            suggestions = self._suggestions.get(location_id, [])
+        return [s for s in suggestions if s[0] not in excluded][:limit]
+
+
+similar_location_index = SimilarLocationIndex()
+
+
+def get_similar_location_index(db_session: Session) -> SimilarLocationIndex:
+    """Returns the process-wide index, building it on first use and applying pending location changes."""
+    similar_location_index.refresh(db_session)
+    return similar_location_index
+
+
+def _mark_changed_location(mapper, connection, target: Location) -> None:
+    similar_location_index.mark_dirty(target.id)
+
+
+def _mark_updated_location(mapper, connection, target: Location) -> None:
+    attrs = inspect(target).attrs
+    if any(getattr(attrs, name).history.has_changes() for name in TRACKED_ATTRIBUTES):
+        similar_location_index.mark_dirty(target.id)
+
+
+on_costs_synced(similar_location_index.invalidate)
+event.listen(Location, "after_insert", _mark_changed_location)
+event.listen(Location, "after_delete", _mark_changed_location)
+event.listen(Location, "after_update", _mark_updated_location)
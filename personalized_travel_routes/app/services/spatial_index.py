@@ -0,0 +1,348 @@
+import math
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+
+from database.models import Location
+
+EARTH_RADIUS_KM = 6371
+PENDING_REBUILD_THRESHOLD = 256
+TRACKED_ATTRIBUTES = ("latitude", "longitude", "city", "country")
+REFRESH_INTERVAL_SECONDS = 60.0
+
+
+def lat_lon_to_unit_xyz(latitudes, longitudes) -> np.ndarray:
+    """
+    Projects coordinates onto the unit sphere so that Euclidean (chord) distance
+    is monotonic in great-circle distance.
+
+    Args:
+        latitudes, longitudes: Scalars or arrays of coordinates in degrees.
+
+    Returns:
+        Array of shape (N, 3).
+    """
+    lat_rad = np.radians(np.atleast_1d(np.asarray(latitudes, dtype=np.float64)))
+    lon_rad = np.radians(np.atleast_1d(np.asarray(longitudes, dtype=np.float64)))
+    cos_lat = np.cos(lat_rad)
+    return np.column_stack((cos_lat * np.cos(lon_rad), cos_lat * np.sin(lon_rad), np.sin(lat_rad)))
+
+
+def km_to_chord(distance_km: float) -> float:
+    angle = min(distance_km / EARTH_RADIUS_KM, math.pi)
+    return 2.0 * math.sin(angle / 2.0)
+
+
+def chord_to_km(chord):
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2.0, 0.0, 1.0))
+
+
+class LocationSpatialIndex:
+    """
+    In-process spatial index over Location.latitude/longitude, plus each location's city and
+    country so a destination's points can be read without touching the database.
+
+    Points live in a cKDTree over unit-sphere coordinates. Locations added or moved after the
+    last build go to a small pending buffer that is searched by brute force; the tree rows of
+    moved or deleted locations are masked out. Both are merged into a fresh tree once they grow
+    past PENDING_REBUILD_THRESHOLD.
+
+    ORM writes mark locations dirty (see the listeners below) and the next sync applies them.
+    Rows inserted or deleted behind the ORM's back are caught by a (max id, row count)
+    fingerprint check, at most every REFRESH_INTERVAL_SECONDS.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._tree: Optional[cKDTree] = None
+        self._tree_ids = np.empty(0, dtype=np.int64)
+        self._tree_xyz = np.empty((0, 3), dtype=np.float64)
+        self._tree_live = np.empty(0, dtype=bool)
+        self._tree_row_by_id: Dict[int, int] = {}
+        self._num_dead_rows = 0
+        self._pending_ids: List[int] = []
+        self._pending_xyz: List[np.ndarray] = []
+        self._xyz_by_id: Dict[int, np.ndarray] = {}
+        self._lat_lon_by_id: Dict[int, Tuple[float, float]] = {}
+        self._destination_by_id: Dict[int, Tuple[Optional[str], Optional[str]]] = {}
+        self._ids_by_city: Dict[str, Set[int]] = defaultdict(set)
+        self._ids_by_country: Dict[str, Set[int]] = defaultdict(set)
+        self._dirty_ids: Set[int] = set()
+        self._fingerprint: Optional[Tuple[int, int]] = None
+        self._max_location_id = 0
+        self._last_refresh_ts = 0.0
+
+    def reset(self) -> None:
+        """Forgets every indexed location; the next sync_with_db() rebuilds from scratch."""
+        with self._lock:
+            self.build([], [], [])
+            self._dirty_ids = set()
+            self._fingerprint = None
+            self._last_refresh_ts = 0.0
+
+    def __len__(self) -> int:
+        return len(self._xyz_by_id)
+
+    def build(self, location_ids: Sequence[int], latitudes, longitudes,
+              cities: Optional[Sequence[Optional[str]]] = None,
+              countries: Optional[Sequence[Optional[str]]] = None) -> None:
+        xyz = lat_lon_to_unit_xyz(latitudes, longitudes) if len(location_ids) else np.empty((0, 3))
+        cities = cities if cities is not None else [None] * len(location_ids)
+        countries = countries if countries is not None else [None] * len(location_ids)
+        with self._lock:
+            self._tree_ids = np.asarray(location_ids, dtype=np.int64)
+            self._tree_xyz = xyz
+            self._tree = cKDTree(xyz) if len(xyz) else None
+            self._tree_live = np.ones(len(self._tree_ids), dtype=bool)
+            self._tree_row_by_id = {int(loc_id): row for row, loc_id in enumerate(self._tree_ids.tolist())}
+            self._num_dead_rows = 0
+            self._pending_ids = []
+            self._pending_xyz = []
+            self._xyz_by_id = {int(loc_id): xyz[i] for i, loc_id in enumerate(self._tree_ids)}
+            self._lat_lon_by_id = {}
+            self._destination_by_id = {}
+            self._ids_by_city = defaultdict(set)
+            self._ids_by_country = defaultdict(set)
+            for loc_id, lat, lon, city, country in zip(self._tree_ids.tolist(), latitudes, longitudes, cities, countries):
+                self._set_attributes(loc_id, lat, lon, city, country)
+            self._max_location_id = int(self._tree_ids.max()) if len(self._tree_ids) else 0
+
+    def _set_attributes(self, location_id: int, latitude: float, longitude: float,
+                        city: Optional[str], country: Optional[str]) -> None:
+        self._lat_lon_by_id[location_id] = (float(latitude), float(longitude))
+        self._destination_by_id[location_id] = (city, country)
+        if city is not None:
+            self._ids_by_city[city].add(location_id)
+        if country is not None:
+            self._ids_by_country[country].add(location_id)
+
+    def remove_location(self, location_id: int) -> None:
+        with self._lock:
+            if self._xyz_by_id.pop(location_id, None) is None:
+                return
+            self._lat_lon_by_id.pop(location_id, None)
+            city, country = self._destination_by_id.pop(location_id, (None, None))
+            self._ids_by_city.get(city, set()).discard(location_id)
+            self._ids_by_country.get(country, set()).discard(location_id)
+            row = self._tree_row_by_id.pop(location_id, None)
+            if row is not None:
+                self._tree_live[row] = False
+                self._num_dead_rows += 1
+            elif location_id in self._pending_ids:
+                position = self._pending_ids.index(location_id)
+                del self._pending_ids[position]
+                del self._pending_xyz[position]
+            if self._num_dead_rows + len(self._pending_ids) >= PENDING_REBUILD_THRESHOLD:
+                self._merge_pending()
+
+    def add_location(self, location_id: int, latitude: float, longitude: float,
+                     city: Optional[str] = None, country: Optional[str] = None) -> None:
+        """Indexes a location, or moves it when it is already indexed elsewhere."""
+        with self._lock:
+            self.remove_location(location_id)
+            if latitude is None or longitude is None:
+                return
+            xyz = lat_lon_to_unit_xyz(latitude, longitude)[0]
+            self._pending_ids.append(location_id)
+            self._pending_xyz.append(xyz)
+            self._xyz_by_id[location_id] = xyz
+            self._set_attributes(location_id, latitude, longitude, city, country)
+            self._max_location_id = max(self._max_location_id, location_id)
+            if self._num_dead_rows + len(self._pending_ids) >= PENDING_REBUILD_THRESHOLD:
+                self._merge_pending()
+
+    def _merge_pending(self) -> None:
+        if not self._pending_ids and not self._num_dead_rows:
+            return
+        live = self._tree_live
+        self._tree_ids = np.concatenate((self._tree_ids[live], np.asarray(self._pending_ids, dtype=np.int64)))
+        self._tree_xyz = np.vstack([self._tree_xyz[live]] + self._pending_xyz)
+        self._tree = cKDTree(self._tree_xyz) if len(self._tree_ids) else None
+        self._tree_live = np.ones(len(self._tree_ids), dtype=bool)
+        self._tree_row_by_id = {int(loc_id): row for row, loc_id in enumerate(self._tree_ids.tolist())}
+        self._num_dead_rows = 0
+        self._pending_ids = []
+        self._pending_xyz = []
+
+    def mark_dirty(self, location_id: Optional[int]) -> None:
+        if location_id is not None:
+            with self._lock:
+                self._dirty_ids.add(location_id)
+
+    def _load_rows(self, db_session: Session, where_clause=None):
+        query = db_session.query(Location.id, Location.latitude, Location.longitude, Location.city, Location.country)
+        if where_clause is not None:
+            query = query.filter(where_clause)
+        return query.all()
+
+    def refresh_from_db(self, db_session: Session, force: bool = False) -> None:
+        """
+        Re-reads the locations marked dirty and, every REFRESH_INTERVAL_SECONDS (or when forced),
+        picks up rows created since the last refresh (id > max known id); rebuilds when the row
+        count shows deletions it was not told about.
+        """
+        with self._lock:
+            dirty_ids, self._dirty_ids = self._dirty_ids, set()
+            if dirty_ids:
+                fresh_rows = {row[0]: row for row in self._load_rows(db_session, Location.id.in_(sorted(dirty_ids)))}
+                for location_id in dirty_ids:
+                    if location_id in fresh_rows:
+                        self.add_location(*fresh_rows[location_id])
+                    else:
+                        self.remove_location(location_id)
+
+            now = time.monotonic()
+            if not force and now - self._last_refresh_ts < REFRESH_INTERVAL_SECONDS:
+                return
+            self._last_refresh_ts = now
+            fingerprint = self._read_fingerprint(db_session)
+            if fingerprint == self._fingerprint:
+                return
+            new_rows = self._load_rows(db_session, Location.id > self._max_location_id)
+            for row in new_rows:
+                self.add_location(*row)
+            if fingerprint[1] != len(self):
+                self._build_from_db(db_session)
+                return
+            self._fingerprint = fingerprint
+        if new_rows:
+            print(f"Spatial index: added {len(new_rows)} new locations (total {len(self)}).")
+
+    def _read_fingerprint(self, db_session: Session) -> Tuple[int, int]:
+        """(max id, row count) of the locations that have coordinates, i.e. of what the index should hold."""
+        max_id, row_count = db_session.query(func.coalesce(func.max(Location.id), 0), func.count(Location.id)).filter(
+            Location.latitude.isnot(None), Location.longitude.isnot(None)
+        ).one()
+        return int(max_id), int(row_count)
+
+    def _build_from_db(self, db_session: Session) -> None:
+        rows = self._load_rows(db_session, Location.latitude.isnot(None) & Location.longitude.isnot(None))
+        self.build([r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows],
+                   [r[3] for r in rows], [r[4] for r in rows])
+        self._fingerprint = self._read_fingerprint(db_session)
+        self._last_refresh_ts = time.monotonic()
+        print(f"Spatial index built over {len(rows)} locations.")
+
+    def sync_with_db(self, db_session: Session) -> None:
+        with self._lock:
+            if self._fingerprint is None:
+                self._dirty_ids = set()
+                self._build_from_db(db_session)
+                return
+        self.refresh_from_db(db_session)
+
+    def coordinates_known(self, location_id: int) -> bool:
+        return location_id in self._xyz_by_id
+
+    def destination_points(self, cities: Iterable[str], countries: Iterable[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Ids (sorted) and coordinates of every indexed location whose city or country is one of
+        the given stored values, the in-memory twin of candidates.destination_filter.
+        """
+        with self._lock:
+            ids: Set[int] = set()
+            for city in cities:
+                ids |= self._ids_by_city.get(city, set())
+            for country in countries:
+                ids |= self._ids_by_country.get(country, set())
+            location_ids = np.array(sorted(ids), dtype=np.int64)
+            coordinates = np.array([self._lat_lon_by_id[i] for i in location_ids.tolist()], dtype=np.float64).reshape(-1, 2)
+        return location_ids, coordinates[:, 0], coordinates[:, 1]
+
+    def distances_km(self, latitude: float, longitude: float, location_ids: Sequence[int]) -> np.ndarray:
+        """Great-circle distance from the point to each of location_ids; NaN for ids that are not indexed."""
+        center = lat_lon_to_unit_xyz(latitude, longitude)[0]
+        with self._lock:
+            xyz = np.array([self._xyz_by_id.get(i, (np.nan, np.nan, np.nan)) for i in location_ids], dtype=np.float64)
+        if xyz.size == 0:
+            return np.empty(0, dtype=np.float64)
+        chords = np.linalg.norm(xyz - center, axis=1)
+        return np.where(np.isnan(chords), np.nan, chord_to_km(np.nan_to_num(chords)))
+
+    def query_radius(self, latitude: float, longitude: float, radius_km: float) -> np.ndarray:
+        """Returns ids of all indexed locations within radius_km of the point."""
+        center = lat_lon_to_unit_xyz(latitude, longitude)[0]
+        chord = km_to_chord(radius_km)
+        with self._lock:
+            found: List[np.ndarray] = []
+            if self._tree is not None:
+                rows = np.asarray(self._tree.query_ball_point(center, r=chord), dtype=np.int64)
+                found.append(self._tree_ids[rows[self._tree_live[rows]]])
+            if self._pending_ids:
+                pending_xyz = np.vstack(self._pending_xyz)
+                mask = np.linalg.norm(pending_xyz - center, axis=1) <= chord
+                found.append(np.asarray(self._pending_ids, dtype=np.int64)[mask])
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(found)
+
+    def query_nearest(self, latitude: float, longitude: float, k: int) -> List[Tuple[int, float]]:
+        """Returns up to k (location_id, distance_km) pairs closest to the point, nearest first."""
+        center = lat_lon_to_unit_xyz(latitude, longitude)[0]
+        return self._query_nearest_xyz(center, k)
+
+    def query_knn(self, location_id: int, k: int) -> List[Tuple[int, float]]:
+        """Returns up to k (location_id, distance_km) pairs nearest to an indexed location, excluding itself."""
+        with self._lock:
+            center = self._xyz_by_id.get(location_id)
+        if center is None:
+            return []
+        neighbours = self._query_nearest_xyz(center, k + 1)
+        return [(loc_id, dist) for loc_id, dist in neighbours if loc_id != location_id][:k]
+
+    def _query_nearest_xyz(self, center: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        if k <= 0:
+            return []
+        with self._lock:
+            candidate_ids: List[np.ndarray] = []
+            candidate_chords: List[np.ndarray] = []
+            if self._tree is not None:
+                # Masked-out rows may come back among the nearest, so ask for enough to skip them.
+                k_tree = min(k + self._num_dead_rows, len(self._tree_ids))
+                chords, rows = self._tree.query(center, k=k_tree)
+                chords = np.atleast_1d(chords)
+                rows = np.atleast_1d(rows)
+                is_live = self._tree_live[rows]
+                candidate_ids.append(self._tree_ids[rows[is_live]])
+                candidate_chords.append(chords[is_live])
+            if self._pending_ids:
+                pending_xyz = np.vstack(self._pending_xyz)
+                candidate_ids.append(np.asarray(self._pending_ids, dtype=np.int64))
+                candidate_chords.append(np.linalg.norm(pending_xyz - center, axis=1))
+        if not candidate_ids:
+            return []
+        ids = np.concatenate(candidate_ids)
+        chords = np.concatenate(candidate_chords)
+        order = np.argsort(chords, kind="stable")[:k]
+        distances_km = chord_to_km(chords[order])
+        return [(int(ids[i]), float(d)) for i, d in zip(order, distances_km)]
+
+
+location_spatial_index = LocationSpatialIndex()
+
+
+def get_location_spatial_index(db_session: Session) -> LocationSpatialIndex:
+    """Returns the process-wide index, building it on first use and applying location changes afterwards."""
+    location_spatial_index.sync_with_db(db_session)
+    return location_spatial_index
+
+
+def _mark_changed_location(mapper, connection, target: Location) -> None:
+    location_spatial_index.mark_dirty(target.id)
+
+
+def _mark_updated_location(mapper, connection, target: Location) -> None:
+    attrs = inspect(target).attrs
+    if any(getattr(attrs, name).history.has_changes() for name in TRACKED_ATTRIBUTES):
+        location_spatial_index.mark_dirty(target.id)
+
+
+event.listen(Location, "after_insert", _mark_changed_location)
+event.listen(Location, "after_delete", _mark_changed_location)
+event.listen(Location, "after_update", _mark_updated_location)
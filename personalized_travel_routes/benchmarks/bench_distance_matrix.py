@@ -0,0 +1,61 @@
+import time
+
+import numpy as np
+
+from app.services.distance import (
+    calculate_distance,
+    calculate_distance_matrix,
+    condensed_to_square,
+)
+
+SIZES = [100, 500, 1000, 3000]
+SCALAR_MAX_SIZE = 1000
+CITY_CENTER = (55.7558, 37.6173)
+CITY_SPREAD_DEG = 0.15
+
+
+def _random_points(num_points: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    latitudes = CITY_CENTER[0] + rng.normal(0.0, CITY_SPREAD_DEG, num_points)
+    longitudes = CITY_CENTER[1] + rng.normal(0.0, CITY_SPREAD_DEG, num_points)
+    return latitudes, longitudes
+
+
+def _scalar_matrix(latitudes, longitudes) -> np.ndarray:
+    num_points = len(latitudes)
+    matrix = np.zeros((num_points, num_points))
+    for i in range(num_points):
+        for j in range(num_points):
+            if i != j:
+                matrix[i, j] = calculate_distance(latitudes[i], longitudes[i], latitudes[j], longitudes[j])
+    return matrix
+
+
+def _timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def main():
+    print(f"{'N':>6} {'scalar, s':>12} {'float64, s':>12} {'float32, s':>12} {'triu, s':>12} {'max err, km':>12}")
+    for num_points in SIZES:
+        latitudes, longitudes = _random_points(num_points)
+
+        full, full_time = _timed(calculate_distance_matrix, latitudes, longitudes)
+        full32, full32_time = _timed(calculate_distance_matrix, latitudes, longitudes, dtype=np.float32)
+        condensed, condensed_time = _timed(calculate_distance_matrix, latitudes, longitudes, upper_triangle=True)
+        assert np.allclose(condensed_to_square(condensed, num_points), full)
+
+        scalar_time_str = "skipped"
+        max_error = float(np.max(np.abs(full32 - full)))
+        if num_points <= SCALAR_MAX_SIZE:
+            scalar, scalar_time = _timed(_scalar_matrix, latitudes.tolist(), longitudes.tolist())
+            max_error = max(max_error, float(np.max(np.abs(scalar - full))))
+            scalar_time_str = f"{scalar_time:.4f}"
+
+        print(f"{num_points:>6} {scalar_time_str:>12} {full_time:>12.4f} {full32_time:>12.4f} {condensed_time:>12.4f} {max_error:>12.2e}")
+
+
+if __name__ == "__main__":
+    main()
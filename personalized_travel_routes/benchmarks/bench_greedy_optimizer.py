@@ -0,0 +1,145 @@
+import contextlib
+import io
+import math
+import time
+from datetime import date
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.routing.optimizer import (
+    optimize_route_greedy,
+    MAX_DAILY_TRAVEL_TIME_HOURS,
+    ESTIMATED_DAILY_VISIT_TIME_HOURS,
+)
+from app.services.distance import calculate_distance_matrix, estimate_travel_time_matrix
+
+SIZES = [100, 1000, 10000]
+TRIP_DAYS = [3, 14]
+EQUIVALENCE_SEEDS = range(20)
+TRAVEL_SPEED_KM_H = 5.0
+START_DATE = date(2025, 7, 1)
+
+
+def legacy_optimize_route_greedy(
+    candidate_pois_data: List[Dict[str, Any]],
+    travel_time_matrix_hours: np.ndarray,
+    trip_duration_days: int,
+    budget_rub: Optional[float],
+    start_date: date,
+) -> Dict[int, List[int]]:
+    """The list-comprehension greedy this module replaced; kept as the equivalence reference."""
+    num_candidates = len(candidate_pois_data)
+    if num_candidates == 0:
+        return {}
+
+    visited_poi_indices = set()
+    route_by_day: Dict[int, List[int]] = {}
+    remaining_budget_rub = budget_rub if budget_rub is not None else math.inf
+
+    poi_scores = [p['score'] for p in candidate_pois_data]
+    poi_costs_rub = [p['cost_rub'] for p in candidate_pois_data]
+    poi_visit_durations = [p['visit_duration_hours'] for p in candidate_pois_data]
+
+    for day_num in range(1, trip_duration_days + 1):
+        route_by_day[day_num] = []
+        current_poi_index = None
+        current_day_visit_time_hours = 0.0
+        current_day_travel_time_hours = 0.0
+
+        while len(visited_poi_indices) < num_candidates:
+            best_next_poi_index = -1
+            best_score = -math.inf
+            available_poi_indices = [i for i in range(num_candidates) if i not in visited_poi_indices]
+            if not available_poi_indices:
+                break
+
+            for next_poi_index in available_poi_indices:
+                loc_cost = poi_costs_rub[next_poi_index]
+                visit_duration = poi_visit_durations[next_poi_index]
+                if remaining_budget_rub is not None and loc_cost > remaining_budget_rub:
+                    continue
+                if current_poi_index != None:
+                    travel_time_from_current = travel_time_matrix_hours[current_poi_index, next_poi_index]
+                    if (current_day_visit_time_hours + visit_duration > ESTIMATED_DAILY_VISIT_TIME_HOURS) or \
+                       (current_day_travel_time_hours + travel_time_from_current > MAX_DAILY_TRAVEL_TIME_HOURS):
+                        continue
+                current_score = poi_scores[next_poi_index]
+                if current_score > best_score:
+                    best_score = current_score
+                    best_next_poi_index = next_poi_index
+
+            if best_next_poi_index != -1:
+                route_by_day[day_num].append(best_next_poi_index)
+                visited_poi_indices.add(best_next_poi_index)
+                remaining_budget_rub -= poi_costs_rub[best_next_poi_index]
+                current_day_visit_time_hours += poi_visit_durations[best_next_poi_index]
+                if current_poi_index != None:
+                    current_day_travel_time_hours += travel_time_matrix_hours[current_poi_index, best_next_poi_index]
+                current_poi_index = best_next_poi_index
+            else:
+                break
+
+    if sum(len(day_indices) for day_indices in route_by_day.values()) == 0:
+        return {}
+    return route_by_day
+
+
+def synthetic_candidates(num_candidates: int, seed: int):
+    rng = np.random.default_rng(seed)
+    latitudes = 55.75 + rng.normal(0.0, 0.05, num_candidates)
+    longitudes = 37.62 + rng.normal(0.0, 0.08, num_candidates)
+    # Coarse scores produce plenty of ties, which is where argmax/strict-> semantics could diverge.
+    scores = np.round(rng.uniform(0.0, 1.7, num_candidates), 1)
+    costs = np.where(rng.random(num_candidates) < 0.4, 0.0, np.round(rng.lognormal(6.5, 0.8, num_candidates), -1))
+    durations = rng.choice([0.5, 1.0, 1.5, 2.0, 2.5, 3.0], num_candidates)
+    candidates = [
+        {
+            "location": SimpleNamespace(id=i + 1, name=f"POI {i + 1}"),
+            "score": float(scores[i]),
+            "cost_rub": float(costs[i]),
+            "visit_duration_hours": float(durations[i]),
+            "opening_hours_bitmap": None,
+        }
+        for i in range(num_candidates)
+    ]
+    travel_times = estimate_travel_time_matrix(calculate_distance_matrix(latitudes, longitudes), TRAVEL_SPEED_KM_H)
+    return candidates, travel_times
+
+
+def _run_quietly(func, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        return result, time.perf_counter() - started
+
+
+def check_equivalence():
+    checked = 0
+    for seed in EQUIVALENCE_SEEDS:
+        for num_candidates in (1, 5, 40, 300):
+            candidates, travel_times = synthetic_candidates(num_candidates, seed)
+            for days in (1, 3, 10):
+                for budget in (None, 0.0, 2000.0, 15000.0):
+                    expected, _ = _run_quietly(legacy_optimize_route_greedy, candidates, travel_times, days, budget, START_DATE)
+                    actual, _ = _run_quietly(optimize_route_greedy, candidates, travel_times, days, budget, START_DATE)
+                    assert actual == expected, f"Mismatch: seed={seed} n={num_candidates} days={days} budget={budget}"
+                    checked += 1
+    print(f"Equivalence: {checked} cases identical to the legacy greedy.")
+
+
+def main():
+    check_equivalence()
+    print(f"{'N':>6} {'days':>5} {'legacy, s':>12} {'masked, s':>12} {'speedup':>8}")
+    for num_candidates in SIZES:
+        candidates, travel_times = synthetic_candidates(num_candidates, seed=0)
+        for days in TRIP_DAYS:
+            expected, legacy_time = _run_quietly(legacy_optimize_route_greedy, candidates, travel_times, days, None, START_DATE)
+            actual, masked_time = _run_quietly(optimize_route_greedy, candidates, travel_times, days, None, START_DATE)
+            assert actual == expected
+            print(f"{num_candidates:>6} {days:>5} {legacy_time:>12.4f} {masked_time:>12.4f} {legacy_time / masked_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
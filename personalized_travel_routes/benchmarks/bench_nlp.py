@@ -0,0 +1,70 @@
+import argparse
+import contextlib
+import csv
+import io
+import os
+import resource
+import time
+
+import numpy as np
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "app", "data", "interest_training_data.csv")
+DEFAULT_NUM_TEXTS = 200
+
+
+def _rss_mb() -> float:
+    """Peak resident set size of this process (ru_maxrss is in KiB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def load_sample_texts(num_texts: int):
+    with open(DATA_PATH, encoding="utf-8-sig") as f:
+        texts = [row[0] for row in csv.reader(f) if row]
+    return (texts * (num_texts // max(len(texts), 1) + 1))[:num_texts]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-worker memory and per-request latency of app.nlp.processor.")
+    parser.add_argument("--texts", type=int, default=DEFAULT_NUM_TEXTS)
+    args = parser.parse_args()
+
+    rss_before = _rss_mb()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app.nlp import models, processor
+        for model in models.ALL_MODELS:
+            model.get()
+    import_seconds = time.perf_counter() - started
+    rss_after = _rss_mb()
+
+    # Distinct texts, so the extraction cache does not hide the model cost.
+    texts = [f"{text} #{i}" for i, text in enumerate(load_sample_texts(args.texts))]
+    latencies_ms = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for text in texts:
+            started = time.perf_counter()
+            processor.extract_travel_info(text)
+            latencies_ms.append((time.perf_counter() - started) * 1000.0)
+    p50, p90, p99 = np.percentile(latencies_ms, [50, 90, 99])
+    cache_hit_us = []
+    for text in texts:
+        started = time.perf_counter()
+        processor.extract_travel_info(text)
+        cache_hit_us.append((time.perf_counter() - started) * 1e6)
+    processor.extraction_cache.clear()
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        processor.extract_travel_info_batch([f"{text} batch" for text in texts])
+        batch_seconds = time.perf_counter() - started
+
+    for name, model_status in models.readiness()["models"].items():
+        print(f"{name}: {model_status['state']} ({model_status['load_seconds']} s)")
+    print(f"import + model load: {import_seconds:.2f} s, peak RSS {rss_before:.0f} MB -> {rss_after:.0f} MB (+{rss_after - rss_before:.0f} MB)")
+    print(f"extract_travel_info over {len(texts)} texts: p50 {p50:.2f} ms, p90 {p90:.2f} ms, p99 {p99:.2f} ms")
+    print(f"extract_travel_info cache hits: p50 {np.percentile(cache_hit_us, 50):.1f} us, p99 {np.percentile(cache_hit_us, 99):.1f} us")
+    print(f"extract_travel_info_batch over {len(texts)} texts: {batch_seconds * 1000.0:.1f} ms "
+          f"({len(texts) / batch_seconds:.0f} texts/s vs {len(texts) / (sum(latencies_ms) / 1000.0):.0f} texts/s one by one)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import argparse
+import contextlib
+import io
+import json
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import schemas
+from app.nlp.processor import INTEREST_KEYWORDS_FALLBACK
+from app.routing.candidates import (
+    backfill_compiled_opening_hours,
+    destination_filter,
+    fetch_location_types,
+    fetch_ranked_candidates,
+    interest_scores_by_type,
+)
+from app.routing.generator import (
+    DEFAULT_TRAVEL_SPEED_KM_H,
+    format_route_text_with_days_times,
+    generate_route,
+)
+from app.routing.local_search import improve_route_local_search, route_travel_hours
+from app.routing.matrix_cache import travel_matrix_cache
+from app.routing.optimizer import OPTIMIZER_STRATEGIES
+from app.services.distance import calculate_distance_matrix, estimate_travel_time_matrix
+from app.routing.schedule import default_visit_duration_hours
+from app.services.opening_hours import unpack_opening_hours
+from app.services.spatial_index import location_spatial_index
+from benchmarks.synthetic import SYNTHETIC_CITY, generate_synthetic_locations
+from database.models import Base, Location
+
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+DEFAULT_TRIP_DAYS = [3, 7, 14]
+DEFAULT_REPEATS = 5
+DEFAULT_E2E_MAX_SIZE = 10000
+BENCH_INTERESTS = ["музей", "история", "еда"]
+BENCH_START_DATE = date(2025, 7, 7)
+ALL_STAGES = ["scoring", "travel_matrix", "optimize", "local_search", "format_text", "generate_route"]
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(func: Callable[[], Any], repeats: int) -> Dict[str, Any]:
+    """Runs func `repeats` times for latency and once more under tracemalloc for peak memory."""
+    latencies_ms = []
+    result = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeats):
+            started = time.perf_counter()
+            result = func()
+            latencies_ms.append((time.perf_counter() - started) * 1000.0)
+        tracemalloc.start()
+        func()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    p50, p90, p99 = np.percentile(latencies_ms, [50, 90, 99])
+    return {
+        "result": result,
+        "latency_ms": {"p50": round(p50, 3), "p90": round(p90, 3), "p99": round(p99, 3), "max": round(max(latencies_ms), 3)},
+        "peak_memory_kb": round(peak_bytes / 1024, 1),
+    }
+
+
+def build_candidates(session, top_n: int) -> List[Dict[str, Any]]:
+    """The generator's candidate stage: scoring and top-N in SQL, then the opening-hours bitmaps."""
+    where = destination_filter({SYNTHETIC_CITY}, set())
+    rows = fetch_ranked_candidates(
+        session,
+        where,
+        interest_scores_by_type(fetch_location_types(session, where), BENCH_INTERESTS, INTEREST_KEYWORDS_FALLBACK),
+        limit=top_n,
+    )
+    packed_hours_by_id = backfill_compiled_opening_hours(session, rows)
+    return [
+        {
+            "location": row,
+            "score": float(row.score),
+            "visit_duration_hours": default_visit_duration_hours(row.type),
+            "cost_rub": float(row.cost_rub),
+            "opening_hours_bitmap": unpack_opening_hours(packed_hours_by_id[row.id]),
+        }
+        for row in rows
+    ]
+
+
+def route_quality(plan: Dict[int, List[int]], candidates, travel_time_matrix_hours) -> Dict[str, Any]:
+    visited = [i for day in plan.values() for i in day]
+    return {
+        "pois": len(visited),
+        "score_collected": round(sum(candidates[i]["score"] for i in visited), 4),
+        "travel_hours": round(route_travel_hours(plan, travel_time_matrix_hours), 4),
+    }
+
+
+def _route_details(plan, candidates) -> List[schemas.RouteLocationDetail]:
+    details = []
+    for day_num in sorted(plan):
+        for idx in plan[day_num]:
+            loc = candidates[idx]["location"]
+            details.append(schemas.RouteLocationDetail(
+                map_id=0, location_id=loc.id, location_name=loc.name, location_description=loc.description,
+                location_type=loc.type, visit_order=len(details), latitude=loc.latitude, longitude=loc.longitude,
+                visit_duration_hours=candidates[idx]["visit_duration_hours"],
+            ))
+    return details
+
+
+def _make_sqlite_session(locations):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([Location(**{c: getattr(loc, c) for c in (
+        "id", "name", "latitude", "longitude", "city", "country", "rating", "type",
+        "description", "cost", "cost_currency", "opening_hours")}) for loc in locations])
+    session.commit()
+    return session
+
+
+def run(sizes: List[int], trip_days: List[int], repeats: int, stages: List[str], e2e_max_size: int) -> Dict[str, Any]:
+    results = []
+    for size in sizes:
+        locations = generate_synthetic_locations(size, seed=size)
+        session = _make_sqlite_session(locations)
+        for days in trip_days:
+            top_n = max(days * 4 * 2, 10)
+            row: Dict[str, Any] = {"size": size, "trip_days": days, "stages": {}}
+            print(f"size={size} days={days}")
+
+            scoring = measure(lambda: build_candidates(session, top_n), repeats)
+            candidates = scoring.pop("result")
+            if "scoring" in stages:
+                row["stages"]["scoring"] = scoring
+
+            lats = np.array([c["location"].latitude for c in candidates])
+            lons = np.array([c["location"].longitude for c in candidates])
+            matrix = measure(
+                lambda: estimate_travel_time_matrix(calculate_distance_matrix(lats, lons), DEFAULT_TRAVEL_SPEED_KM_H), repeats
+            )
+            travel_time_matrix_hours = matrix.pop("result")
+            if "travel_matrix" in stages:
+                row["stages"]["travel_matrix"] = matrix
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                greedy_plan = OPTIMIZER_STRATEGIES["greedy"](candidates, travel_time_matrix_hours, days, None, BENCH_START_DATE)
+            if "optimize" in stages:
+                for name, optimizer_func in OPTIMIZER_STRATEGIES.items():
+                    stage = measure(
+                        lambda: optimizer_func(candidates, travel_time_matrix_hours, days, None, BENCH_START_DATE), repeats
+                    )
+                    stage["quality"] = route_quality(stage.pop("result") or {}, candidates, travel_time_matrix_hours)
+                    row["stages"][f"optimize_{name}"] = stage
+
+            if "local_search" in stages and greedy_plan:
+                durations = np.array([c["visit_duration_hours"] for c in candidates])
+                stage = measure(lambda: improve_route_local_search(greedy_plan, travel_time_matrix_hours, durations), repeats)
+                improved_plan, saved = stage.pop("result")
+                stage["quality"] = route_quality(improved_plan, candidates, travel_time_matrix_hours)
+                stage["quality"]["travel_hours_saved"] = round(saved, 4)
+                row["stages"]["local_search"] = stage
+
+            if "format_text" in stages and greedy_plan:
+                details = _route_details(greedy_plan, candidates)
+                stage = measure(lambda: format_route_text_with_days_times(
+                    destination_names=[SYNTHETIC_CITY], start_date_obj=BENCH_START_DATE, trip_duration_days_total=days,
+                    pois_on_route=details, total_estimated_cost_user_currency=0.0, budget_currency_str="RUB",
+                ), repeats)
+                stage.pop("result")
+                row["stages"]["format_text"] = stage
+
+            if "generate_route" in stages and size <= e2e_max_size:
+                location_spatial_index.reset()
+                stage = measure(lambda: generate_route(
+                    destinations=[SYNTHETIC_CITY], start_date=BENCH_START_DATE,
+                    end_date=BENCH_START_DATE + timedelta(days=days - 1), budget=None, budget_currency=None,
+                    interests=BENCH_INTERESTS, travel_style=None, user_id=1, query_id=1, db_session=session,
+                ), repeats)
+                stage["status_code"] = stage.pop("result")[0]
+                row["stages"]["generate_route"] = stage
+
+            results.append(row)
+        session.close()
+
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "repeats": repeats,
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Routing pipeline benchmark on synthetic cities.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--days", type=int, nargs="+", default=DEFAULT_TRIP_DAYS)
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--stages", nargs="+", choices=ALL_STAGES, default=ALL_STAGES)
+    parser.add_argument("--e2e-max-size", type=int, default=DEFAULT_E2E_MAX_SIZE,
+                        help="Largest POI set for the end-to-end generate_route stage.")
+    parser.add_argument("--output", default="bench_routing.json")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as matrix_cache_dir:
+        travel_matrix_cache.cache_dir = matrix_cache_dir
+        report = run(args.sizes, args.days, args.repeats, args.stages, args.e2e_max_size)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from database.models import Location
+
+
+SYNTHETIC_CITY = "синтетикград"
+SYNTHETIC_COUNTRY = "Синтетика"
+DEFAULT_CITY_CENTER = (55.7558, 37.6173)
+
+# Rough shares of POI types in a large European city.
+TYPE_WEIGHTS = {
+    "достопримечательность": 0.18, "музей": 0.12, "парк": 0.08, "ресторан": 0.14, "кафе": 0.14,
+    "архитектура": 0.08, "религия": 0.05, "шопинг": 0.06, "искусство": 0.04, "ночная жизнь": 0.04,
+    "музыка": 0.03, "история": 0.04,
+}
+CURRENCY_WEIGHTS = {"RUB": 0.8, "EUR": 0.12, "USD": 0.08}
+CURRENCY_SCALE = {"RUB": 1.0, "EUR": 0.01, "USD": 0.011}
+
+WEEKDAY_RANGES = ["Ежедневно", "Пн-Пт", "Вт-Вс", "Ср-Вс"]
+OPENING_HOURS_WEIGHTS = {"always": 0.25, "daily": 0.35, "ranged": 0.25, "unknown": 0.15}
+
+
+def _opening_hours(rng: np.random.Generator, kind: str) -> Optional[str]:
+    if kind == "always":
+        return "Круглосуточно"
+    if kind == "unknown":
+        return None if rng.random() < 0.5 else "Расписание уточняйте"
+    open_hour = int(rng.integers(8, 12))
+    close_hour = int(rng.integers(17, 24))
+    days = "Ежедневно" if kind == "daily" else str(rng.choice(WEEKDAY_RANGES[1:]))
+    return f"{days} {open_hour}:00-{close_hour}:00"
+
+
+def _pick(rng: np.random.Generator, weights: dict, size: int) -> np.ndarray:
+    keys = list(weights.keys())
+    probs = np.array(list(weights.values()), dtype=np.float64)
+    return np.array(keys, dtype=object)[rng.choice(len(keys), size=size, p=probs / probs.sum())]
+
+
+def generate_synthetic_coordinates(
+    num_pois: int,
+    seed: int = 0,
+    city_center: Tuple[float, float] = DEFAULT_CITY_CENTER,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Dense historic centre, a few district hotspots and a sparse periphery — closer to real
+    POI layouts than a single Gaussian.
+    """
+    rng = np.random.default_rng(seed)
+    num_hotspots = max(3, num_pois // 2000)
+    hotspot_centers = np.column_stack((
+        city_center[0] + rng.normal(0.0, 0.06, num_hotspots),
+        city_center[1] + rng.normal(0.0, 0.10, num_hotspots),
+    ))
+    group = rng.choice(3, size=num_pois, p=[0.35, 0.45, 0.20])
+
+    latitudes = np.empty(num_pois)
+    longitudes = np.empty(num_pois)
+    center_mask, hotspot_mask, periphery_mask = group == 0, group == 1, group == 2
+
+    latitudes[center_mask] = city_center[0] + rng.normal(0.0, 0.012, center_mask.sum())
+    longitudes[center_mask] = city_center[1] + rng.normal(0.0, 0.02, center_mask.sum())
+    chosen = hotspot_centers[rng.integers(num_hotspots, size=hotspot_mask.sum())]
+    latitudes[hotspot_mask] = chosen[:, 0] + rng.normal(0.0, 0.008, hotspot_mask.sum())
+    longitudes[hotspot_mask] = chosen[:, 1] + rng.normal(0.0, 0.014, hotspot_mask.sum())
+    latitudes[periphery_mask] = city_center[0] + rng.normal(0.0, 0.12, periphery_mask.sum())
+    longitudes[periphery_mask] = city_center[1] + rng.normal(0.0, 0.2, periphery_mask.sum())
+    return latitudes, longitudes
+
+
+def generate_synthetic_locations(
+    num_pois: int,
+    seed: int = 0,
+    city_center: Tuple[float, float] = DEFAULT_CITY_CENTER,
+) -> List[Location]:
+    """Builds transient (not yet persisted) Location rows with ids 1..num_pois."""
+    rng = np.random.default_rng(seed)
+    latitudes, longitudes = generate_synthetic_coordinates(num_pois, seed, city_center)
+    types = _pick(rng, TYPE_WEIGHTS, num_pois)
+    currencies = _pick(rng, CURRENCY_WEIGHTS, num_pois)
+    hours_kinds = _pick(rng, OPENING_HOURS_WEIGHTS, num_pois)
+    is_free = rng.random(num_pois) < 0.35
+    costs_rub = np.round(rng.lognormal(6.5, 0.9, num_pois), -1)
+    ratings = np.clip(rng.normal(4.2, 0.5, num_pois), 1.0, 5.0)
+    has_rating = rng.random(num_pois) < 0.85
+
+    locations = []
+    for i in range(num_pois):
+        currency = str(currencies[i])
+        locations.append(Location(
+            id=i + 1,
+            name=f"{types[i].capitalize()} №{i + 1}",
+            latitude=float(latitudes[i]),
+            longitude=float(longitudes[i]),
+            city=SYNTHETIC_CITY,
+            country=SYNTHETIC_COUNTRY,
+            rating=round(float(ratings[i]), 1) if has_rating[i] else None,
+            type=str(types[i]),
+            description=f"Синтетическое место типа «{types[i]}».",
+            cost=0.0 if is_free[i] else round(float(costs_rub[i]) * CURRENCY_SCALE[currency], 2),
+            cost_currency=currency,
+            opening_hours=_opening_hours(rng, str(hours_kinds[i])),
+        ))
+    return locations
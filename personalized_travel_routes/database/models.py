@@ -10,7 +10,8 @@ from sqlalchemy import (
     ForeignKey,
     CheckConstraint, 
     UniqueConstraint,
-    Boolean
+    Boolean,
+    LargeBinary
 )
 from sqlalchemy.orm import declarative_base, relationship, Session 
 from sqlalchemy.sql import func 
@@ -49,7 +50,9 @@ class Location(Base):
     description = Column(Text)
     cost = Column(Float)
     cost_currency = Column(String)
+    cost_rub = Column(Float) # cost converted to RUB, see app/services/currency.py
     opening_hours = Column(String) 
+    opening_hours_compiled = Column(LargeBinary) # weekly 15-min bitmap, see app/services/opening_hours.py
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     activities = relationship("Activity", back_populates="location")
     reviews = relationship("Review", back_populates="location")
@@ -72,6 +75,7 @@ class Activity(Base):
     description = Column(Text)
     cost = Column(Float)
     cost_currency = Column(String) 
+    cost_rub = Column(Float) # cost converted to RUB, see app/services/currency.py
     activity_type = Column(String) 
     schedule = Column(String) 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -93,6 +97,7 @@ class Route(Base):
     total_cost_currency = Column(String)
     duration_days = Column(Integer)
     is_finalized = Column(Boolean, default=False, nullable=False) # <--- ВОТ ОНО
+    version = Column(Integer, default=1, server_default='1', nullable=False) # bumped on every edit, keys the rendered-route cache
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     user = relationship("User", back_populates="routes")
     query = relationship("Query")
@@ -4,6 +4,8 @@ from database.models import Base, Location, Activity, User, Route, RouteLocation
 from datetime import date, timedelta, datetime
 import bcrypt
 
+import app.services.currency  # registers the listeners that fill cost_rub on insert
+
 Base.metadata.create_all(bind=engine)
 
 db: Session = SessionLocal()
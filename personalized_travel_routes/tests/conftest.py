@@ -0,0 +1,92 @@
+import os
+from datetime import date
+
+# Set before any app module is imported: database.db builds its engine at import time, and the
+# travel-matrix cache would otherwise write .npy files into the repository.
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("TRAVEL_MATRIX_CACHE_DIR", "")
+os.environ.setdefault("NLP_MODEL_LOADING", "lazy")
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database.models import Base, Location, Query, User
+from benchmarks.synthetic import SYNTHETIC_CITY, generate_synthetic_locations
+
+NUM_SYNTHETIC_LOCATIONS = 200
+LOCATION_COLUMNS = (
+    "id", "name", "latitude", "longitude", "city", "country", "rating", "type",
+    "description", "cost", "cost_currency", "opening_hours",
+)
+
+
+def reset_process_caches() -> None:
+    """Process-wide indexes and caches must not leak rows of one test database into the next."""
+    from app.services.spatial_index import location_spatial_index
+    from app.services.similar_locations import similar_location_index
+    from app.routing.matrix_cache import travel_matrix_cache
+    from app.services.route_cache import rendered_route_cache
+    from app.services.gazetteer import destination_gazetteer
+
+    location_spatial_index.reset()
+    similar_location_index.reset()
+    travel_matrix_cache.invalidate_city()
+    rendered_route_cache._entries.clear()
+    destination_gazetteer.reset()
+
+
+@pytest.fixture
+def db_session():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    reset_process_caches()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+@pytest.fixture
+def seeded_session(db_session):
+    """A user (id 1), a query (id 1) and NUM_SYNTHETIC_LOCATIONS locations in SYNTHETIC_CITY."""
+    import app.services.currency  # registers the listeners that fill cost_rub on insert
+    db_session.add(User(id=1, email="user@example.com", password_hash="x"))
+    db_session.add_all([
+        Location(**{column: getattr(location, column) for column in LOCATION_COLUMNS})
+        for location in generate_synthetic_locations(NUM_SYNTHETIC_LOCATIONS, seed=3)
+    ])
+    db_session.add(Query(id=1, user_id=1, query_text=SYNTHETIC_CITY, parameters={"destination": [SYNTHETIC_CITY]}))
+    db_session.commit()
+    return db_session
+
+
+@pytest.fixture
+def client(seeded_session):
+    """TestClient bound to seeded_session, acting as user 1; the app's lifespan (model loading) is not run."""
+    from fastapi.testclient import TestClient
+    from database.db import get_db
+    from app.main import app
+
+    app.dependency_overrides[get_db] = lambda: seeded_session
+    try:
+        yield TestClient(app, headers={"X-User-ID": "1"})
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+
+
+@pytest.fixture
+def generated_route(seeded_session):
+    """A 3-day route over the synthetic city, generated and committed for user 1 / query 1."""
+    from app.routing.generator import generate_route
+
+    status_code, _, _, route = generate_route(
+        destinations=[SYNTHETIC_CITY], start_date=date(2025, 7, 7), end_date=date(2025, 7, 9),
+        budget=None, budget_currency=None, interests=["музей"], travel_style=None,
+        user_id=1, query_id=1, db_session=seeded_session,
+    )
+    assert status_code == 200
+    return route
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from database.models import Location
+from app.nlp.processor import INTEREST_KEYWORDS_FALLBACK
+from app.routing.candidates import destination_filter, fetch_location_types, fetch_ranked_candidates, interest_scores_by_type
+from app.routing.scoring import (
+    COST_WEIGHT, DEFAULT_RATING, INTEREST_WEIGHT, MAX_RATING, RATING_WEIGHT, build_interest_match_matrix,
+)
+from benchmarks.synthetic import SYNTHETIC_CITY
+
+
+def _reference_scores(locations, interests):
+    """The candidate score computed row by row in numpy."""
+    match_matrix = build_interest_match_matrix([loc.type for loc in locations], interests, INTEREST_KEYWORDS_FALLBACK)
+    interest_score = match_matrix.mean(axis=1) if interests else np.zeros(len(locations))
+    rating_score = np.array([DEFAULT_RATING if loc.rating is None else loc.rating for loc in locations]) / MAX_RATING
+    costs_rub = np.array([loc.cost_rub or 0.0 for loc in locations])
+    cost_score = 1.0 - costs_rub / costs_rub.max() if costs_rub.max() > 0 else np.ones(len(locations))
+    return INTEREST_WEIGHT * interest_score + RATING_WEIGHT * rating_score + COST_WEIGHT * cost_score
+
+
+@pytest.mark.parametrize("interests", [[], ["музей"], ["парк", "еда", "история"]])
+@pytest.mark.parametrize("limit", [1, 25, 500])
+def test_sql_ranking_matches_numpy_scoring(seeded_session, interests, limit):
+    where = destination_filter({SYNTHETIC_CITY}, set())
+    rows = fetch_ranked_candidates(
+        seeded_session,
+        where,
+        interest_scores_by_type(fetch_location_types(seeded_session, where), interests, INTEREST_KEYWORDS_FALLBACK),
+        limit=limit,
+    )
+
+    locations = seeded_session.query(Location).order_by(Location.id).all()
+    scores = _reference_scores(locations, interests)
+    # Best score first, ties by id: the order fetch_ranked_candidates defines.
+    expected = np.lexsort((np.arange(len(locations)), -scores))[:limit]
+
+    assert [row.id for row in rows] == [locations[i].id for i in expected]
+    assert [row.score for row in rows] == pytest.approx(scores[expected].tolist())
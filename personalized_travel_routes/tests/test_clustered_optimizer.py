@@ -0,0 +1,71 @@
+import contextlib
+import io
+from datetime import date
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.routing import generator
+from app.routing.optimizer import optimize_route_clustered
+from app.services.distance import calculate_distance_matrix, estimate_travel_time_matrix
+
+START_DATE = date(2025, 7, 1)
+
+
+def _candidates(costs, seed=0):
+    rng = np.random.default_rng(seed)
+    latitudes = 55.75 + rng.normal(0.0, 0.05, len(costs))
+    longitudes = 37.62 + rng.normal(0.0, 0.08, len(costs))
+    candidates = [
+        {
+            "location": SimpleNamespace(id=i + 1, name=f"POI {i + 1}", latitude=float(latitudes[i]), longitude=float(longitudes[i])),
+            "score": 1.0,
+            "cost_rub": float(cost),
+            "visit_duration_hours": 1.0,
+            "opening_hours_bitmap": None,
+        }
+        for i, cost in enumerate(costs)
+    ]
+    travel_times = estimate_travel_time_matrix(calculate_distance_matrix(latitudes, longitudes), 30.0)
+    return candidates, travel_times
+
+
+def _quietly(func, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args)
+
+
+@pytest.mark.parametrize("budget", [0.0, 1500.0, 8000.0])
+def test_clustered_respects_the_global_budget(budget):
+    costs = np.random.default_rng(1).choice([0.0, 300.0, 900.0, 2500.0], 60)
+    candidates, travel_times = _candidates(costs)
+    route = _quietly(optimize_route_clustered, candidates, travel_times, 4, budget, START_DATE)
+    chosen = [i for plan in route.values() for i in plan]
+    assert len(chosen) == len(set(chosen))
+    assert sum(candidates[i]["cost_rub"] for i in chosen) <= budget
+
+
+def test_clustered_can_spend_more_than_an_even_share_on_one_day():
+    # A single 3000 RUB place with a 4000 RUB budget over 4 days: an even split (1000/day) would drop it.
+    candidates, travel_times = _candidates([3000.0] + [0.0] * 11)
+    route = _quietly(optimize_route_clustered, candidates, travel_times, 4, 4000.0, START_DATE)
+    assert 0 in [i for plan in route.values() for i in plan]
+
+
+def test_greedy_stays_the_default_for_long_trips(seeded_session, monkeypatch):
+    from app.routing import optimizer
+    from benchmarks.synthetic import SYNTHETIC_CITY
+
+    called = []
+    monkeypatch.setitem(
+        optimizer.OPTIMIZER_STRATEGIES, "clustered",
+        lambda **kwargs: called.append("clustered") or {},
+    )
+    status_code, _, _, _ = generator.generate_route(
+        destinations=[SYNTHETIC_CITY], start_date=date(2025, 7, 1), end_date=date(2025, 7, 10),
+        budget=None, budget_currency=None, interests=[], travel_style=None,
+        user_id=1, query_id=1, db_session=seeded_session,
+    )
+    assert status_code == 200
+    assert called == []
@@ -0,0 +1,65 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import event, text
+
+from database.models import Location
+from app.services import currency
+from benchmarks.synthetic import SYNTHETIC_CITY
+
+
+@pytest.fixture
+def unsynced(seeded_session, monkeypatch):
+    """Rows written by raw SQL (no listeners) and a process that has not synced yet."""
+    seeded_session.execute(text("UPDATE locations SET cost_rub = NULL WHERE id <= 50"))
+    seeded_session.commit()
+    monkeypatch.setattr(currency, "_synced_rates_version", 0)
+    return seeded_session
+
+
+def _cost_rub_mismatches(session):
+    return [
+        loc.id for loc in session.query(Location).all()
+        if loc.cost_rub != pytest.approx(currency.cost_in_base_currency(loc.cost, loc.cost_currency))
+    ]
+
+
+def test_sync_recomputes_once_and_commits(unsynced):
+    assert _cost_rub_mismatches(unsynced)
+    assert currency.sync_costs_rub(unsynced) is True
+    unsynced.expire_all()
+    assert _cost_rub_mismatches(unsynced) == []
+    assert currency.sync_costs_rub(unsynced) is False
+
+
+def test_failed_commit_does_not_mark_rates_as_synced(unsynced, monkeypatch):
+    def failing_commit():
+        raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(unsynced, "commit", failing_commit)
+    with pytest.raises(RuntimeError):
+        currency.sync_costs_rub(unsynced)
+    assert currency._synced_rates_version == 0
+
+    monkeypatch.undo()
+    monkeypatch.setattr(currency, "_synced_rates_version", 0)
+    assert currency.sync_costs_rub(unsynced) is True
+
+
+def test_route_generation_does_not_rewrite_cost_rub(seeded_session):
+    from app.routing.generator import generate_route
+
+    statements = []
+    engine = seeded_session.get_bind()
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        status_code, _, _, _ = generate_route(
+            destinations=[SYNTHETIC_CITY], start_date=date(2025, 7, 7), end_date=date(2025, 7, 8),
+            budget=None, budget_currency=None, interests=[], travel_style=None,
+            user_id=1, query_id=1, db_session=seeded_session,
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert status_code == 200
+    assert not [s for s in statements if "SET cost_rub" in s]
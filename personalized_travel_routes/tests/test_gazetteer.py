@@ -0,0 +1,70 @@
+import pytest
+
+from database.models import Location
+from app.services import gazetteer
+from app.services.gazetteer import DestinationGazetteer, destination_suggestions, resolve_destinations
+from benchmarks.synthetic import SYNTHETIC_CITY
+
+CITIES = ["Москва", "Казань", "Санкт-Петербург", "Нижний Новгород", "Великий Новгород", "Сочи"]
+
+
+@pytest.fixture
+def index():
+    index = DestinationGazetteer()
+    index.build(CITIES, ["Россия"])
+    return index
+
+
+@pytest.mark.parametrize("destination, expected", [
+    ("в Москве", "Москва"),
+    ("Санкт-Петербурк", "Санкт-Петербург"),
+    ("Сочии", "Сочи"),
+])
+def test_exact_forms_and_clear_typos_resolve(index, destination, expected):
+    assert index.resolve(destination) == {("city", expected)}
+
+
+@pytest.mark.parametrize("destination, suggestions", [
+    ("Масква", ["Москва"]),
+    ("Новгород", ["Нижний Новгород", "Великий Новгород"]),
+    ("Барселона", []),
+])
+def test_weak_or_ambiguous_matches_do_not_resolve(index, destination, suggestions):
+    assert index.resolve(destination) == set()
+    assert index.suggest(destination) == suggestions
+
+
+def test_misses_refresh_the_fingerprint_at_most_once_per_interval(seeded_session, monkeypatch):
+    forced = []
+    refresh_from_db = gazetteer.destination_gazetteer.refresh_from_db
+    monkeypatch.setattr(
+        gazetteer.destination_gazetteer, "refresh_from_db",
+        lambda db_session, force=False: (forced.append(force), refresh_from_db(db_session, force))[1],
+    )
+    for _ in range(5):
+        assert resolve_destinations(seeded_session, ["Барселона"]) == (set(), set())
+    assert forced.count(True) <= 1
+
+    monkeypatch.setattr(gazetteer, "MISS_REFRESH_INTERVAL_SECONDS", 0.0)
+    seeded_session.add(Location(name="Саграда Фамилия", latitude=41.4, longitude=2.17, city="Барселона", country="Испания"))
+    seeded_session.commit()
+    assert resolve_destinations(seeded_session, ["в Барселоне"]) == ({"Барселона"}, set())
+
+
+MISSPELLED_CITY = SYNTHETIC_CITY[:-1] + "ф" + SYNTHETIC_CITY[-1]
+
+
+def test_destination_suggestions_skip_resolved_and_unknown_names(seeded_session):
+    assert destination_suggestions(seeded_session, [SYNTHETIC_CITY, "Барселона"]) == {}
+    assert destination_suggestions(seeded_session, [MISSPELLED_CITY]) == {MISSPELLED_CITY: [SYNTHETIC_CITY, "Синтетика"]}
+
+
+def test_query_endpoint_asks_to_clarify_a_misspelled_destination(client, seeded_session):
+    response = client.post("/queries/", json={
+        "query_text": "музеи", "start_date": "2025-07-07", "end_date": "2025-07-08", "destination": [MISSPELLED_CITY],
+    })
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "clarification_required"
+    assert body["missing_fields"] == ["destination"]
+    assert SYNTHETIC_CITY in body["message"]
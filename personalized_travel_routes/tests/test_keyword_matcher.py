@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.nlp import processor
+from app.nlp.cache import ExtractionCache
+from app.nlp.keyword_matcher import KeywordMatcher, word_stem
+from app.nlp.processor import INTEREST_KEYWORDS_FALLBACK
+
+NOT_LOADED = SimpleNamespace(get=lambda: None)
+
+
+@pytest.fixture
+def matcher():
+    return KeywordMatcher(INTEREST_KEYWORDS_FALLBACK)
+
+
+@pytest.mark.parametrize("word, stem", [
+    ("парк", "парк"), ("музей", "музе"), ("галерея", "галере"), ("бюджетный", "бюджетн"), ("спа", "спа"),
+])
+def test_word_stem(word, stem):
+    assert word_stem(word) == stem
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("хочу погулять по паркам и музеям", ["музей", "парк"]),
+    ("рестораны и кафешки", ["еда"]),
+    ("выставки современных художников", ["музей"]),
+    ("торговые центры и рынки", ["шопинг"]),
+    ("поездка в барселону", []),
+    ("барак на окраине", []),
+])
+def test_inflected_forms_match_without_lemmas(matcher, text, expected):
+    assert matcher.match(text) == expected
+
+
+def test_lemma_forms_are_compiled_on_first_lemmatized_match():
+    calls = []
+
+    def lemmatizer(keyword):
+        calls.append(keyword)
+        return {"сувениры": "сувенир"}.get(keyword, keyword)
+
+    matcher = KeywordMatcher(INTEREST_KEYWORDS_FALLBACK, lemmatizer)
+    assert matcher.match("сувениров") == ["шопинг"]
+    assert calls == []
+    assert matcher.match("купить сувенир", lemmatized=True) == ["шопинг"]
+    assert matcher.match("поездка в барселона", lemmatized=True) == []
+
+
+def test_extraction_falls_back_to_stems_without_spacy(monkeypatch):
+    monkeypatch.setattr(processor, "extraction_cache", ExtractionCache(db_path=None, max_entries=0))
+    monkeypatch.setattr(processor, "spacy_pipeline", NOT_LOADED)
+    monkeypatch.setattr(processor, "interest_classifier", NOT_LOADED)
+    monkeypatch.setattr(processor, "travel_style_model", NOT_LOADED)
+
+    result = processor.extract_travel_info("Хочу погулять по паркам и музеям")
+    assert result["interests"] == ["музей", "парк"]
+    assert result["travel_style"] == "культурный"
+    assert processor.extract_travel_info("рестораны и кафешки")["interests"] == ["еда"]
@@ -0,0 +1,59 @@
+import os
+from datetime import date
+
+import numpy as np
+
+from database.models import Location
+from app.routing.matrix_cache import TravelMatrixCache, travel_matrix_cache
+from benchmarks.synthetic import SYNTHETIC_CITY
+
+SPEED_KM_H = 30.0
+
+
+def _points(num_points, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.arange(1, num_points + 1), 55.75 + rng.normal(0, 0.05, num_points), 37.62 + rng.normal(0, 0.08, num_points)
+
+
+def test_disk_round_trip_leaves_no_temporary_files(tmp_path):
+    ids, lats, lons = _points(50)
+    computed = TravelMatrixCache(cache_dir=str(tmp_path)).get_city_matrix("Город", ids, lats, lons, SPEED_KM_H)
+
+    file_names = os.listdir(tmp_path)
+    assert len(file_names) == 2
+    assert all(name.endswith(("_ids.npy", "_matrix.npy")) for name in file_names)
+
+    loaded = TravelMatrixCache(cache_dir=str(tmp_path)).get_city_matrix("Город", ids, lats, lons, SPEED_KM_H)
+    assert isinstance(loaded.travel_time_matrix_hours, np.memmap)
+    np.testing.assert_array_equal(loaded.location_ids, computed.location_ids)
+    np.testing.assert_array_equal(loaded.travel_time_matrix_hours, computed.travel_time_matrix_hours)
+
+
+def test_new_version_replaces_the_old_files(tmp_path):
+    ids, lats, lons = _points(20)
+    cache = TravelMatrixCache(cache_dir=str(tmp_path))
+    cache.get_city_matrix("Город", ids, lats, lons, SPEED_KM_H)
+    lats = lats.copy()
+    lats[3] += 0.01
+    cache.get_city_matrix("Город", ids, lats, lons, SPEED_KM_H)
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def _generate(session, interests):
+    from app.routing.generator import generate_route
+
+    status_code, _, _, _ = generate_route(
+        destinations=[SYNTHETIC_CITY], start_date=date(2025, 7, 7), end_date=date(2025, 7, 8),
+        budget=None, budget_currency=None, interests=interests, travel_style=None,
+        user_id=1, query_id=1, db_session=session,
+    )
+    assert status_code == 200
+
+
+def test_generator_keys_the_matrix_on_the_whole_city(seeded_session):
+    _generate(seeded_session, ["музей"])
+    _generate(seeded_session, ["парк", "еда"])
+
+    assert len(travel_matrix_cache._entries) == 1
+    (entry,) = travel_matrix_cache._entries.values()
+    assert entry.location_ids.size == seeded_session.query(Location).count()
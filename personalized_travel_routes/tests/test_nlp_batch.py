@@ -0,0 +1,39 @@
+import csv
+import os
+
+import pytest
+
+from app.nlp import processor
+from app.nlp.cache import ExtractionCache
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "app", "data", "interest_training_data.csv")
+
+
+@pytest.fixture
+def uncached(monkeypatch):
+    """A cache that never keeps anything, so every call really runs the models."""
+    monkeypatch.setattr(processor, "extraction_cache", ExtractionCache(db_path=None, max_entries=0))
+
+
+def _sample_texts(limit: int = 120):
+    with open(DATA_PATH, encoding="utf-8-sig") as f:
+        return [row[0] for row in csv.reader(f) if row][:limit]
+
+
+def test_batch_matches_one_by_one(uncached):
+    texts = _sample_texts() + ["Хочу в музей и на пляж, бюджет 5000", "", "горы и поход на 3 дня"]
+    one_by_one = [processor.extract_travel_info(text) for text in texts]
+    assert processor.extract_travel_info_batch(texts) == one_by_one
+    assert processor.extract_travel_info_batch(texts, batch_size=7) == one_by_one
+
+
+def test_batch_keeps_order_and_copies_duplicates(uncached):
+    texts = ["романтический ужин в ресторане", "горы и поход", "романтический ужин в ресторане"]
+    results = processor.extract_travel_info_batch(texts)
+    assert results[0] == results[2] == processor.extract_travel_info(texts[0])
+    results[0]["interests"].append("изменено")
+    assert "изменено" not in results[2]["interests"]
+
+
+def test_empty_batch():
+    assert processor.extract_travel_info_batch([]) == []
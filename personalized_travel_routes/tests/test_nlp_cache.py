@@ -0,0 +1,45 @@
+import pytest
+
+from app.nlp import models, processor
+from app.nlp.cache import ExtractionCache
+
+
+@pytest.fixture
+def fresh_cache(monkeypatch):
+    cache = ExtractionCache(db_path=None)
+    monkeypatch.setattr(processor, "extraction_cache", cache)
+    return cache
+
+
+def test_fingerprint_does_not_load_models():
+    def loader():
+        raise AssertionError("version_fingerprint must not load the model")
+
+    model = models.LazyModel("test", loader, lambda: "v1")
+    assert model.fingerprint() == "v1"
+    assert model.state == models.STATE_NOT_LOADED
+
+    missing = models.LazyModel("missing", loader, lambda: models._files_version("/nonexistent/model.pkl"))
+    assert missing.fingerprint() == models.STATE_UNAVAILABLE
+
+
+def test_fingerprint_matches_before_and_after_loading():
+    for model in models.ALL_MODELS:
+        expected = model.expected_version()
+        model.get()
+        assert model.fingerprint() == (expected if model.state == models.STATE_READY else model.state)
+
+
+def test_cache_hit_does_not_wait_for_models(fresh_cache, monkeypatch):
+    text = "хочу в музей и на пляж"
+    first = processor.extract_travel_info(text)
+    assert fresh_cache.stats()["misses"] == 1
+
+    def blocking_get():
+        raise AssertionError("a cache hit must not wait for a model")
+
+    for model in models.ALL_MODELS:
+        monkeypatch.setattr(model, "state", models.STATE_LOADING)
+        monkeypatch.setattr(model, "get", blocking_get)
+
+    assert processor.extract_travel_info("  хочу в музей  и на пляж ") == first
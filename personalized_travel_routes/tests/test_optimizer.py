@@ -0,0 +1,30 @@
+import contextlib
+import io
+from datetime import date
+
+import pytest
+
+from app.routing.optimizer import optimize_route_greedy
+from benchmarks.bench_greedy_optimizer import legacy_optimize_route_greedy, synthetic_candidates
+
+START_DATE = date(2025, 7, 1)
+
+
+def _quietly(func, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("num_candidates", [1, 5, 40, 300])
+def test_masked_greedy_matches_legacy_loop(seed, num_candidates):
+    candidates, travel_times = synthetic_candidates(num_candidates, seed)
+    for days in (1, 3, 10):
+        for budget in (None, 0.0, 2000.0, 15000.0):
+            expected = _quietly(legacy_optimize_route_greedy, candidates, travel_times, days, budget, START_DATE)
+            actual = _quietly(optimize_route_greedy, candidates, travel_times, days, budget, START_DATE)
+            assert actual == expected, f"days={days} budget={budget}"
+
+
+def test_masked_greedy_on_empty_candidates():
+    assert optimize_route_greedy([], [], 3, None, START_DATE) == {}
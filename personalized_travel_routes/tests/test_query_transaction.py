@@ -0,0 +1,54 @@
+import pytest
+
+from database.models import Query, Route, RouteLocationMap
+from app.api import queries
+from app.routing import generator
+from benchmarks.synthetic import SYNTHETIC_CITY
+
+QUERY_PAYLOAD = {
+    "query_text": "музеи и парки",
+    "start_date": "2025-07-07",
+    "end_date": "2025-07-08",
+    "destination": [SYNTHETIC_CITY],
+}
+
+
+def _new_queries(session):
+    return session.query(Query).filter(Query.id != 1).all()
+
+
+def test_query_and_route_are_saved_together(client, seeded_session):
+    response = client.post("/queries/", json=QUERY_PAYLOAD)
+    assert response.status_code == 200
+    (query,) = _new_queries(seeded_session)
+    assert query.parameters["route_id"] == response.json()["route_id"]
+
+
+def test_route_save_error_keeps_the_query(client, seeded_session, monkeypatch):
+    def failing_persist(db_session, route_values, location_ids):
+        db_session.add(Route(user_id=1, query_id=1, duration_days=1))
+        db_session.flush()
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(generator, "persist_generated_route", failing_persist)
+    response = client.post("/queries/", json=QUERY_PAYLOAD)
+
+    assert response.status_code == 500
+    assert len(_new_queries(seeded_session)) == 1
+    assert seeded_session.query(Route).count() == 0
+
+
+@pytest.mark.parametrize("fail_after_route", [False, True])
+def test_unexpected_error_keeps_the_query(client, seeded_session, monkeypatch, fail_after_route):
+    def broken_generate_route(**kwargs):
+        if fail_after_route:
+            generator.generate_route(**kwargs)
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(queries, "generate_route", broken_generate_route)
+    response = client.post("/queries/", json=QUERY_PAYLOAD)
+
+    assert response.status_code == 500
+    assert len(_new_queries(seeded_session)) == 1
+    assert seeded_session.query(Route).count() == 0
+    assert seeded_session.query(RouteLocationMap).count() == 0
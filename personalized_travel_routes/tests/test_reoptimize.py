@@ -0,0 +1,47 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from app import schemas
+from app.routing.reoptimize import reoptimize_stop_order, scheduled_travel_hours
+from app.routing.schedule import MAX_DAILY_ACTIVITY_HOURS, build_route_schedule
+
+START_DATE = date(2025, 7, 7)
+VISIT_TYPES = ["музей", "парк", "кафе", "архитектура", "пляж", "походы"]
+
+
+def _route(num_stops, seed):
+    rng = np.random.default_rng(seed)
+    return [
+        schemas.RouteLocationDetail(
+            map_id=100 + i, location_id=i + 1, location_name=f"POI {i + 1}",
+            location_type=VISIT_TYPES[int(rng.integers(len(VISIT_TYPES)))], visit_order=i,
+            latitude=55.75 + float(rng.normal(0, 0.02)), longitude=37.62 + float(rng.normal(0, 0.03)),
+        )
+        for i in range(num_stops)
+    ]
+
+
+@pytest.mark.parametrize("seed", range(8))
+@pytest.mark.parametrize("num_stops, days", [(6, 2), (12, 3), (20, 4)])
+def test_reoptimized_order_is_better_once_split_into_days(seed, num_stops, days):
+    pois = _route(num_stops, seed)
+    old_schedule = build_route_schedule(pois, START_DATE, days)
+
+    new_map_ids = reoptimize_stop_order(pois, START_DATE, days, deadline_ms=50.0)
+    if new_map_ids is None:
+        return
+    poi_by_map_id = {poi.map_id: poi for poi in pois}
+    assert sorted(new_map_ids) == sorted(poi_by_map_id)
+    new_schedule = build_route_schedule([poi_by_map_id[m] for m in new_map_ids], START_DATE, days)
+
+    assert new_schedule.num_unscheduled <= old_schedule.num_unscheduled
+    assert scheduled_travel_hours(new_schedule) < scheduled_travel_hours(old_schedule)
+    for day in new_schedule.days:
+        assert day.stop_indices.size <= 1 or day.total_hours <= MAX_DAILY_ACTIVITY_HOURS + 1e-9
+
+
+def test_some_routes_are_improved():
+    improved = [reoptimize_stop_order(_route(12, seed), START_DATE, 3, deadline_ms=50.0) for seed in range(8)]
+    assert any(order is not None for order in improved)
@@ -0,0 +1,46 @@
+import os
+
+from database.models import Location, RouteLocationMap
+from app import schemas
+from app.services.currency import exchange_rates
+from app.services.route_cache import RenderedRouteCache, rendered_route_cache
+
+
+def test_cached_route_follows_location_and_rates_changes(client, seeded_session, generated_route, monkeypatch):
+    url = f"/routes/{generated_route.id}"
+    first = client.get(url).json()
+    hits = rendered_route_cache.hits
+    assert client.get(url).json() == first
+    assert rendered_route_cache.hits == hits + 1
+
+    stop = seeded_session.query(RouteLocationMap).filter(RouteLocationMap.route_id == generated_route.id).first()
+    seeded_session.get(Location, stop.location_id).name = "Переименованное место"
+    seeded_session.commit()
+    renamed = client.get(url).json()
+    assert "Переименованное место" in [poi["location_name"] for poi in renamed["locations_on_route"]]
+
+    misses = rendered_route_cache.misses
+    monkeypatch.setattr(exchange_rates, "base_per_unit", exchange_rates.base_per_unit * 1.1)
+    client.get(url)
+    assert rendered_route_cache.misses == misses + 1
+
+
+def test_disk_files_are_replaced_and_evicted_without_listing_the_directory(tmp_path, monkeypatch):
+    def no_listdir(path):
+        raise AssertionError("the cache must not list its directory")
+
+    monkeypatch.setattr(os, "listdir", no_listdir)
+    cache = RenderedRouteCache(cache_dir=str(tmp_path), max_entries=2)
+    for route_id, version in [(1, 1), (1, 2), (2, 1), (3, 1)]:
+        cache.put(route_id, version, "f", schemas.FullRouteDetailsResponse(route_id=route_id, route_text=f"v{version}"))
+    monkeypatch.undo()
+
+    assert sorted(os.listdir(tmp_path)) == ["route_2_v1_f.json", "route_3_v1_f.json"]
+    assert RenderedRouteCache(cache_dir=str(tmp_path)).get(3, 1, "f").route_text == "v1"
+
+
+def test_cache_stats_require_a_known_user(client):
+    assert client.get("/routes/cache/stats").status_code == 200
+    assert client.get("/routes/cache/stats", headers={"X-User-ID": "999"}).status_code == 404
+    client.headers.pop("X-User-ID")
+    assert client.get("/routes/cache/stats").status_code == 422
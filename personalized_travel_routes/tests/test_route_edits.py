@@ -0,0 +1,75 @@
+import pytest
+from sqlalchemy import func, update
+
+from database.models import Location, Route, RouteLocationMap
+from app.routing.route_edits import shift_visit_orders, reorder_stops
+
+
+def _visit_orders(session, route_id):
+    return [r[0] for r in session.query(RouteLocationMap.visit_order).filter(
+        RouteLocationMap.route_id == route_id).order_by(RouteLocationMap.visit_order)]
+
+
+def _stops(session, route_id):
+    return session.query(RouteLocationMap).filter(RouteLocationMap.route_id == route_id).order_by(RouteLocationMap.visit_order).all()
+
+
+def _sql_total_cost(session, route_id):
+    return session.query(func.coalesce(func.sum(Location.cost_rub), 0.0)).join(
+        RouteLocationMap, RouteLocationMap.location_id == Location.id
+    ).filter(RouteLocationMap.route_id == route_id).scalar()
+
+
+def test_shift_and_reorder_keep_visit_orders_unique(seeded_session, generated_route):
+    route_id = generated_route.id
+    num_stops = len(_visit_orders(seeded_session, route_id))
+
+    shift_visit_orders(seeded_session, route_id, 2, 1)
+    seeded_session.commit()
+    assert _visit_orders(seeded_session, route_id) == [0, 1] + list(range(3, num_stops + 1))
+
+    shift_visit_orders(seeded_session, route_id, 3, -1)
+    map_ids = [stop.id for stop in _stops(seeded_session, route_id)]
+    reorder_stops(seeded_session, route_id, list(reversed(map_ids)))
+    seeded_session.commit()
+    seeded_session.expire_all()
+    assert [stop.id for stop in _stops(seeded_session, route_id)] == list(reversed(map_ids))
+    assert _visit_orders(seeded_session, route_id) == list(range(num_stops))
+
+
+def test_edit_endpoints_keep_order_contiguous_and_cost_consistent(client, seeded_session, generated_route):
+    route_id = generated_route.id
+    stops = _stops(seeded_session, route_id)
+    on_route = {stop.location_id for stop in stops}
+    spare_ids = [loc_id for (loc_id,) in seeded_session.query(Location.id).order_by(Location.id) if loc_id not in on_route]
+
+    assert client.delete(f"/routes/{route_id}/locations/{stops[1].id}").status_code == 200
+    assert client.put(f"/routes/{route_id}/locations/{stops[0].id}", json={
+        "new_item_type": "location", "new_item_id": spare_ids[0], "allow_distant": True,
+    }).status_code == 200
+    assert client.post(f"/routes/{route_id}/locations", json={
+        "item_type": "location", "item_id": spare_ids[1], "placement": "cheapest", "allow_distant": True,
+    }).status_code == 201
+
+    seeded_session.expire_all()
+    route = seeded_session.get(Route, route_id)
+    assert _visit_orders(seeded_session, route_id) == list(range(len(stops)))
+    assert route.total_cost == pytest.approx(_sql_total_cost(seeded_session, route_id), abs=0.005)
+    assert route.version == 4
+
+
+def test_total_cost_does_not_drift_when_costs_change_between_edits(client, seeded_session, generated_route):
+    route_id = generated_route.id
+    on_route = {stop.location_id for stop in _stops(seeded_session, route_id)}
+    spare = seeded_session.query(Location).filter(Location.id.notin_(on_route), Location.cost_rub > 0).first()
+
+    added = client.post(f"/routes/{route_id}/locations", json={"item_type": "location", "item_id": spare.id})
+    assert added.status_code == 201
+    # A rates reload rewrites cost_rub with a set-based UPDATE between the two edits.
+    seeded_session.execute(update(Location).where(Location.id == spare.id).values(cost_rub=Location.cost_rub * 2))
+    seeded_session.commit()
+    map_id = next(poi["map_id"] for poi in added.json()["locations_on_route"] if poi["location_id"] == spare.id)
+    assert client.delete(f"/routes/{route_id}/locations/{map_id}").status_code == 200
+
+    seeded_session.expire_all()
+    assert seeded_session.get(Route, route_id).total_cost == pytest.approx(_sql_total_cost(seeded_session, route_id), abs=0.005)
@@ -0,0 +1,45 @@
+import pytest
+from sqlalchemy import text
+
+from app.services import currency, similar_locations
+from app.services.similar_locations import get_similar_location_index
+
+
+@pytest.fixture
+def always_refresh(monkeypatch):
+    monkeypatch.setattr(similar_locations, "REFRESH_INTERVAL_SECONDS", 0.0)
+
+
+def test_raw_sql_insert_is_applied_without_a_full_build(seeded_session, always_refresh, monkeypatch):
+    index = get_similar_location_index(seeded_session)
+    num_locations = len(index)
+    lat, lon, location_type = seeded_session.execute(
+        text("SELECT latitude, longitude, type FROM locations ORDER BY id LIMIT 1")
+    ).one()
+    seeded_session.execute(text(
+        "INSERT INTO locations (name, latitude, longitude, type, cost, cost_currency, cost_rub) "
+        "VALUES ('Новое место', :lat, :lon, :type, 0, 'RUB', 0)"
+    ), {"lat": lat, "lon": lon, "type": location_type})
+    seeded_session.commit()
+
+    def no_build(db_session):
+        raise AssertionError("a single new row must not rebuild the index")
+
+    monkeypatch.setattr(index, "build", no_build)
+    new_id = seeded_session.execute(text("SELECT max(id) FROM locations")).scalar()
+    get_similar_location_index(seeded_session)
+    assert len(index) == num_locations + 1
+    assert index.suggestions_for(new_id)
+
+
+def test_cost_sync_invalidates_the_index(seeded_session, monkeypatch):
+    index = get_similar_location_index(seeded_session)
+    seeded_session.execute(text("UPDATE locations SET cost_rub = NULL"))
+    seeded_session.commit()
+    monkeypatch.setattr(currency, "_synced_rates_version", 0)
+    assert currency.sync_costs_rub(seeded_session) is True
+
+    built = []
+    monkeypatch.setattr(index, "build", built.append)
+    get_similar_location_index(seeded_session)
+    assert built == [seeded_session]
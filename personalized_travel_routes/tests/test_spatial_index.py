@@ -0,0 +1,124 @@
+from datetime import date
+
+import numpy as np
+from sqlalchemy import event, text
+
+from database.models import Location
+from app.services.spatial_index import LocationSpatialIndex, get_location_spatial_index
+from benchmarks.synthetic import SYNTHETIC_CITY, SYNTHETIC_COUNTRY
+
+
+def _brute_force_radius(locations, latitude, longitude, radius_km):
+    from app.services.distance import calculate_distance
+
+    lats = np.array([loc.latitude for loc in locations])
+    lons = np.array([loc.longitude for loc in locations])
+    distances = calculate_distance(lats, lons, latitude, longitude)
+    return {loc.id for loc, d in zip(locations, distances) if d <= radius_km}
+
+
+def test_query_radius_matches_brute_force(seeded_session):
+    index = get_location_spatial_index(seeded_session)
+    locations = seeded_session.query(Location).all()
+    center = locations[0]
+    for radius_km in (0.5, 2.0, 10.0):
+        found = set(index.query_radius(center.latitude, center.longitude, radius_km).tolist())
+        assert found == _brute_force_radius(locations, center.latitude, center.longitude, radius_km)
+
+
+def test_destination_points_match_sql(seeded_session):
+    index = get_location_spatial_index(seeded_session)
+    ids, _, _ = index.destination_points({SYNTHETIC_CITY}, set())
+    assert ids.tolist() == sorted(r[0] for r in seeded_session.query(Location.id).filter(Location.city == SYNTHETIC_CITY))
+    assert index.destination_points(set(), {SYNTHETIC_COUNTRY})[0].tolist() == ids.tolist()
+    assert index.destination_points({"нет такого"}, set())[0].size == 0
+
+
+def test_orm_update_and_delete_are_applied(seeded_session):
+    index = get_location_spatial_index(seeded_session)
+    moved = seeded_session.get(Location, 5)
+    old_lat, lon = moved.latitude, moved.longitude
+    moved.latitude = old_lat + 1.0
+    seeded_session.delete(seeded_session.get(Location, 6))
+    seeded_session.commit()
+
+    index = get_location_spatial_index(seeded_session)
+    assert 5 not in index.query_radius(old_lat, lon, 0.01).tolist()
+    assert 5 in index.query_radius(old_lat + 1.0, lon, 0.01).tolist()
+    assert not index.coordinates_known(6)
+    assert 6 not in index.destination_points({SYNTHETIC_CITY}, set())[0].tolist()
+    assert all(loc_id != 5 for loc_id, _ in index.query_nearest(old_lat, lon, 5))
+
+
+def test_raw_sql_delete_is_caught_by_fingerprint(seeded_session):
+    index = get_location_spatial_index(seeded_session)
+    seeded_session.execute(text("DELETE FROM locations WHERE id = 7"))
+    seeded_session.commit()
+    index.refresh_from_db(seeded_session, force=True)
+    assert not index.coordinates_known(7)
+    assert len(index) == seeded_session.query(Location).count()
+
+
+def test_masked_rows_are_merged_into_a_new_tree():
+    index = LocationSpatialIndex()
+    index.build([1, 2, 3], [55.0, 55.001, 56.0], [37.0, 37.001, 38.0])
+    for step in range(300):
+        index.add_location(1, 55.0 + step * 1e-6, 37.0)
+    assert len(index) == 3
+    assert index.query_radius(55.0, 37.0, 1.0).tolist().count(1) == 1
+
+
+def _add_second_city(session, num_pois=40):
+    rng = np.random.default_rng(7)
+    session.add_all([
+        Location(
+            name=f"Место {i}", latitude=59.93 + float(rng.normal(0, 0.01)), longitude=30.33 + float(rng.normal(0, 0.02)),
+            city="Санкт-Петербург", country="Россия", rating=4.5, type="музей", cost=0.0, cost_currency="RUB",
+        )
+        for i in range(num_pois)
+    ])
+    session.commit()
+    return [loc_id for (loc_id,) in session.query(Location.id).filter(Location.city == "Санкт-Петербург")]
+
+
+def test_coherence_filter_keeps_every_destination_city(seeded_session):
+    from app.routing.generator import select_coherent_destination_mask
+
+    second_city_ids = _add_second_city(seeded_session)
+    index = get_location_spatial_index(seeded_session)
+    cities = {SYNTHETIC_CITY, "Санкт-Петербург"}
+    ids, lats, lons = index.destination_points(cities, set())
+
+    is_coherent = select_coherent_destination_mask(ids, lats, lons, cities, set(), index, min_count=16)
+    kept = set(ids[is_coherent].tolist())
+    assert set(second_city_ids) <= kept
+    assert len(kept - set(second_city_ids)) >= 16
+
+
+def test_candidate_query_has_no_id_list_when_nothing_is_filtered(seeded_session, monkeypatch):
+    from app.routing import generator
+
+    monkeypatch.setattr(generator, "CANDIDATE_RADIUS_KM", generator.MAX_CANDIDATE_RADIUS_KM)
+    statements = []
+    engine = seeded_session.get_bind()
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        status_code, _, _, _ = generator.generate_route(
+            destinations=[SYNTHETIC_CITY], start_date=date(2025, 7, 7), end_date=date(2025, 7, 8),
+            budget=None, budget_currency=None, interests=[], travel_style=None,
+            user_id=1, query_id=1, db_session=seeded_session,
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert status_code == 200
+    assert not [s for s in statements if "locations.id IN" in s]
+
+
+def test_distant_stop_is_rejected_only_on_request(client, seeded_session, generated_route):
+    distant_ids = _add_second_city(seeded_session, num_pois=2)
+    url = f"/routes/{generated_route.id}/locations"
+
+    rejected = client.post(url, json={"item_type": "location", "item_id": distant_ids[0], "allow_distant": False})
+    assert rejected.status_code == 400
+    assert client.post(url, json={"item_type": "location", "item_id": distant_ids[1]}).status_code == 201